@@ -1,6 +1,6 @@
 import numpy as np
 
-from seisflows.tools import unix
+from seisflows.tools import metrics, unix
 from seisflows.tools.array import loadnpy, savenpy
 from seisflows.tools.code import exists
 from seisflows.tools.config import ParameterObj
@@ -47,6 +47,7 @@ class base(object):
         pass
 
 
+    @metrics.timed('process_kernels')
     def process_kernels(self, tag='gradient', path=None):
         """ Computes gradient and performs scaling, smoothing, and 
           preconditioning operations
@@ -1,15 +1,35 @@
 
+import hashlib
+import json
+import os
+from functools import partial
+from os.path import exists, join
+
 import numpy as np
 
-from seisflows.tools import unix
+from seisflows.tools import metrics, unix
 from seisflows.tools.code import Struct
 from seisflows.tools.config import ParameterObj
 
-from seisflows.seistools import adjoint, misfit, sbandpass, smute, readers, writers
+from seisflows.seistools import adjoint, container, misfit, readers, writers
+from seisflows.seistools import sbandpass, shighpass, slowpass, smute
 
 PAR = ParameterObj('SeisflowsParameters')
 PATH = ParameterObj('SeisflowsPaths')
 
+# misfit functions, by value of PAR.MISFIT, each with a corresponding
+# adjoint source of the same name
+MISFITS = {
+    'wav': 'wdiff',
+    'wdiff': 'wdiff',
+    'tt': 'wtime',
+    'wtime': 'wtime',
+    'ampl': 'wampl',
+    'wampl': 'wampl',
+    'env': 'ediff',
+    'ediff': 'ediff',
+    'cdiff': 'cdiff'}
+
 
 class base(object):
     """ Data preprocessing class
@@ -31,6 +51,14 @@ class base(object):
         if 'NORMALIZE' not in PAR:
             setattr(PAR, 'NORMALIZE', True)
 
+        # cross correlation settings: largest time shift considered, and
+        # whether traveltime shifts are refined below one sample
+        if 'MAXLAG' not in PAR:
+            setattr(PAR, 'MAXLAG', None)
+
+        if 'SUBSAMPLE' not in PAR:
+            setattr(PAR, 'SUBSAMPLE', False)
+
         # mute settings
         if 'MUTE' not in PAR:
             setattr(PAR, 'MUTE', False)
@@ -57,6 +85,11 @@ class base(object):
         if 'FREQHI' not in PAR:
             setattr(PAR, 'FREQHI', 0.)
 
+        # processed observations are kept next to the observations, and
+        # reused until processing parameters or observations change
+        if 'CACHEOBS' not in PAR:
+            setattr(PAR, 'CACHEOBS', True)
+
 
     def setup(self):
         """ Performs any required setup tasks
@@ -68,17 +101,37 @@ class base(object):
         self.writer = getattr(writers, PAR.FORMAT)
         self.channels = [char for char in PAR.CHANNELS]
 
+        # resolve misfit function and adjoint source once, rather than for
+        # every trace
+        if PAR.MISFIT in MISFITS:
+            name = MISFITS[PAR.MISFIT]
+            self.misfit = getattr(misfit, name)
+            self.adjoint = getattr(adjoint, name)
+
+            if name == 'wtime':
+                options = {'maxlag': PAR.MAXLAG, 'subsample': PAR.SUBSAMPLE}
+            elif name == 'wampl':
+                options = {'maxlag': PAR.MAXLAG}
+            else:
+                options = {}
+            if options:
+                self.misfit = partial(self.misfit, **options)
+                self.adjoint = partial(self.adjoint, **options)
+        else:
+            self.misfit = _nomisfit
+            self.adjoint = _noadjoint
+
 
+    @metrics.timed('prepare_eval_grad')
     def prepare_eval_grad(self, path='.'):
         """ Prepares solver for gradient evaluation by writing residuals and
           adjoint traces
         """
         unix.cd(path)
 
-        d, h = self.load(prefix='traces/obs/')
+        d, h = self.load_observations(prefix='traces/obs/')
         s, _ = self.load(prefix='traces/syn/')
 
-        d = self.apply(self.process_traces, [d], [h])
         s = self.apply(self.process_traces, [s], [h])
 
         self.apply(self.write_residuals, [s, d], [h], inplace=False)
@@ -97,21 +150,28 @@ class base(object):
         if PAR.HIGHPASS:
             s = shighpass(s, h, PAR.FREQLO)
 
-        if PAR.HIGHPASS:
+        if PAR.LOWPASS:
             s = slowpass(s, h, PAR.FREQHI)
 
-        # mute direct arrival
+        # mute direct arrival; masks are kept with processed observations,
+        # so that they are computed once per source rather than once per
+        # process
+        if PAR.CACHEOBS:
+            path = 'traces/obs_processed'
+        else:
+            path = None
+
         if PAR.MUTE == 1:
             vel = PAR.MUTESLOPE
             off = PAR.MUTECONST
-            s = smute(s, h, vel, off, constant_spacing=False)
+            s = smute(s, h, vel, off, constant_spacing=False, path=path)
 
         elif PAR.MUTE == 2:
             import system
             vel = PAR.MUTESLOPE*(PAR.NREC + 1)/(PAR.XMAX - PAR.XMIN)
             off = PAR.MUTECONST
             src = system.getnode()
-            s = smute(s, h, vel, off, src, constant_spacing=True)
+            s = smute(s, h, vel, off, src, constant_spacing=True, path=path)
 
         return s
 
@@ -119,29 +179,24 @@ class base(object):
     def write_residuals(self, s, d, h):
         """ Computes residuals from observations and synthetics
         """
-        r = []
-        for i in range(h.nr):
-            r.append(self.call_misfit(s[:,i], d[:,i], h.nt, h.dt))
+        r = self.misfit(s, d, h.nt, h.dt)
 
         # write residuals
         np.savetxt('residuals', r)
 
-        return np.array(r)
+        return r
 
 
     def generate_adjoint_traces(self, s, d, h):
         """ Generates adjoint traces from observed and synthetic traces
         """
         # generate adjoint traces
-        for i in range(h.nr):
-            s[:,i] = self.call_adjoint(s[:,i], d[:,i], h.nt, h.dt)
+        s[:] = self.adjoint(s, d, h.nt, h.dt)
 
         # normalize traces
         if PAR.NORMALIZE:
-            for ir in range(h.nr):
-                w = np.linalg.norm(d[:,ir], ord=2)
-                if w > 0: 
-                    s[:,ir] /= w
+            w = np.linalg.norm(d, ord=2, axis=0)
+            s[:, w > 0] /= w[w > 0]
 
         return s
 
@@ -151,58 +206,32 @@ class base(object):
     def call_adjoint(self, wsyn, wobs, nt, dt):
         """ Wrapper for generating adjoint traces
         """
-        if PAR.MISFIT in ['wav', 'wdiff']:
-            # waveform difference
-            w = adjoint.wdiff(wsyn, wobs, nt, dt)
-        elif PAR.MISFIT in ['tt', 'wtime']:
-            # traveltime
-            w = adjoint.wtime(wsyn, wobs, nt, dt)
-        elif PAR.MISFIT in ['ampl', 'wampl']:
-            # amplitude
-            w = adjoint.wampl(wsyn, wobs, nt, dt)
-        elif PAR.MISFIT in ['env', 'ediff']:
-            # envelope
-            w = adjoint.ediff(wsyn, wobs, nt, dt, eps=0.05)
-        elif PAR.MISFIT in ['cdiff']:
-            # cross correlation
-            w = adjoint.cdiff(wsyn, wobs, nt, dt)
-        else:
-            w = wobs
-        return w
+        return self.adjoint(wsyn, wobs, nt, dt)
 
     def call_misfit(self, wsyn, wobs, nt, dt):
         """ Wrapper for evaluating misfit function
         """
-        if PAR.MISFIT in ['wav', 'wdiff']:
-            # waveform difference
-            e = misfit.wdiff(wsyn, wobs, nt, dt)
-        elif PAR.MISFIT in ['tt', 'wtime']:
-            # traveltime
-            e = misfit.wtime(wsyn, wobs, nt, dt)
-        elif PAR.MISFIT in ['ampl', 'wampl']:
-            # amplitude
-            e = misfit.wampl(wsyn, wobs, nt, dt)
-        elif PAR.MISFIT in ['env', 'ediff']:
-            # envelope
-            e = misfit.ediff(wsyn, wobs, nt, dt, eps=0.05)
-        elif PAR.MISFIT in ['cdiff']:
-            # cross correlation
-            e = misfit.cdiff(wsyn, wobs, nt, dt)
-        else:
-            e = 0.
-        return float(e)
+        return float(self.misfit(wsyn, wobs, nt, dt))
 
 
     ### input/output
 
-    def load(self, prefix=''):
+    def load(self, prefix='', cache=False):
         """ Reads seismic data from disk
+
+          If CACHE is set, readers that support it keep parsed traces next
+          to the files they were read from.
         """
         h = Struct()
         f = Struct()
 
+        options = {}
+        if cache and PAR.FORMAT in readers.CACHEABLE:
+            options['cache'] = True
+
         for channel in self.channels:
-            f[channel], h[channel] = self.reader(prefix=prefix, channel=channel)
+            f[channel], h[channel] = self.reader(prefix=prefix, channel=channel,
+                                                 **options)
 
         # check headers
         h = self.check_headers(h)
@@ -215,6 +244,68 @@ class base(object):
         for channel in self.channels:
             self.writer(s[channel], h, channel=channel, prefix=prefix, suffix=suffix)
 
+    def load_observations(self, prefix='traces/obs/'):
+        """ Reads and processes observations
+
+          Processed observations are cached in a container next to the
+          observations, tagged with a key computed from the processing
+          parameters and the size and modification time of the observation
+          files. The cache is used for as long as the key is unchanged.
+        """
+        if not PAR.CACHEOBS:
+            d, h = self.load(prefix=prefix)
+            d = self.apply(self.process_traces, [d], [h])
+            return d, h
+
+        path = prefix.rstrip('/') + '_processed'
+        key = self.processing_key(prefix)
+
+        if exists(join(path, 'key')):
+            with open(join(path, 'key')) as file:
+                cached = file.read() == key
+            if cached:
+                d = Struct()
+                h = Struct()
+                for channel in self.channels:
+                    d[channel], h[channel] = container.read(path, channel)
+                return d, self.check_headers(h)
+
+        # processing may store mute masks in the cache directory, so it is
+        # cleared first; the key is written last, so that an incomplete
+        # cache is never used
+        unix.rm(path)
+        d, h = self.load(prefix=prefix, cache=True)
+        d = self.apply(self.process_traces, [d], [h])
+
+        for channel in self.channels:
+            container.write(path, channel, d[channel], h, dtype='float64')
+        tmpfile = join(path, 'key.%d' % os.getpid())
+        with open(tmpfile, 'w') as file:
+            file.write(key)
+        os.rename(tmpfile, join(path, 'key'))
+
+        return d, h
+
+    def processing_key(self, prefix):
+        """ Returns hash of processing parameters and observation file
+          attributes
+        """
+        params = {}
+        for name in ['FORMAT', 'CHANNELS', 'DT', 'NT', 'NREC',
+                     'BANDPASS', 'HIGHPASS', 'LOWPASS', 'FREQLO', 'FREQHI',
+                     'MUTE', 'MUTESLOPE', 'MUTECONST', 'XMIN', 'XMAX']:
+            if name in PAR:
+                params[name] = getattr(PAR, name)
+
+        # hidden files, such as those cached by readers, are skipped
+        files = []
+        for name in sorted(unix.ls(prefix)):
+            stat = os.stat(join(prefix, name))
+            files += [[name, stat.st_size, stat.st_mtime]]
+
+        obj = [self.__class__.__name__, params, files]
+        return hashlib.md5(json.dumps(obj, sort_keys=True)).hexdigest()
+
 
     ### utility functions
 
@@ -252,3 +343,11 @@ class base(object):
         return h
 
 
+def _nomisfit(wsyn, wobs, nt, dt):
+    # no misfit function given
+    return np.zeros(wsyn.shape[1:])
+
+
+def _noadjoint(wsyn, wobs, nt, dt):
+    # no misfit function given; observations are used as adjoint traces
+    return wobs
@@ -1,7 +1,7 @@
 
 # -- data processing
 
-from signal import sbandpass, smute, swindow
+from signal import sbandpass, shighpass, slowpass, smute, swindow
 
 from segy import reader as segyreader
 from segy import writer as segywriter
@@ -4,21 +4,24 @@ from scipy import signal as _signal
 
 import misfit
 
+# Adjoint sources are computed for single traces or blocks of traces, with
+# time along the first axis.
 
-def wtime(wsyn, wobs, nt, dt):
+
+def wtime(wsyn, wobs, nt, dt, maxlag=None, subsample=False):
     # cross correlation traveltime
     # (Tromp et al. 2005, eq 45)
-    wadj = _np.zeros(nt)
+    wadj = _np.zeros(wsyn.shape)
     wadj[1:-1] = (wsyn[2:] - wsyn[0:-2])/(2.*dt)
-    wadj *= 1./(sum(wadj*wadj)*dt)
-    wadj *= misfit.wtime(wsyn,wobs,nt,dt)
+    wadj *= 1./(_np.sum(wadj*wadj, axis=0)*dt)
+    wadj *= misfit.wtime(wsyn,wobs,nt,dt,maxlag,subsample)
     return wadj
 
 
-def wampl(wsyn, wobs, nt, dt):
+def wampl(wsyn, wobs, nt, dt, maxlag=None):
     # cross correlation amplitude
-    wadj = 1./(sum(wsyn*wsyn)*dt) * wsyn
-    wadj *= misfit.wampl(wsyn,wobs,nt,dt)
+    wadj = 1./(_np.sum(wsyn*wsyn, axis=0)*dt) * wsyn
+    wadj *= misfit.wampl(wsyn,wobs,nt,dt,maxlag)
     return wadj
 
 
@@ -35,15 +38,15 @@ def etime(wsyn, wobs, nt, dt):
 
 def ediff(wsyn, wobs, nt, dt, eps=0.05):
     # envelope difference
-    esyn = abs(_signal.hilbert(wsyn))
-    eobs = abs(_signal.hilbert(wobs))
-    wadj = - (esyn - eobs)/(esyn + eps*esyn.max())
+    esyn = abs(_signal.hilbert(wsyn, axis=0))
+    eobs = abs(_signal.hilbert(wobs, axis=0))
+    wadj = - (esyn - eobs)/(esyn + eps*esyn.max(axis=0))
     return wadj
 
 
 def cdiff(wsyn, wobs, nt, dt):
     # cross correlation difference
-    cdiff = _np.correlate(wobs,wsyn) - _np.correlate(wobs,wobs)
-    wadj = _np.convolve(wobs,cdiff)
+    cdiff = _np.sum(wobs*wsyn, axis=0) - _np.sum(wobs*wobs, axis=0)
+    wadj = wobs*cdiff
     return 1e-10 * wadj
 
@@ -0,0 +1,152 @@
+
+import json
+import os
+import zlib
+from os.path import exists, join
+
+import numpy as np
+
+from seisflows.tools import unix
+from seisflows.tools.code import Struct
+
+
+# number of traces per chunk
+CHUNKSIZE = 256
+
+# name of header table within container
+HEADER = 'header.json'
+
+
+def write(path, channel, d, h, compress=False, dtype='float32'):
+    """ Writes traces of one channel to container, adding the channel to
+      any already present
+
+      A container is a directory holding all channels and receivers of one
+      source. Traces of each channel are stored in a single data file as a
+      sequence of chunks of CHUNKSIZE traces, optionally compressed with
+      zlib. Header arrays are stored in one npz file per channel; scalars
+      and the chunk table go into a JSON header table shared by all
+      channels.
+    """
+    unix.mkdir(path)
+    table = _load_table(path)
+
+    chunks = []
+    offset = 0
+    with open(join(path, channel+'.bin'), 'wb') as f:
+        for imin in range(0, d.shape[1], CHUNKSIZE):
+            imax = min(imin + CHUNKSIZE, d.shape[1])
+            chunk = np.ascontiguousarray(d[:, imin:imax].T, dtype=dtype)
+            chunk = chunk.tostring()
+            if compress:
+                chunk = zlib.compress(chunk, 1)
+            f.write(chunk)
+            chunks += [[offset, len(chunk), imin, imax]]
+            offset += len(chunk)
+
+    # header arrays go into npz file, everything else into header table
+    arrays = {}
+    scalars = {}
+    for key, val in h.items():
+        if isinstance(val, np.ndarray):
+            arrays[key] = val
+        else:
+            scalars[key] = _jsonable(val)
+
+    with open(join(path, channel+'.npz'), 'wb') as f:
+        np.savez(f, **arrays)
+
+    table[channel] = {
+        'nt': d.shape[0],
+        'nr': d.shape[1],
+        'dtype': np.dtype(dtype).str,
+        'compress': bool(compress),
+        'chunks': chunks,
+        'header': scalars}
+    _save_table(path, table)
+
+
+def read(path, channel, traces=None):
+    """ Reads traces of one channel from container
+
+      TRACES can be a slice or a sequence of trace numbers; only chunks
+      holding the selected traces are read.
+    """
+    entry = _load_table(path)[channel]
+    nt, nr = entry['nt'], entry['nr']
+
+    if traces is None:
+        itraces = np.arange(nr)
+    elif isinstance(traces, slice):
+        itraces = np.arange(nr)[traces]
+    else:
+        itraces = np.asarray(traces, dtype=int)
+
+    d = np.empty((nt, len(itraces)))
+    with open(join(path, channel+'.bin'), 'rb') as f:
+        for offset, nbytes, imin, imax in entry['chunks']:
+            selected = np.flatnonzero((itraces >= imin) & (itraces < imax))
+            if len(selected) == 0:
+                continue
+            f.seek(offset)
+            chunk = f.read(nbytes)
+            if entry['compress']:
+                chunk = zlib.decompress(chunk)
+            chunk = np.fromstring(chunk, dtype=entry['dtype'])
+            chunk = chunk.reshape((imax-imin, nt))
+            d[:, selected] = chunk[itraces[selected]-imin].T
+
+    h = Struct([(str(key), val) for key, val in entry['header'].items()])
+    with np.load(join(path, channel+'.npz')) as arrays:
+        for key in arrays.files:
+            array = arrays[key]
+            if array.ndim and len(array) == nr:
+                array = array[itraces]
+            h[str(key)] = array
+    if 'nr' in h:
+        h['nr'] = len(itraces)
+    if 'files' in h and len(h['files']) == nr:
+        h['files'] = [str(h['files'][i]) for i in itraces]
+
+    return d, h
+
+
+def channels(path):
+    """ Returns channels present in container
+    """
+    return sorted(_load_table(path).keys())
+
+
+def pack(src, dst, reader, channels, compress=False):
+    """ Reads traces from directory using given reader and writes them to
+      a container
+    """
+    for channel in channels:
+        d, h = reader(prefix=src, channel=channel)
+        write(dst, channel, d, h, compress=compress)
+
+
+### utility functions
+
+def _load_table(path):
+    if not exists(join(path, HEADER)):
+        return {}
+    with open(join(path, HEADER)) as f:
+        return json.load(f)
+
+
+def _save_table(path, table):
+    # the header table validates the data files, so it is replaced last
+    # and atomically
+    tmpfile = join(path, HEADER+'.%d' % os.getpid())
+    with open(tmpfile, 'w') as f:
+        json.dump(table, f, sort_keys=True)
+    os.rename(tmpfile, join(path, HEADER))
+
+
+def _jsonable(val):
+    if isinstance(val, np.generic):
+        return val.item()
+    if isinstance(val, (list, tuple)):
+        return [_jsonable(item) for item in val]
+    return val
@@ -1,44 +1,32 @@
-
 import numpy as np
+import scipy.fftpack
 import scipy.signal
 
+# Misfit functions accept single traces or blocks of traces, with time along
+# the first axis, and return one value per trace.
+
+# number of correlation values computed at a time
+BLOCKSIZE = 2**21
+
 
-def wtime(wsyn, wobs, nt, dt):
+def wtime(wsyn, wobs, nt, dt, maxlag=None, subsample=False):
     # cross correlation time
-    cc = abs(np.convolve(wobs, np.flipud(wsyn)))
-    cmax = 0
-    misfit = 0.
-    ioff = None
-    for it in range(2*nt-1):
-        if cc[it] > cmax:
-            cmax = cc[it]
-            ioff = it
-            misfit = (ioff-nt+1)*dt
-    if ioff is not None:
-        misfit = (ioff-nt+1)*dt
-    return misfit
-
-
-def wampl(wsyn, wobs, nt, dt):
+    lag = _xcorr_lag(wsyn, wobs, dt, maxlag, absolute=True,
+                     subsample=subsample)
+    return lag*dt
+
+
+def wampl(wsyn, wobs, nt, dt, maxlag=None):
     # cross correlation amplitude
-    cc = np.convolve(wobs, np.flipud(wsyn))
-    cmax = 0
-    ioff = 0
-    for it in range(2*nt-1):
-        if cc[it] > cmax:
-            cmax = cc[it]
-            ioff = it
-    if ioff <= 0:
-        wdiff = wsyn[ioff:] - wobs[:-ioff]
-    else:
-        wdiff = wsyn[:-ioff] - wobs[ioff:]
-    return np.sqrt(np.sum(wdiff*wdiff*dt))
+    lag = _xcorr_lag(wsyn, wobs, dt, maxlag)
+    wdiff = _lagdiff(wsyn, wobs, lag.astype(int))
+    return np.sqrt(np.sum(wdiff*wdiff*dt, axis=0))
 
 
 def wdiff(wsyn, wobs, nt, dt):
     # waveform difference
     wdiff = wsyn-wobs
-    return np.sqrt(np.sum(wdiff*wdiff*dt))
+    return np.sqrt(np.sum(wdiff*wdiff*dt, axis=0))
 
 
 def etime(wsyn, wobs, nt, dt):
@@ -48,12 +36,92 @@ def etime(wsyn, wobs, nt, dt):
 
 def ediff(wsyn, wobs, nt, dt, eps=0.05):
     # envelope difference
-    esyn = abs(scipy.signal.hilbert(wsyn))
-    eobs = abs(scipy.signal.hilbert(wobs))
+    esyn = abs(scipy.signal.hilbert(wsyn, axis=0))
+    eobs = abs(scipy.signal.hilbert(wobs, axis=0))
     ediff = esyn-eobs
-    return np.sqrt(np.sum(ediff*ediff*dt))
+    return np.sqrt(np.sum(ediff*ediff*dt, axis=0))
 
 
 def cdiff(wsyn, wobs, nt, dt):
-    cdiff = np.correlate(wobs, wsyn) - np.correlate(wobs, wobs)
-    return np.sqrt(np.sum(cdiff*cdiff*dt))
+    cdiff = np.sum(wobs*wsyn, axis=0) - np.sum(wobs*wobs, axis=0)
+    return np.sqrt(cdiff*cdiff*dt)
+
+
+### utility functions
+
+def _xcorr_lag(wsyn, wobs, dt, maxlag=None, absolute=False,
+               subsample=False):
+    """ Returns lag, in samples, at which cross correlation of each
+      observed trace with the synthetic trace is largest
+
+      Correlations are computed with FFTs padded to a fast length, one
+      block of traces at a time. If MAXLAG is given, in units of time, only
+      lags up to MAXLAG are considered. If SUBSAMPLE is set, lags are
+      refined by fitting a parabola to the peak and its neighbours. Traces
+      without a positive correlation peak are given zero lag.
+    """
+    nt = len(wsyn)
+    shape = wsyn.shape[1:]
+    wsyn = wsyn.reshape((nt, -1))
+    wobs = wobs.reshape((nt, -1))
+    nr = wsyn.shape[1]
+
+    nlag = nt-1
+    if maxlag is not None:
+        nlag = min(nlag, int(round(maxlag/dt)))
+    nfft = scipy.fftpack.next_fast_len(2*nt-1)
+
+    lag = np.zeros(nr)
+    step = max(1, BLOCKSIZE//nfft)
+    for imin in range(0, nr, step):
+        imax = min(imin+step, nr)
+        fsyn = np.fft.rfft(wsyn[:, imin:imax], nfft, axis=0)
+        fobs = np.fft.rfft(wobs[:, imin:imax], nfft, axis=0)
+        cc = np.fft.irfft(fobs*np.conj(fsyn), nfft, axis=0)
+
+        # lags -nlag through nlag
+        cc = np.concatenate((cc[nfft-nlag:], cc[:nlag+1]))
+        if absolute:
+            cc = abs(cc)
+
+        ir = np.arange(imax-imin)
+        imaxcc = np.argmax(cc, axis=0)
+        cmax = cc[imaxcc, ir]
+
+        # magnitude of correlation is bounded by product of trace norms
+        norm = np.sqrt(np.sum(wsyn[:, imin:imax]**2, axis=0) *
+                       np.sum(wobs[:, imin:imax]**2, axis=0))
+        valid = cmax > 1.e-12*norm
+
+        lag[imin:imax] = np.where(valid, imaxcc-nlag, 0)
+        if subsample:
+            lag[imin:imax] += np.where(valid, _parabolic(cc, imaxcc), 0.)
+
+    return lag.reshape(shape)
+
+
+def _parabolic(cc, imax):
+    """ Returns offset of vertex of parabola through correlation peak and
+      its neighbours, between -0.5 and 0.5 samples
+    """
+    ir = np.arange(cc.shape[1])
+    im = np.clip(imax, 1, len(cc)-2)
+    y0, y1, y2 = cc[im-1, ir], cc[im, ir], cc[im+1, ir]
+
+    curvature = y0 - 2.*y1 + y2
+    interior = (imax == im) & (curvature < 0)
+    curvature = np.where(interior, curvature, -1.)
+    return np.where(interior, 0.5*(y0 - y2)/curvature, 0.)
+
+
+def _lagdiff(wsyn, wobs, lag):
+    """ Differences synthetic traces and observed traces advanced by LAG
+      samples, over the samples where the two overlap
+    """
+    nt = len(wsyn)
+    it = np.arange(nt)[:, np.newaxis] + np.atleast_1d(lag)
+    ir = np.arange(it.shape[1])
+    wobs = wobs.reshape((nt, -1))[np.clip(it, 0, nt-1), ir]
+    overlap = (it >= 0) & (it < nt)
+    wdiff = np.where(overlap, wsyn.reshape((nt, -1)) - wobs, 0.)
+    return wdiff.reshape(wsyn.shape)
@@ -1,41 +1,31 @@
 
-import copy as _copy
 import glob as _glob
+import hashlib as _hashlib
+import os as _os
 import string as _string
 import numpy as _np
 
+from multiprocessing import Pool as _Pool
+from multiprocessing.pool import ThreadPool as _ThreadPool
+
 from seisflows.tools import unix
-from seisflows.tools.code import Struct
+from seisflows.tools.code import Struct, loadjson, savejson
 
+from seisflows.seistools import container as _container
 from seisflows.seistools.segy import segyreader
 
+# readers that accept a 'cache' option, see _ascii
+CACHEABLE = ['ascii_specfem2d', 'ascii_specfem3d', 'ascii_specfem3d_globe']
+
 
 def ascii_specfem2d(**kwargs):
     """ Reads seismic traces from text files
-    """
-    files = glob(solver='2d',**kwargs)
-    t = _np.loadtxt(files[0])[:, 0]
-    h = Struct()
-    h['t0'] = t[0]
-    h['nr'] = len(files)
-    h['ns'] = 1
-    h['dt'] = _np.mean(_np.diff(t))
-    h['nt'] = len(t)
 
-    # read data
-    s = _np.zeros((h['nt'], h['nr']))
-    i = 0
-    for file in files:
-        s[:, i] = _np.loadtxt(file)[:, 1]
-        i += 1
-
-    # keep track of file names
-    h.files = []
-    for file in files:
-        file = unix.basename(file)
-        h.files.append(file)
-
-    return s, h
+      See _ascii for caching and parallel parsing options.
+    """
+    options = _ascii_options(kwargs)
+    files = glob(solver='2d', **kwargs)
+    return _ascii(files, **options)
 
 
 def su_specfem2d(channel=None, prefix='SEM', suffix='.su'):
@@ -62,34 +52,21 @@ def su_specfem2d(channel=None, prefix='SEM', suffix='.su'):
 
 def ascii_specfem3d(**kwargs):
     """ Reads seismic traces from text files
-    """
-    files = glob(solver='3d',**kwargs)
-    t = _np.loadtxt(files[0])[:, 0]
-    h = Struct()
-    h['t0'] = t[0]
-    h['nr'] = len(files)
-    h['ns'] = 1
-    h['dt'] = _np.mean(_np.diff(t))
-    h['nt'] = len(t)
 
-    # read data
-    s = _np.zeros((h['nt'], h['nr']))
-    i = 0
-    for file in files:
-        s[:, i] = _np.loadtxt(file)[:, 1]
-        i += 1
-
-    # keep track of file names
-    h.files = []
-    for file in files:
-        file = unix.basename(file)
-        h.files.append(file)
+      See _ascii for caching and parallel parsing options.
+    """
+    options = _ascii_options(kwargs)
+    files = glob(solver='3d', **kwargs)
+    return _ascii(files, **options)
 
-    return s, h
 
+def su_specfem3d(channel=None, prefix='SEM', suffix='', verbose=False,
+                 nthreads=1):
+    """ Reads Seismic Unix files, one per processor rank
 
-def su_specfem3d(channel=None, prefix='SEM', suffix='', verbose=False):
-    """ Reads Seismic Unix file
+      Trace counts are taken from file sizes first, so that the combined
+      data and coordinate arrays are allocated once and each file is read
+      directly into its own slice, optionally using several threads.
     """
     if channel in ['x']:
         wildcard = '%s/*_dx_SU%s' % (prefix, suffix)
@@ -105,54 +82,44 @@ def su_specfem3d(channel=None, prefix='SEM', suffix='', verbose=False):
     files = _glob.glob(wildcard)
     files = sorted(files, key=lambda x: int(unix.basename(x).split('_')[0]))
 
-    file = files.pop(0)
-    d, h = segyreader.readsu(file)
+    # scalars are taken from the first file
+    d_, h = segyreader.readsu(files[0])
+    nt = d_.shape[0]
+
+    # first pass: count traces
+    nn = [h.nr] + [_su_ntraces(file, nt) for file in files[1:]]
+    nr = sum(nn)
+    ii = _np.cumsum([0] + nn)
+
+    d = _np.empty((nt, nr))
+    for key in ['sx', 'sy', 'sz', 'rx', 'ry', 'rz']:
+        array = _np.empty(nr)
+        array[:h.nr] = h[key]
+        h[key] = array
+    d[:, :h.nr] = d_
+
+    # second pass: read remaining files into place
+    def read(ifile):
+        _su_read_into(files[ifile], d, h, ii[ifile], ii[ifile+1])
+
+    if nthreads > 1:
+        pool = _ThreadPool(nthreads)
+        try:
+            pool.map(read, range(1, len(files)))
+        finally:
+            pool.close()
+    else:
+        for ifile in range(1, len(files)):
+            read(ifile)
 
     if verbose:
-        print file
-        print 'number of traces:', d.shape[1]
-        print 'min, max:', d.min(), d.max()
-        print ''
-
-    rx = _list(h.rx)
-    ry = _list(h.ry)
-    rz = _list(h.rz)
-    sx = _list(h.sx)
-    sy = _list(h.sy)
-    sz = _list(h.sz)
-
-    nn = [h.nr]
-    nr = h.nr
-
-    for file in files:
-        d_, h_ = segyreader.readsu(file)
-
-        # combine arrays
-        d = _np.column_stack((d, d_))
-
-        if verbose:
+        for ifile, file in enumerate(files):
             print file
-            print 'number of traces:', d_.shape[1]
-            print 'min, max:', d_.min(), d_.max()
+            print 'number of traces:', nn[ifile]
+            print 'min, max:', d[:, ii[ifile]:ii[ifile+1]].min(), \
+                               d[:, ii[ifile]:ii[ifile+1]].max()
             print ''
 
-        # combine headers
-        rx.extend(h_.rx)
-        ry.extend(h_.ry)
-        rz.extend(h_.rz)
-        sx.extend(h_.sx)
-        sy.extend(h_.sy)
-        sz.extend(h_.sz)
-        nn.append(h_.nr)
-        nr = nr + h_.nr
-
-    h.rx = _np.array(rx)
-    h.ry = _np.array(ry)
-    h.rz = _np.array(rz)
-    h.sx = _np.array(sx)
-    h.sy = _np.array(sy)
-    h.sz = _np.array(sz)
-
     h.nn = nn
     h.nr = nr
 
@@ -161,30 +128,20 @@ def su_specfem3d(channel=None, prefix='SEM', suffix='', verbose=False):
 
 def ascii_specfem3d_globe(**kwargs):
     """ Reads seismic traces from text files
+
+      See _ascii for caching and parallel parsing options.
     """
+    options = _ascii_options(kwargs)
     files = glob(solver='3d_globe', suffix='sem.ascii', **kwargs)
-    t = _np.loadtxt(files[0])[:, 0]
-    h = Struct()
-    h['t0'] = t[0]
-    h['nr'] = len(files)
-    h['ns'] = 1
-    h['dt'] = _np.mean(_np.diff(t))
-    h['nt'] = len(t)
+    return _ascii(files, **options)
 
-    # read data
-    s = _np.zeros((h['nt'], h['nr']))
-    i = 0
-    for file in files:
-        s[:, i] = _np.loadtxt(file)[:, 1]
-        i += 1
 
-    # keep track of file names
-    h.files = []
-    for file in files:
-        file = unix.basename(file)
-        h.files.append(file)
+def container(channel=None, prefix='SEM', suffix='', traces=None):
+    """ Reads traces packed into a single container per source
 
-    return s, h
+      See seistools.container.
+    """
+    return _container.read(prefix+suffix, channel, traces)
 
 
 ### utility functions
@@ -232,7 +189,142 @@ def glob(files=None, channel=None, prefix='SEM', suffix='semd', solver='3d'):
     return files
 
 
-def _list(array):
-    array2 = (_copy.copy(array))
-    return list(array2)
+def _ascii_options(kwargs):
+    """ Separates _ascii options from glob arguments
+    """
+    return dict([(key, kwargs.pop(key)) for key in ['cache', 'nproc']
+                 if key in kwargs])
+
+
+def _ascii(files, cache=False, nproc=1):
+    """ Reads seismic traces from text files
+
+      Files are parsed, optionally by NPROC processes, into a trace array.
+      If CACHE is set, the array and a header sidecar are also stored next
+      to the files, and later calls map the stored array into memory, as
+      long as the names, sizes, inodes and modification and status change
+      times of the text files are unchanged. Rewrites that keep all of
+      these, such as in-place rewrites of the same size within the time
+      resolution of the file system, go unnoticed, so caching is meant for
+      files that are written once, such as observations.
+    """
+    stamp = [list(_stamp(file)) for file in files]
+    prefix = _ascii_cachefile(files)
+
+    if cache:
+        try:
+            h = Struct(loadjson(prefix+'.json'))
+            if h.pop('stamp') == stamp:
+                s = _np.load(prefix+'.npy', mmap_mode='c')
+                h['t0'] = _np.float64(h['t0'])
+                h['dt'] = _np.float64(h['dt'])
+                h['files'] = map(str, h['files'])
+                return s, h
+        except (IOError, OSError, KeyError, ValueError):
+            pass
+
+    if nproc > 1:
+        pool = _Pool(nproc)
+        try:
+            traces = pool.map(_loadtxt, files)
+        finally:
+            pool.close()
+    else:
+        traces = map(_loadtxt, files)
+
+    t = traces[0][:, 0]
+    h = Struct()
+    h['t0'] = t[0]
+    h['nr'] = len(files)
+    h['ns'] = 1
+    h['dt'] = _np.mean(_np.diff(t))
+    h['nt'] = len(t)
+
+    # read data
+    s = _np.zeros((h['nt'], h['nr']))
+    for i, trace in enumerate(traces):
+        s[:, i] = trace[:, 1]
+
+    # keep track of file names
+    h.files = []
+    for file in files:
+        file = unix.basename(file)
+        h.files.append(file)
+
+    if cache:
+        _ascii_save(prefix, s, h, stamp)
+
+    return s, h
+
+
+def _ascii_save(prefix, s, h, stamp):
+    # write to temporary files first, so that concurrent readers never see
+    # a partial cache; the sidecar goes last since it validates the block
+    suffix = '.%d' % _os.getpid()
+    try:
+        with open(prefix+'.npy'+suffix, 'wb') as f:
+            _np.save(f, s)
+        savejson(prefix+'.json'+suffix, dict(h, stamp=stamp))
+        _os.rename(prefix+'.npy'+suffix, prefix+'.npy')
+        _os.rename(prefix+'.json'+suffix, prefix+'.json')
+    except (IOError, OSError):
+        # read-only directories are fine, just slower next time
+        for filename in [prefix+'.npy'+suffix, prefix+'.json'+suffix]:
+            if _os.path.exists(filename):
+                _os.remove(filename)
+
+
+def _ascii_cachefile(files):
+    """ Returns cache file prefix, which depends on the list of text files
+    """
+    names = '\n'.join([unix.basename(file) for file in files])
+    return _os.path.join(_os.path.dirname(_os.path.abspath(files[0])),
+                         '.ascii_' + _hashlib.md5(names).hexdigest())
+
+
+def _loadtxt(file):
+    """ Parses two-column text file, much faster than numpy.loadtxt
+    """
+    with open(file) as f:
+        text = f.read()
+    values = _np.fromstring(text, sep=' ')
+
+    # parsing stops at the first bad token, so anything but two values per
+    # line is handed to numpy.loadtxt, which reports errors and copes with
+    # blank lines and comments
+    nline = text.count('\n') + (not text.endswith('\n'))
+    if values.size != 2*nline:
+        return _np.loadtxt(file)
+    return values.reshape((-1, 2))
+
+
+def _stamp(file):
+    info = _os.stat(file)
+    return info.st_size, info.st_ino, info.st_mtime, info.st_ctime
+
+
+def _su_ntraces(file, nt):
+    """ Returns number of traces in Seismic Unix file
+    """
+    return int(_os.path.getsize(file)/(240 + 4*nt))
+
+
+def _su_read_into(file, d, h, imin, imax):
+    """ Reads traces of Seismic Unix file into columns IMIN through IMAX-1
+      of combined data array and header arrays
+    """
+    nt = d.shape[0]
+    traces = _np.memmap(file, mode='r', shape=(imax-imin,),
+                        dtype=segyreader.tracedtype(nt, '<'))
+
+    d[:, imin:imax] = traces['data'].T
+
+    c1 = segyreader.COORDSCALAR
+    c2 = segyreader.DEPTHSCALAR
+    h.sx[imin:imax] = c1*traces['SourceX']
+    h.sy[imin:imax] = c1*traces['SourceY']
+    h.sz[imin:imax] = c2*traces['SourceWaterDepth']
+    h.rx[imin:imax] = c1*traces['GroupX']
+    h.ry[imin:imax] = c1*traces['GroupY']
+    h.rz[imin:imax] = c2*traces['GroupWaterDepth']
 
@@ -3,5 +3,5 @@
 import reader as segyreader
 import writer as segywriter
 
-from reader import readsegy, readsu
+from reader import readsegy, readsu, TraceIndex
 from writer import writesegy, writesu
@@ -0,0 +1,121 @@
+
+import numpy as np
+
+
+# number of samples converted at a time
+BLOCKSIZE = 2**16
+
+# SEGY data sample format codes and corresponding storage types
+SAMPLE_FORMATS = {
+    1: 'u4',    # 4-byte IBM floating point
+    2: 'i4',    # 4-byte two's complement integer
+    3: 'i2',    # 2-byte two's complement integer
+    5: 'f4',    # 4-byte IEEE floating point
+    8: 'i1'}    # 1-byte two's complement integer
+
+
+def sampletype(code, endian):
+    """ Returns numpy type in which samples of given format are stored
+    """
+    if code not in SAMPLE_FORMATS:
+        raise ValueError("Unsupported SEGY data sample format: %s" % code)
+    return np.dtype(endian + SAMPLE_FORMATS[code])
+
+
+def samplesize(code):
+    return sampletype(code, '<').itemsize
+
+
+def decode(samples, code):
+    """ Converts stored samples of given format to double precision
+    """
+    if code == 1:
+        return ibm2ieee(samples)
+    return samples.astype(float)
+
+
+def encode(samples, code):
+    """ Converts samples to values of given storage format, ready to be
+      assigned to an array of type sampletype(code)
+    """
+    if code == 1:
+        return ieee2ibm(samples)
+    elif code == 5:
+        return samples
+
+    # integer formats are rounded and must fit without clipping
+    info = np.iinfo(SAMPLE_FORMATS[code])
+    values = np.round(samples)
+    if np.any(values < info.min) or np.any(values > info.max):
+        raise ValueError("Sample values out of range for format %d" % code)
+    return values
+
+
+def ibm2ieee(ibm):
+    """ Converts IBM single precision floats, given as 32-bit unsigned
+      integers, to double precision
+
+      IBM floats have a sign bit, a 7-bit base 16 exponent biased by 64
+      and a 24-bit fraction, so every value is exactly representable. The
+      sign and exponent share the leading byte, which is used to look up
+      a signed scale factor.
+    """
+    ibm = np.asarray(ibm, dtype='u4')
+    flat = ibm.reshape(-1)
+    ieee = np.empty(flat.shape)
+
+    # working through blocks that fit in cache is several times faster
+    for start in range(0, flat.size, BLOCKSIZE):
+        block = flat[start:start+BLOCKSIZE]
+        np.multiply(block & 0x00ffffff, np.take(_IBM_SCALE, block >> 24),
+                    out=ieee[start:start+BLOCKSIZE])
+
+    return ieee.reshape(ibm.shape)
+
+
+def ieee2ibm(values):
+    """ Converts floats to IBM single precision, returned as 32-bit unsigned
+      integers
+
+      Fractions are rounded to nearest. Magnitudes too large for the IBM
+      format saturate, magnitudes too small lose precision gradually and
+      NaNs are written as zero.
+    """
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    shape = values.shape
+    values = values.reshape(-1)
+    magnitude = np.abs(values)
+
+    # smallest base 16 exponent for which the fraction is less than one
+    exponent = np.frexp(magnitude)[1]
+    exponent = np.clip((exponent + 3) >> 2, -64, 64)
+
+    fraction = np.rint(magnitude * _IBM_INVSCALE[exponent + 64])
+    fraction = fraction.astype('u4')
+
+    # rounding may carry into the next hexadecimal digit
+    carry = fraction >> 24
+    fraction >>= carry << 2
+    exponent = (exponent + 64 + carry).astype('u4')
+
+    # saturate
+    overflow = exponent > 127
+    fraction[overflow] = 0x00ffffff
+    exponent[overflow] = 127
+
+    nonzero = (fraction != 0).astype('u4')
+    sign = (values < 0).astype('u4')
+    ibm = (((sign << 7) | exponent) << 24 | fraction) * nonzero
+    return ibm.reshape(shape)
+
+
+### utility functions
+
+_byte = np.arange(256)
+
+# signed value of one unit of the fraction, by leading byte
+_IBM_SCALE = np.ldexp(np.where(_byte & 0x80, -1., 1.),
+                      4*((_byte & 0x7f) - 64) - 24)
+
+# inverse of scale for base 16 exponents -64 through 64
+_IBM_INVSCALE = np.ldexp(1., 24 - 4*np.arange(-64, 65))
@@ -1,3 +1,6 @@
+import os
+import struct
+
 import numpy as np
 
 from seisflows.tools.array import uniquerows
@@ -5,11 +8,11 @@ from seisflows.tools.code import Struct
 from seisflows.tools.io import BinaryReader, mychar, mysize
 
 from seisflows.seistools.shared import SeisStruct
+from seisflows.seistools.segy.formats import decode, sampletype, samplesize
 from seisflows.seistools.segy.headers import \
     SEGY_TAPE_LABEL, SEGY_BINARY_HEADER, SEGY_TRACE_HEADER
 
 
-NMAX = 100000
 FIXEDLENGTH = True
 SAVEHEADERS = True
 COORDSCALAR = 1.
@@ -42,64 +45,77 @@ class SeismicReader(BinaryReader):
     """
 
     def ReadSeismicData(self):
+        if not FIXEDLENGTH:
+            self.ReadVariableLength()
+            return
+
         nsamples = int(self.read('int16', 1, self.offset + 114)[0])
         nbytes = int(nsamples*self.dsize + 240)
         ntraces = int((self.size - self.offset)/nbytes)
 
-        # prepare offset pointers
-        if FIXEDLENGTH:
-            tracelen = [nsamples]*ntraces
-            traceptr = [nbytes*i + self.offset for i in range(ntraces)]
+        # map headers and samples of all traces at once
+        traces = np.memmap(self.file.name, mode='r',
+                           dtype=tracedtype(nsamples, self.endian,
+                                            code=self.segycode),
+                           offset=self.offset, shape=(ntraces,))
 
-        else:
-            ntraces = 1
-            tracelen = []
-            traceptr = [self.offset]
-
-            while 1:
-                ntraces += 1
-                nsamples = int(self.read('int16', 1, traceptr[-1] + 114)[0])
-                nbytes = nsamples*self.dsize + 240
-                tracelen.append(nsamples)
-                traceptr.append(traceptr[-1] + nbytes)
-
-                if ntraces > NMAX:
-                    raise Exception
-                elif traceptr[-1] >= self.size:
-                    raise Exception
-                traceptr = traceptr[:-1]
-                tracelen = tracelen[:-1]
-
-        # preallocate trace headers
+        # header fields are strided views into the mapped file
         if SAVEHEADERS:
-            h = [self.scan(SEGY_TRACE_HEADER, traceptr[0], contiguous=False)]
-            h = h*ntraces
+            h = traces[[field[-1] for field in SEGY_TRACE_HEADER]]
         else:
             h = []
 
-        # preallocate data array
-        if FIXEDLENGTH:
-            d = np.zeros((nsamples, ntraces))
+        # converting to native doubles is the only copy
+        d = decode(traces['data'], self.segycode).T
+
+        # store results
+        self.ntraces = ntraces
+        self.hdrs = h
+        self.data = d
+
+    def ReadVariableLength(self):
+        """ Reads traces of varying length
+
+          Traces are zero-padded to the length of the longest trace. The
+          number of samples in each trace is kept in self.tracelen and the
+          corresponding mask of valid samples in self.mask.
+        """
+        offsets, tracelen = scan_offsets(self.file.name, self.offset,
+                                         self.endian, self.dsize)
+        ntraces = len(offsets)
+
+        raw = np.memmap(self.file.name, mode='r', dtype='uint8')
+
+        # gather all headers with a single fancy-indexing operation
+        if SAVEHEADERS:
+            h = raw[offsets[:, np.newaxis] + np.arange(240)]
+            h = h.view(headerdtype(self.endian))[:, 0]
         else:
-            d = np.zeros((tracelen.max(), len(traceptr)))
+            h = []
 
-        # read trace headers and data
+        d = np.zeros((tracelen.max(), ntraces))
         for k in range(ntraces):
-            if SAVEHEADERS:
-                h[k] = self.scan(SEGY_TRACE_HEADER, traceptr[k],
-                                 contiguous=False)
-            d[:, k] = self.read(self.dtype, nsamples, traceptr[k] + 240)
+            start = offsets[k] + 240
+            stop = start + self.dsize*tracelen[k]
+            d[:tracelen[k], k] = decode(raw[start:stop].view(
+                sampletype(self.segycode, self.endian)), self.segycode)
 
         # store results
         self.ntraces = ntraces
+        self.tracelen = tracelen
+        self.mask = np.arange(d.shape[0])[:, np.newaxis] < tracelen
         self.hdrs = h
         self.data = d
 
     def getstruct(self):
         nr = self.ntraces
 
-        # collect scalars
-        nt = self.getscalar('NumberSamples')
+        # collect scalars; traces of varying length are padded to the
+        # length of the data array
+        if hasattr(self, 'tracelen'):
+            nt = np.int_(self.data.shape[0])
+        else:
+            nt = self.getscalar('NumberSamples')
         ts = self.getscalar('RecordingDelay_ms')
         dt = self.getscalar('SampleInterval_ms')
 
@@ -127,20 +143,26 @@ class SeismicReader(BinaryReader):
         nsrc = len(uniquerows(sxyz))
         nrec = len(uniquerows(rxyz))
 
-        return SeisStruct(nr, nt, dt, ts,
-                          c1*sx, c1*sy, c2*sz,
-                          c1*rx, c1*ry, c2*rz,
-                          nsrc, nrec)
+        h = SeisStruct(nr, nt, dt, ts,
+                       c1*sx, c1*sy, c2*sz,
+                       c1*rx, c1*ry, c2*rz,
+                       nsrc, nrec)
+
+        # number of samples in each trace, which tells padding from data
+        if hasattr(self, 'tracelen'):
+            h.tracelen = self.tracelen
+        return h
 
     def getarray(self, key):
         # collect array
-        list = [hdr[key] for hdr in self.hdrs]
-        return np.array(list)
+        if isinstance(self.hdrs, list):
+            return np.array([hdr[key] for hdr in self.hdrs])
+        return self.hdrs[key]
 
     def getscalar(self, key):
         # collect scalar
         array = self.getarray(key)
-        return array[0]
+        return np.int_(array[0])
 
 
 class SegyReader(SeismicReader):
@@ -152,6 +174,7 @@ class SegyReader(SeismicReader):
 
         self.dtype = 'float'
         self.dsize = mysize(self.dtype)
+        self.segycode = 5
         self.offset = 0
 
         # check byte order
@@ -185,8 +208,12 @@ class SegyReader(SeismicReader):
         # check revision number
         self.segyvers = '1.0'
 
-        # check format code
-        self.segycode = 5
+        # check format code; files that leave it unset are taken to hold
+        # IEEE floats
+        code = int(self.segyBinHeader.TraceMachineFormatCode)
+        if code:
+            self.segycode = code
+            self.dsize = samplesize(code)
 
         # check trace length
         if FIXEDLENGTH:
@@ -203,6 +230,7 @@ class SuReader(SeismicReader):
 
         self.dtype = 'float'
         self.dsize = mysize(self.dtype)
+        self.segycode = 5
         self.offset = 0
 
         # check byte order
@@ -212,6 +240,234 @@ class SuReader(SeismicReader):
             raise ValueError("SU Reader should specify the endianness")
 
 
+class TraceIndex(object):
+    """ Random access to traces of a SU or SEGY file
+
+      A compact index holding the position, sequence number and source and
+      receiver coordinates of each trace is built on first use and cached
+      next to the file. Subsequent reads touch only the requested traces.
+
+      Example:
+        index = TraceIndex('Ux_file_single.su')
+        d, h = index.read_traces(index.select(offsets=(0., 500.)))
+    """
+
+    FIELDS = [
+        'TraceSequenceLine',
+        'SourceX',
+        'SourceY',
+        'SourceWaterDepth',
+        'GroupX',
+        'GroupY',
+        'GroupWaterDepth']
+
+    def __init__(self, filename, format='su', cache=True):
+        if format == 'su':
+            reader = SuReader(filename, endian='<')
+        elif format == 'segy':
+            reader = SegyReader(filename, endian='>')
+            reader.ReadSegyHeaders()
+        else:
+            raise ValueError("Unknown format: %s" % format)
+
+        self.filename = filename
+        self.endian = reader.endian
+        self.offset = reader.offset
+        self.code = reader.segycode
+
+        # scalars are taken from the first trace header
+        self.nt = int(reader.read('int16', 1, self.offset + 114)[0])
+        self.ts = np.int_(reader.read('int16', 1, self.offset + 108)[0])
+        self.dt = np.int_(reader.read('int16', 1, self.offset + 116)[0])
+
+        self.nbytes = 240 + self.nt*reader.dsize
+        self.ntraces = int((reader.size - self.offset)/self.nbytes)
+
+        self.index = None
+        if cache:
+            self.index = self.load()
+        if self.index is None:
+            self.index = self.build()
+            if cache:
+                self.save()
+
+    def build(self):
+        """ Scans trace headers and returns index
+        """
+        traces = self.traces()
+        index = np.zeros(self.ntraces, dtype=[('offset', 'int64')] +
+                         [(key, 'int32') for key in self.FIELDS])
+        index['offset'] = self.offset + self.nbytes*np.arange(self.ntraces)
+        for key in self.FIELDS:
+            index[key] = traces[key]
+        return index
+
+    def read_traces(self, selector=slice(None)):
+        """ Reads selected traces
+
+          SELECTOR can be a slice or a sequence of trace numbers, or a
+          boolean mask as returned by SELECT. Returns data array and header
+          struct in the same form as readsu.
+        """
+        if isinstance(selector, slice):
+            itraces = selector
+        else:
+            itraces = np.asarray(selector)
+            if itraces.dtype == bool:
+                itraces = np.flatnonzero(itraces)
+
+        d = decode(self.traces()['data'][itraces], self.code).T
+        index = self.index[itraces]
+
+        c1 = COORDSCALAR
+        c2 = DEPTHSCALAR
+
+        sxyz = np.column_stack([index['SourceX'], index['SourceY'],
+                                index['SourceWaterDepth']])
+        rxyz = np.column_stack([index['GroupX'], index['GroupY'],
+                                index['GroupWaterDepth']])
+
+        h = SeisStruct(len(index), self.nt, self.dt, self.ts,
+                       c1*index['SourceX'], c1*index['SourceY'],
+                       c2*index['SourceWaterDepth'],
+                       c1*index['GroupX'], c1*index['GroupY'],
+                       c2*index['GroupWaterDepth'],
+                       nrec=len(uniquerows(rxyz)) if len(index) else 0,
+                       nsrc=len(uniquerows(sxyz)) if len(index) else 0)
+        return d, h
+
+    def select(self, receivers=None, offsets=None):
+        """ Returns boolean mask of traces matching all given criteria
+
+          RECEIVERS is a sequence of (x, y) receiver coordinates. OFFSETS
+          is a (min, max) window of horizontal source-receiver distance.
+        """
+        mask = np.ones(self.ntraces, dtype=bool)
+        c1 = COORDSCALAR
+
+        if receivers is not None:
+            receivers = np.asarray(receivers, dtype=float).reshape(-1, 2)
+            rx = c1*self.index['GroupX']
+            ry = c1*self.index['GroupY']
+            match = np.zeros(self.ntraces, dtype=bool)
+            for x, y in receivers:
+                match |= (rx == x) & (ry == y)
+            mask &= match
+
+        if offsets is not None:
+            dx = c1*(self.index['GroupX'] - self.index['SourceX'])
+            dy = c1*(self.index['GroupY'] - self.index['SourceY'])
+            distance = np.sqrt(dx**2. + dy**2.)
+            mask &= (distance >= offsets[0]) & (distance <= offsets[1])
+
+        return mask
+
+    def traces(self):
+        """ Maps headers and samples of all traces without reading them
+        """
+        return np.memmap(self.filename, mode='r',
+                         dtype=tracedtype(self.nt, self.endian, self.code),
+                         offset=self.offset, shape=(self.ntraces,))
+
+    def cachefile(self):
+        return self.filename + '.index.npz'
+
+    def load(self):
+        """ Returns cached index, or None if missing or out of date
+        """
+        try:
+            with np.load(self.cachefile()) as cached:
+                stamp, index = cached['stamp'], cached['index']
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+        if list(stamp) != self.stamp() or len(index) != self.ntraces:
+            return None
+        return index
+
+    def save(self):
+        # write to temporary file first, so that concurrent readers never
+        # see a partial index
+        tmpfile = self.cachefile() + '.%d' % os.getpid()
+        try:
+            with open(tmpfile, 'wb') as f:
+                np.savez(f, stamp=self.stamp(), index=self.index)
+            os.rename(tmpfile, self.cachefile())
+        except (IOError, OSError):
+            # read-only directories are fine, just slower next time
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+
+    def stamp(self):
+        info = os.stat(self.filename)
+        return [float(info.st_size), float(info.st_mtime)]
+
+
+def headerdtype(endian):
+    """ Returns structured dtype describing a 240 byte trace header
+    """
+    return tracedtype(0, endian, samples=False)
+
+
+def tracedtype(nsamples, endian, code=5, samples=True):
+    """ Returns structured dtype describing one trace, consisting of a
+      240 byte header followed by samples of given SEGY format code
+    """
+    names = []
+    formats = []
+    offsets = []
+    for fmt, length, offset, name in SEGY_TRACE_HEADER:
+        names += [name]
+        formats += [endian + mychar(fmt)]
+        offsets += [offset]
+
+    if samples:
+        names += ['data']
+        formats += [(sampletype(code, endian), nsamples)]
+        offsets += [240]
+
+    return np.dtype({
+        'names': names,
+        'formats': formats,
+        'offsets': offsets,
+        'itemsize': 240 + samplesize(code)*nsamples})
+
+
+def scan_offsets(filename, origin, endian, dsize=4, chunksize=2**24):
+    """ Returns byte offsets and lengths of traces in a file in which the
+      number of samples varies from trace to trace
+
+      Trace headers are located by reading the NumberSamples field from
+      large buffered chunks, so that a scan costs at most one sequential
+      read of the file; chunks that would contain only samples are skipped.
+    """
+    size = os.path.getsize(filename)
+    fmt = endian + 'H'
+
+    offsets = []
+    lengths = []
+    with open(filename, 'rb') as f:
+        buf = ''
+        start = 0
+        position = origin
+        while position < size:
+            if position + 116 > start + len(buf):
+                f.seek(position)
+                buf = f.read(max(chunksize, 116))
+                start = position
+                if len(buf) < 116:
+                    break
+            nsamples = struct.unpack_from(fmt, buf, position - start + 114)[0]
+            offsets.append(position)
+            lengths.append(nsamples)
+            position += 240 + dsize*nsamples
+
+    if position != size:
+        raise ValueError("Truncated trace at byte %d of %s" %
+                         (offsets[-1] if offsets else origin, filename))
+
+    return np.array(offsets, dtype='int64'), np.array(lengths, dtype=int)
+
+
 def readsegy(filename):
     """ SEGY convenience function
     """
@@ -1,8 +1,12 @@
+import struct
+
 import numpy as np
 
 from seisflows.tools.io import BinaryWriter, mychar, mysize
 
-from headers import SEGY_TRACE_HEADER
+from formats import encode
+from headers import SEGY_BINARY_HEADER, SEGY_TRACE_HEADER
+from reader import tracedtype
 
 FIELDS = [
     'TraceSequenceLine',
@@ -33,12 +37,12 @@ class SeismicWriter(BinaryWriter):
         self.dtype = 'float'
         self.dsize = mysize(self.dtype)
         self.endian = '<'
+        self.segycode = 5
         self.offset = 0
 
     def prepareTraceData(self, h):
 
         nr = int(h.nr)
-        self.vals = [[1] for k in range(nr)]
         self.ntraces = nr
 
         c1 = 1
@@ -53,6 +57,9 @@ class SeismicWriter(BinaryWriter):
         if h.dt >= dt_max:
             dt = 0
 
+        self.nt = nt
+        self.dt = dt
+
         sx = self.getarray(h, 'sx', c1)
         sy = self.getarray(h, 'sy', c1)
         sz = self.getarray(h, 'sz', c2)
@@ -61,40 +68,36 @@ class SeismicWriter(BinaryWriter):
         ry = self.getarray(h, 'ry', c1)
         rz = self.getarray(h, 'rz', c2)
 
-        # prepare trace headers
-        for k in range(nr):
-            self.vals[k].append(sz[k])
-            self.vals[k].append(rz[k])
-            self.vals[k].append(c1)
-            self.vals[k].append(c2)
-            self.vals[k].append(sx[k])
-            self.vals[k].append(sy[k])
-            self.vals[k].append(rx[k])
-            self.vals[k].append(ry[k])
-            self.vals[k].append(ts)
-            self.vals[k].append(nt)
-            self.vals[k].append(dt)
+        # prepare trace headers, one column per field of SEGY_TRACE_HEADER
+        self.vals = [1, sz, rz, c1, c2, sx, sy, rx, ry, ts, nt, dt]
 
     def getarray(self, h, key, constant):
-        if h[key] == []:
-            return [0]*self.ntraces
+        if len(h[key]) == 0:
+            return np.zeros(self.ntraces, dtype=int)
 
-        array = [int(f*constant) for f in h[key]]
-        return array
+        # truncates toward zero, as int() does
+        return (np.asarray(h[key], dtype=float)*constant).astype(int)
 
     def writeTraceData(self, d):
 
         nsamples = d.shape[0]
-        nbytes = nsamples*self.dsize + 240
         nr = d.shape[1]
 
-        for k in range(nr):
-            # write trace header
-            self.printf(SEGY_TRACE_HEADER, self.vals[k],
-                        k*nbytes, contiguous=False)
+        # assemble headers and data of all traces, then write them at once
+        traces = np.zeros(nr, dtype=tracedtype(nsamples, self.endian,
+                                               code=self.segycode))
+
+        for field, val in zip(SEGY_TRACE_HEADER, self.vals):
+            fmt, name = field[0], field[-1]
+            info = np.iinfo(fmt)
+            if np.any(val < info.min) or np.any(val > info.max):
+                raise ValueError("Header value out of range: %s" % name)
+            traces[name] = val
+
+        traces['data'] = encode(d.T, self.segycode)
 
-            # write trace data
-            self.write(self.dtype, d[:, k], nsamples, k*nbytes + 240)
+        self.file.seek(self.offset)
+        traces.tofile(self.file)
 
 
 class SuWriter(SeismicWriter):
@@ -102,8 +105,46 @@ class SuWriter(SeismicWriter):
         SeismicWriter.__init__(self, fname)
 
 
-def writesegy():
-    raise NotImplementedError
+class SegyWriter(SeismicWriter):
+    def __init__(self, fname, code=1):
+        SeismicWriter.__init__(self, fname)
+
+        self.endian = '>'
+        self.segycode = code
+
+    def writeSegyHeaders(self):
+        # write textual file header, in EBCDIC
+        lines = ['C%2d SEISFLOWS' % (k+1) for k in range(40)]
+        text = ''.join([line.ljust(80) for line in lines])
+        self.file.seek(0)
+        self.file.write(text.decode('ascii').encode('cp500'))
+
+        # write binary file header
+        vals = {
+            'SamplingTime': self.dt,
+            'NumberSamples': self.nt,
+            'TraceMachineFormatCode': self.segycode,
+            'RevisionNumber': 0x0100,
+            'FixedLengthTraceFlag': 1}
+
+        header = bytearray(400)
+        for fmt, length, offset, name in SEGY_BINARY_HEADER:
+            if name in vals:
+                struct.pack_into(self.endian + mychar(fmt), header, offset,
+                                 vals[name])
+        self.file.write(bytes(header))
+
+        self.offset = 3600
+
+
+def writesegy(filename, d, h, code=1):
+    """ Writes SEGY file with samples in given format, by default IBM
+      floating point
+    """
+    obj = SegyWriter(filename, code)
+    obj.prepareTraceData(h)
+    obj.writeSegyHeaders()
+    obj.writeTraceData(d)
 
 
 def writesu(filename, d, h):
@@ -5,7 +5,7 @@ import numpy as np
 from collections import Mapping
 
 from seisflows.tools.code import Struct
-from seisflows.tools.io import loadbin
+from seisflows.tools.io import iomap, loadbin
 
 
 class SeisStruct(Struct):
@@ -28,7 +28,7 @@ class ModelStruct(Mapping):
         raise NotImplementedError
 
 
-def load1(dirname, parameters, mapping, nproc, logfile=None):
+def load1(dirname, parameters, mapping, nproc, logfile=None, nthreads=1):
     """ reads SPECFEM model
 
       Models are stored as a Fortran binary fomrat and and separated into 
@@ -36,11 +36,9 @@ def load1(dirname, parameters, mapping, nproc, logfile=None):
     """
     parts = {}
     for key in sorted(parameters):
-        parts[key] = []
-        for iproc in range(nproc):
-            filename = 'proc%06d_%s.bin' % (iproc, mapping(key))
-            part = loadbin(join(dirname, filename))
-            parts[key].append(part)
+        filenames = [join(dirname, 'proc%06d_%s.bin' % (iproc, mapping(key)))
+                     for iproc in range(nproc)]
+        parts[key] = iomap(loadbin, filenames, nthreads)
     return parts
 
 
@@ -73,24 +71,28 @@ def load2(dirname, parameters, mapping, nproc, logfile):
     return parts
 
 
-def load3(dirname, parameters, mapping, nproc, logfile):
+def load3(dirname, parameters, mapping, nproc, logfile, nthreads=1):
     """ reads SPECFEM model
 
       Provides the same functionality as load1 but with debugging output and
-      improved memory usage.
+      improved memory usage. Files of different processor ranks can be read
+      by several threads.
     """
     minmax = {}
 
     def helper_func(key):
-        parts = []
-        minmax[mapping(key)] = [+np.Inf,-np.Inf]
-        for iproc in range(nproc):
+        def read(iproc):
             filename = 'proc%06d_%s.bin' % (iproc, mapping(key))
             part = loadbin(join(dirname, filename))
-            parts.append(part)
-            # keep track of min, max
-            if part.min() < minmax[mapping(key)][0]: minmax[mapping(key)][0] = part.min()
-            if part.max() > minmax[mapping(key)][1]: minmax[mapping(key)][1] = part.max()
+            return part, part.min(), part.max()
+
+        results = iomap(read, range(nproc), nthreads)
+        parts = [part for part, _, _ in results]
+
+        # keep track of min, max
+        minmax[mapping(key)] = [
+            min([+np.Inf] + [pmin for _, pmin, _ in results]),
+            max([-np.Inf] + [pmax for _, _, pmax in results])]
         return parts
 
     class helper_class(Mapping):
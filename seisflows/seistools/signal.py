@@ -1,75 +1,100 @@
 
+import hashlib
+import os
+from collections import OrderedDict
+
 import numpy as np
 
+import scipy.fftpack
 import scipy.signal as signal
 
+# filter designs, by type, corner frequencies, sampling rate and order
+_FILTERS = {}
+
+# number of bytes of mute masks, and of windows, kept in memory
+CACHESIZE = 2**28
+
+# mute masks and windows, by trace length, geometry and parameters
+_MUTES = OrderedDict()
+_WINDOWS = OrderedDict()
+
+
+def sbandpass(s, h, freqlo, freqhi, method='sos'):
+    fs = 1/h.dt
+    s[:] = bandpass(s, freqlo, freqhi, fs, method=method)
+    return s
+
+
+def slowpass(s, h, freq, method='sos'):
+    fs = 1/h.dt
+    s[:] = lowpass(s, freq, fs, method=method)
+    return s
+
+
+def shighpass(s, h, freq, method='sos'):
+    fs = 1/h.dt
+    s[:] = highpass(s, freq, fs, method=method)
+    return s
 
-def sbandpass(s, h, freqlo, freqhi):
-    nr = h.nr
-    dt = h.dt
-    fs = 1/dt
 
-    for ir in range(0, nr):
-        s[:,ir] = bandpass(s[:,ir],freqlo,freqhi,fs)
+def smute(s, h, vel, toff, xoff=0, constant_spacing=False, path=None):
+    s *= mutemask(h, vel, toff, xoff, constant_spacing, path)
     return s
 
 
-def slowpass(s, h, freq):
-    raise NotImplementedError
+def mutemask(h, vel, toff, xoff=0, constant_spacing=False, path=None):
+    """ Returns (nt, nr) array that mutes arrivals before a tapered window
+      starting at time TOFF + offset/VEL
 
+      Mute times depend only on acquisition geometry, so masks are cached
+      by trace length, receiver offsets and mute parameters, and returned
+      as read-only arrays. The cache lives in memory and so only helps
+      within one process, unless PATH is given, in which case masks are
+      also saved to and mapped from files in that directory.
+    """
+    # calculate offsets
+    if constant_spacing:
+        offsets = np.arange(h.nr) - xoff
+    else:
+        offsets = np.asarray(h.rx, dtype=float) - h.sx[0] - xoff
 
-def shighpass(s, h, freq):
-    raise NotImplementedError
+    key = (h.nt, h.dt, vel, toff, hashlib.md5(offsets.tostring()).hexdigest())
+    if key in _MUTES:
+        return _recall(_MUTES, key)
 
+    if path:
+        filename = os.path.join(path,
+            'mute_' + hashlib.md5(repr(key)).hexdigest() + '.npy')
+        try:
+            return _remember(_MUTES, key, np.load(filename, mmap_mode='r'))
+        except (IOError, ValueError):
+            pass
 
-def smute(s, h, vel, toff, xoff=0, constant_spacing=False):
     nt = h.nt
-    dt = h.dt
-    nr = h.nr
-
-    # construct tapered window
-    length = 400
-    win = np.sin(np.linspace(0, 1, 2*length))
-    win = win[0:length]
-
-    for ir in range(0, nr):
-
-        # calculate slope
-        if vel!=0:
-            slope = 1./vel
-        else:
-            slope = 0
-
-        # calculate offsets
-        if constant_spacing:
-            itoff = toff/dt
-            ixoff = (ir-xoff)/dt
-        else:
-            itoff = toff/dt
-            ixoff = (h.rx[ir]-h.sx[0]-xoff)/dt
-
-        itmin = int(np.ceil(slope*abs(ixoff)+itoff)) - length/2
-        itmax = itmin + length
-
-        # apply window
-        if 1 < itmin and itmax < nt:
-            s[0:itmin,ir] = 0.
-            s[itmin:itmax,ir] = win*s[itmin:itmax,ir]
-        elif itmin < 1 <= itmax:
-            s[1:itmax,ir] = win[length-itmax+1:length]*s[1:itmax,ir]
-        elif itmin < nt < itmax:
-            s[0:itmin,ir] = 0.
-            s[itmin:nt,ir] = win[1:nt-itmin+1]*s[itmin:nt,ir]
-        elif itmin > nt:
-            s[:,ir] = 0.
+    nr = len(offsets)
+    win = _mutewin()
+    izero, ibeg, iend, iwin = _mutetable(nt, h.dt, vel, toff, offsets)
 
-    return s
+    # zero leading samples
+    mask = np.empty((nt, nr))
+    np.greater_equal(np.arange(nt)[:, np.newaxis], izero, out=mask,
+                     casting='unsafe')
+
+    # taper samples within window
+    it = iwin + np.arange(len(win))[:, np.newaxis]
+    tapered = (ibeg <= it) & (it < iend)
+    np.put(mask, (it*nr + np.arange(nr))[tapered],
+           np.broadcast_to(win[:, np.newaxis], it.shape)[tapered])
+
+    if path:
+        _save(filename, mask)
+
+    return _remember(_MUTES, key, mask)
 
 
 def swindow(s, h, tmin, tmax, alpha=0.05, units='samples'):
     nt = h.nt
     dt = h.dt
-    nr = h.nr
     t0 = h.t0
 
     if units == 'time':
@@ -84,8 +109,7 @@ def swindow(s, h, tmin, tmax, alpha=0.05, units='samples'):
         raise ValueError
 
     win = tukeywin(nt, itmin, itmax, alpha)
-    for ir in range(0,nr):
-        s[:,ir] = win*s[:,ir]
+    s *= win[:, np.newaxis]
 
     return s
 
@@ -97,19 +121,60 @@ def correlate(u, v):
     return
 
 
-def bandpass(w, freqlo, freqhi, fs, npass=2):
-    wn = [2*freqlo/fs,2*freqhi/fs]
-    (b,a) = signal.butter(npass, wn)
-    w = signal.filtfilt(b,a,w)
-    return w
+def bandpass(w, freqlo, freqhi, fs, npass=2, method='sos'):
+    sos = butter('bandpass', (freqlo, freqhi), fs, npass)
+    return zerophase(w, sos, method)
+
+
+def highpass(w, freq, fs, npass=2, method='sos'):
+    sos = butter('highpass', (freq,), fs, npass)
+    return zerophase(w, sos, method)
+
 
+def lowpass(w, freq, fs, npass=2, method='sos'):
+    sos = butter('lowpass', (freq,), fs, npass)
+    return zerophase(w, sos, method)
 
-def highpass(w, freq, df, npass=2):
-    raise Exception('Not yet implemented.')
 
+def butter(btype, corners, fs, npass=2):
+    """ Returns Butterworth filter as second order sections
 
-def lowpass(w, freq, df, npass=2):
-    raise Exception('Not yet implemented.')
+      Designs are cached, since the same filter is applied to every trace
+      and every source.
+    """
+    key = (btype, tuple(corners), fs, npass)
+    if key not in _FILTERS:
+        wn = [2.*freq/fs for freq in corners]
+        if len(wn) == 1:
+            wn = wn[0]
+        _FILTERS[key] = signal.butter(npass, wn, btype, output='sos')
+    return _FILTERS[key]
+
+
+def zerophase(w, sos, method='sos'):
+    """ Applies filter forward and backward along first axis of W, so
+      that all traces are filtered in one call
+
+      With method 'fft', the squared magnitude response is applied in the
+      frequency domain instead, which is faster for very long traces.
+      Traces are padded with zeros rather than extended by reflection, so
+      values near the ends can differ slightly from the default method.
+    """
+    if method == 'sos':
+        return signal.sosfiltfilt(sos, w, axis=0)
+
+    elif method == 'fft':
+        nt = w.shape[0]
+        nfft = scipy.fftpack.next_fast_len(2*nt)
+        # frequencies of rfft bins, in radians per sample
+        _, H = signal.sosfreqz(sos, 2*np.pi*np.fft.rfftfreq(nfft))
+        H = abs(H)**2
+        H = H.reshape((-1,) + (1,)*(w.ndim-1))
+        W = np.fft.rfft(w, nfft, axis=0)
+        return np.fft.irfft(W*H, nfft, axis=0)[:nt]
+
+    else:
+        raise ValueError("Unknown filtering method: %s" % method)
 
 
 def window(nt, type='sine', **kwargs):
@@ -120,15 +185,97 @@ def window(nt, type='sine', **kwargs):
 
 
 def tukeywin(nt, imin, imax, alpha=0.05):
+    """ Returns Tukey window between samples IMIN and IMAX, zero elsewhere
+
+      Windows are cached and returned as read-only arrays.
+    """
+    key = (nt, imin, imax, alpha)
+    if key in _WINDOWS:
+        return _recall(_WINDOWS, key)
+
     t = np.linspace(0,1,imax-imin)
     w = np.zeros(imax-imin)
     p = alpha/2.
-    lo = np.floor(p*(imax-imin-1))+1
+    lo = int(np.floor(p*(imax-imin-1))+1)
     hi = imax-imin-lo
     w[:lo] = (1+np.cos(np.pi/p*(t[:lo]-p)))/2
     w[lo:hi] = np.ones((hi-lo))
     w[hi:] = (1+np.cos(np.pi/p*(t[hi:]-p)))/2
     win = np.zeros(nt)
     win[imin:imax] = w
-    return win
+    return _remember(_WINDOWS, key, win)
+
+
+### utility functions
+
+def _recall(cache, key):
+    # moves array to end of cache, as most recently used
+    cache[key] = cache.pop(key)
+    return cache[key]
 
+
+def _remember(cache, key, array):
+    """ Adds read-only array to cache
+
+      Cached arrays can be as large as the data, so the least recently used
+      are dropped once they take up more than CACHESIZE bytes.
+    """
+    array.setflags(write=False)
+    cache[key] = array
+    while len(cache) > 1 and \
+            sum([a.nbytes for a in cache.values()]) > CACHESIZE:
+        cache.popitem(last=False)
+    return array
+
+
+def _save(filename, array):
+    # written under a temporary name first, so that other processes never
+    # map a partial file
+    tmpfile = '%s.%d' % (filename, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(tmpfile, 'wb') as f:
+            np.save(f, array)
+        os.rename(tmpfile, filename)
+    except (IOError, OSError):
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+
+def _mutewin(length=400):
+    # tapered window
+    return np.sin(np.linspace(0, 1, 2*length))[:length]
+
+
+def _mutetable(nt, dt, vel, toff, offsets):
+    """ Returns, for each receiver, the number of leading samples zeroed,
+      the start and end of the tapered samples, and the sample at which
+      the taper begins
+    """
+    length = len(_mutewin())
+
+    # calculate slope
+    if vel!=0:
+        slope = 1./vel
+    else:
+        slope = 0
+
+    itoff = toff/dt
+    ixoff = offsets/dt
+    itmin = np.ceil(slope*abs(ixoff)+itoff).astype(int) - length//2
+    itmax = itmin + length
+
+    # windows fully inside trace, starting at first sample, running past
+    # last sample, or starting after it
+    inside = (1 < itmin) & (itmax < nt)
+    early = ~inside & (itmin < 1) & (1 <= itmax)
+    late = ~inside & ~early & (itmin < nt) & (nt < itmax)
+    after = ~inside & ~early & ~late & (itmin > nt)
+
+    izero = np.select([inside | late, after], [itmin, nt], 0)
+    ibeg = np.select([inside | late, early], [itmin, 1], 0)
+    iend = np.select([inside, early, late], [itmax, np.minimum(itmax, nt), nt],
+                     0)
+    iwin = np.where(late, itmin-1, itmin)
+    return izero, ibeg, iend, iwin
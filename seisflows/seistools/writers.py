@@ -5,6 +5,7 @@ import numpy as _np
 from seisflows.tools import unix
 
 from seisflows.seistools.shared import SeisStruct
+from seisflows.seistools import container as _container
 from seisflows.seistools.segy import segywriter
 
 
@@ -35,7 +36,7 @@ def ascii_specfem2d(f, h, channel, char='FX', prefix='SEM', suffix='adj', opt=''
 
         for i in range(h.nr):
             w = f[:, i]
-            _np.savetxt(files[i], _np.column_stack((t, w)), '%11.4e')
+            _savetxt(files[i], t, w)
 
     else:
         for file in h.files:
@@ -63,7 +64,7 @@ def ascii_specfem2d(f, h, channel, char='FX', prefix='SEM', suffix='adj', opt=''
 
         for i, file in enumerate(files):
             w = f[:, i]
-            _np.savetxt(file, _np.column_stack((t, w)), '%11.4e')
+            _savetxt(file, t, w)
 
 
 def su_specfem2d(d, h, channel=None, prefix='SEM', suffix='.su.adj'):
@@ -114,7 +115,7 @@ def ascii_specfem3d(f, h, channel, char='FX', prefix='SEM', suffix='adj', opt=''
 
         for i in range(h.nr):
             w = f[:, i]
-            _np.savetxt(files[i], _np.column_stack((t, w)), '%11.4e')
+            _savetxt(files[i], t, w)
 
     else:
         for file in h.files:
@@ -140,7 +141,7 @@ def ascii_specfem3d(f, h, channel, char='FX', prefix='SEM', suffix='adj', opt=''
 
         for i, file in enumerate(files):
             w = f[:, i]
-            _np.savetxt(file, _np.column_stack((t, w)), '%11.4e')
+            _savetxt(file, t, w)
 
 
 def su_specfem3d(d, h, channel=None, prefix='SEM', suffix='.adj', verbose=False):
@@ -215,7 +216,7 @@ def ascii_specfem3d_globe(f, h, channel, char='FX', prefix='SEM', suffix='adj',
 
         for i in range(h.nr):
             w = f[:, i]
-            _np.savetxt(files[i], _np.column_stack((t, w)), '%11.4e')
+            _savetxt(files[i], t, w)
 
     else:
         for file in h.files:
@@ -243,5 +244,24 @@ def ascii_specfem3d_globe(f, h, channel, char='FX', prefix='SEM', suffix='adj',
 
         for i, file in enumerate(files):
             w = f[:, i]
-            _np.savetxt(file, _np.column_stack((t, w)), '%11.4e')
+            _savetxt(file, t, w)
 
+
+def container(d, h, channel=None, prefix='SEM', suffix='', compress=False):
+    """ Writes traces to a single container per source
+
+      See seistools.container.
+    """
+    _container.write(prefix+suffix, channel, d, h, compress=compress)
+
+
+### utility functions
+
+def _savetxt(file, t, w, fmt='%11.4e'):
+    """ Writes two-column text file, formatting all lines in one operation
+
+      Output is identical to numpy.savetxt(file, column_stack((t, w)), fmt)
+    """
+    lines = (fmt + ' ' + fmt + '\n')*len(t)
+    with open(file, 'w') as f:
+        f.write(lines % tuple(_np.column_stack((t, w)).flat))
@@ -6,8 +6,9 @@ from glob import glob
 import numpy as np
 
 import seisflows.seistools.specfem2d as solvertools
+from seisflows.seistools import container, readers
 
-from seisflows.tools import unix
+from seisflows.tools import metrics, unix
 from seisflows.tools.array import loadnpy, savenpy
 from seisflows.tools.code import exists, setdiff
 from seisflows.tools.config import findpath, ParameterObj
@@ -73,6 +74,11 @@ class specfem2d(object):
     def check(self):
         """ Checks parameters, paths, and dependencies
         """
+        # exported traces are copied as is, or packed into one container
+        # per source, optionally compressed ('zlib')
+        if 'PACKTRACES' not in PAR:
+            setattr(PAR, 'PACKTRACES', False)
+
         # check time stepping parameters
         if 'NT' not in PAR:
             raise Exception
@@ -158,6 +164,7 @@ class specfem2d(object):
 
     ### high-level solver interface
 
+    @metrics.timed('eval_func')
     def eval_func(self, path='', export_traces=False):
         """ Evaluates misfit function by carrying out forward simulation and
             making measurements on observations and synthetics.
@@ -174,6 +181,7 @@ class specfem2d(object):
             self.export_traces(path, prefix='traces/syn')
 
 
+    @metrics.timed('eval_grad')
     def eval_grad(self, path='', export_traces=False):
         """ Evaluates gradient by carrying out adjoint simulation. Adjoint traces
             must be in place prior to calling this method.
@@ -204,6 +212,7 @@ class specfem2d(object):
 
     ### low-level solver interface
 
+    @metrics.timed('forward')
     def forward(self):
         """ Calls SPECFEM2D forward solver
         """
@@ -215,6 +224,7 @@ class specfem2d(object):
         unix.mv(self.wildcard, 'traces/syn')
 
 
+    @metrics.timed('adjoint')
     def adjoint(self):
         """ Calls SPECFEM2D adjoint solver
         """
@@ -320,6 +330,7 @@ class specfem2d(object):
 
     ### postprocessing utilities
 
+    @metrics.timed('combine')
     def combine(self, path=''):
         """combines SPECFEM2D kernels"""
         subprocess.call(
@@ -327,6 +338,7 @@ class specfem2d(object):
             [str(len(unix.ls(path)))] +
             [path])
 
+    @metrics.timed('smooth')
     def smooth(self, path='', tag='gradient', span=0.):
         """smooths SPECFEM2D kernels by convolving them with a Gaussian"""
         from seisflows.tools.array import meshsmooth
@@ -394,13 +406,20 @@ class specfem2d(object):
         unix.mkdir_gpfs(join(path, 'residuals'))
         src = join(self.getpath, 'residuals')
         dst = join(path, 'residuals', self.getname)
-        unix.mv(src, dst)
+        # residuals may be read as soon as they appear, so move them into
+        # place under a hidden name first
+        unix.mv(src, join(path, 'residuals', '.'+self.getname))
+        unix.mv(join(path, 'residuals', '.'+self.getname), dst)
 
     def export_traces(self, path, prefix='traces/obs'):
         unix.mkdir_gpfs(join(path, 'traces'))
         src = join(self.getpath, prefix)
         dst = join(path, 'traces', self.getname)
-        unix.cp(src, dst)
+        if PAR.PACKTRACES:
+            container.pack(src, dst, getattr(readers, PAR.FORMAT),
+                           PAR.CHANNELS, compress=PAR.PACKTRACES=='zlib')
+        else:
+            unix.cp(src, dst)
 
 
     ### setup utilities
@@ -513,15 +532,22 @@ class specfem2d(object):
     def mpirun(self, script, output='/dev/null'):
         """ Wrapper for mpirun
         """
-        with open(output,'w') as f:
-            subprocess.call(
-                script,
-                shell=True,
-                stdout=f)
+        name = unix.basename(script.split()[0])
+        with metrics.span('mpirun', name):
+            with open(output,'w') as f:
+                subprocess.call(
+                    script,
+                    shell=True,
+                    stdout=f)
 
     @ property
     def getname(self):
         """name of current source"""
+        return self.source_names[system.getnode()]
+
+    @ property
+    def source_names(self):
+        """names of all sources, in task order"""
         if not hasattr(self, 'sources'):
             # generate list of all sources
             paths = glob(PATH.SOLVER_FILES +'/'+ 'SOURCE_*')
@@ -530,7 +556,7 @@ class specfem2d(object):
                 self.sources += [unix.basename(path).split('_')[-1]]
             self.sources.sort()
 
-        return self.sources[system.getnode()]
+        return self.sources
 
     @property
     def getpath(self):
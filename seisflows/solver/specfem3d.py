@@ -1,18 +1,19 @@
 
 import subprocess
 from glob import glob
-from os.path import join
+from os.path import abspath, join
 
 import numpy as np
 
 import seisflows.seistools.specfem3d as solvertools
 from seisflows.seistools.shared import load
+from seisflows.seistools import container, readers
 
-from seisflows.tools import unix
+from seisflows.tools import metrics, unix
 from seisflows.tools.array import loadnpy, savenpy
 from seisflows.tools.code import exists, setdiff
 from seisflows.tools.config import findpath, ParameterObj
-from seisflows.tools.io import loadbin, savebin
+from seisflows.tools.io import iomap, loadbin, savebin
 
 PAR = ParameterObj('SeisflowsParameters')
 PATH = ParameterObj('SeisflowsPaths')
@@ -76,6 +77,16 @@ class specfem3d(object):
     def check(self):
         """ Checks parameters, paths, and dependencies
         """
+        # exported traces are copied as is, or packed into one container
+        # per source, optionally compressed ('zlib')
+        if 'PACKTRACES' not in PAR:
+            setattr(PAR, 'PACKTRACES', False)
+
+        # number of threads used to read and write model files, one file
+        # per processor rank at a time
+        if 'IOTHREADS' not in PAR:
+            setattr(PAR, 'IOTHREADS', 1)
+
         # check time stepping parameters
         if 'NT' not in PAR:
             raise Exception
@@ -174,6 +185,7 @@ class specfem3d(object):
 
     ### high-level solver interface
 
+    @metrics.timed('eval_func')
     def eval_func(self, path='', export_traces=False):
         """ Evaluates misfit function by carrying out forward simulation and
             making measurements on observations and synthetics.
@@ -190,6 +202,7 @@ class specfem3d(object):
             self.export_traces(path, prefix='traces/syn')
 
 
+    @metrics.timed('eval_grad')
     def eval_grad(self, path='', export_traces=False):
         """ Evaluates gradient by carrying out adjoint simulation. Adjoint traces
             must be in place prior to calling this method.
@@ -220,6 +233,7 @@ class specfem3d(object):
 
     ### low-level solver interface
 
+    @metrics.timed('forward')
     def forward(self):
         """ Calls SPECFEM3D forward solver
         """
@@ -231,6 +245,7 @@ class specfem3d(object):
         unix.mv(self.wildcard, 'traces/syn')
 
 
+    @metrics.timed('adjoint')
     def adjoint(self):
         """ Calls SPECFEM3D adjoint solver
         """
@@ -260,7 +275,8 @@ class specfem3d(object):
         else:
             logfile = None
 
-        return load(dirname, self.model_parameters, mapping, PAR.NPROC, logfile)
+        return load(dirname, self.model_parameters, mapping, PAR.NPROC, logfile,
+                    nthreads=PAR.IOTHREADS)
 
 
     def save(self, dirname, parts):
@@ -269,11 +285,13 @@ class specfem3d(object):
         unix.mkdir(dirname)
 
         # write database files
-        for key in self.model_parameters:
-            nn = len(parts[key])
-            for ii in range(nn):
-                filename = 'proc%06d_%s.bin' % (ii, key)
-                savebin(parts[key][ii], join(dirname, filename))
+        def write(args):
+            key, ii = args
+            filename = 'proc%06d_%s.bin' % (ii, key)
+            savebin(parts[key][ii], join(dirname, filename))
+
+        iomap(write, [(key, ii) for key in self.model_parameters
+                      for ii in range(len(parts[key]))], PAR.IOTHREADS)
 
 
     ### vector/dictionary conversion
@@ -307,13 +325,15 @@ class specfem3d(object):
                 for i in range(PAR.NPROC):
                     proc = '%06d' % i
                     parts[key].append(
-                        np.load(PATH.GLOBAL +'/'+ 'mesh' +'/'+ key +'/'+ proc))
+                        np.load(PATH.GLOBAL +'/'+ 'mesh' +'/'+ key +'/'+ proc,
+                                mmap_mode='r'))
         return parts
 
 
 
     ### postprocessing utilities
 
+    @metrics.timed('combine')
     def combine(self, path=''):
         """ combines SPECFEM3D kernels
         """
@@ -341,6 +361,7 @@ class specfem3d(object):
         unix.cd(path)
 
 
+    @metrics.timed('smooth')
     def smooth(self, path='', tag='gradient', span=0.):
         """ smooths SPECFEM3D kernels
         """
@@ -390,9 +411,23 @@ class specfem3d(object):
         dst = self.databases
 
         if system.getnode()==0:
-            self.save(dst, self.load(src, verbose=True))
-        else:
-            self.save(dst, self.load(src))
+            # log range of each parameter
+            with open(PATH.SUBMIT +'/'+ 'output.minmax', 'a') as f:
+                f.write(abspath(src)+'\n')
+                for key in self.model_parameters:
+                    files = glob(join(src, 'proc*_'+key+'.bin'))
+                    parts = iomap(loadbin, files, PAR.IOTHREADS)
+                    f.write('%-15s %10.3e %10.3e\n' % (key,
+                        min([part.min() for part in parts]),
+                        max([part.max() for part in parts])))
+                f.write('\n')
+
+        # model files are already in solver format, so they are copied as
+        # is rather than read and rewritten; they are not linked, since
+        # the solver rewrites model files in its database directory
+        unix.mkdir(dst)
+        for key in self.model_parameters:
+            unix.cp(glob(join(src, 'proc*_'+key+'.bin')), dst)
 
     def import_traces(self, path):
         src = glob(join(path, 'traces', self.getname, '*'))
@@ -426,13 +461,20 @@ class specfem3d(object):
         unix.mkdir_gpfs(join(path, 'residuals'))
         src = join(self.getpath, 'residuals')
         dst = join(path, 'residuals', self.getname)
-        unix.mv(src, dst)
+        # residuals may be read as soon as they appear, so move them into
+        # place under a hidden name first
+        unix.mv(src, join(path, 'residuals', '.'+self.getname))
+        unix.mv(join(path, 'residuals', '.'+self.getname), dst)
 
     def export_traces(self, path, prefix='traces/obs'):
         unix.mkdir_gpfs(join(path, 'traces'))
         src = join(self.getpath, prefix)
         dst = join(path, 'traces', self.getname)
-        unix.cp(src, dst)
+        if PAR.PACKTRACES:
+            container.pack(src, dst, getattr(readers, PAR.FORMAT),
+                           PAR.CHANNELS, compress=PAR.PACKTRACES=='zlib')
+        else:
+            unix.cp(src, dst)
 
 
     ### setup utilities
@@ -540,15 +582,22 @@ class specfem3d(object):
     def mpirun(self, script, output='/dev/null'):
         """ Wrapper for mpirun
         """
-        with open(output,'w') as f:
-            subprocess.call(
-                system.mpiargs() + script,
-                shell=True,
-                stdout=f)
+        name = unix.basename(script.split()[0])
+        with metrics.span('mpirun', name):
+            with open(output,'w') as f:
+                subprocess.call(
+                    system.mpiargs() + script,
+                    shell=True,
+                    stdout=f)
 
     @property
     def getname(self):
         """name of current source"""
+        return self.source_names[system.getnode()]
+
+    @property
+    def source_names(self):
+        """names of all sources, in task order"""
         if not hasattr(self, 'sources'):
             # generate list of all sources
             paths = glob(PATH.SOLVER_FILES +'/'+ 'FORCESOLUTION_*')
@@ -557,7 +606,7 @@ class specfem3d(object):
                 self.sources += [unix.basename(path).split('_')[-1]]
             self.sources.sort()
 
-        return self.sources[system.getnode()]
+        return self.sources
 
     @property
     def getpath(self):
@@ -0,0 +1,144 @@
+
+import time
+import Queue
+
+from seisflows.tools import metrics
+
+
+class TaskHandle(object):
+    """ Handle to tasks submitted through system.submit_tasks
+
+      Backends supply an 'update' function, which blocks for up to 'timeout'
+      seconds (indefinitely if timeout is None) until at least one more task
+      has finished, and returns a list of (itask, error) pairs for tasks that
+      finished since the previous call. 'error' is None for tasks that
+      succeeded, and a message or traceback otherwise.
+
+      Callbacks are called from whichever thread calls done, wait, or
+      as_completed, never from backend threads.
+
+      Once all tasks have finished, the time since the handle was created is
+      recorded as a 'run' span in the metrics file.
+    """
+
+    def __init__(self, tasks, update, name=''):
+        self.tasks = list(tasks)
+        self.update = update
+        self.name = name
+
+        self.finished = []
+        self.errors = {}
+        self.callbacks = []
+        self.start = time.time()
+
+    def add_callback(self, func):
+        """ Registers function to be called as func(itask, error) once for
+          each task as it finishes. Tasks that have already finished are
+          passed to the function immediately.
+        """
+        self.callbacks += [func]
+        for itask in self.finished:
+            func(itask, self.errors.get(itask))
+
+    def done(self):
+        """ Returns True if all tasks have finished, without blocking
+        """
+        if not self._isdone():
+            self._collect(0.)
+        return self._isdone()
+
+    def as_completed(self):
+        """ Yields task numbers in the order tasks finish
+        """
+        ii = 0
+        while True:
+            while ii < len(self.finished):
+                yield self.finished[ii]
+                ii += 1
+            if self._isdone():
+                return
+            self._collect(None)
+
+    def wait(self):
+        """ Blocks until all tasks have finished and raises an exception if
+          any of them failed
+        """
+        for _ in self.as_completed():
+            pass
+
+        if self.errors:
+            for itask in sorted(self.errors):
+                print 'task %02d failed:' % (itask + 1)
+                print self.errors[itask]
+            raise Exception("%d of %d tasks failed: %s" %
+                (len(self.errors), len(self.tasks), self.name))
+
+
+    ### utility functions
+
+    def _collect(self, timeout):
+        for itask, error in self.update(timeout):
+            if itask in self.finished:
+                continue
+            self.finished += [itask]
+            if error:
+                self.errors[itask] = error
+            for func in self.callbacks:
+                func(itask, error)
+
+        if self.start and self._isdone():
+            metrics.record('run', self.name, self.start)
+            self.start = None
+
+    def _isdone(self):
+        return len(self.finished) >= len(self.tasks)
+
+
+def completed(tasks, errors=None, name=''):
+    """ Returns handle to tasks that have already finished
+    """
+    results = [(itask, (errors or {}).get(itask)) for itask in tasks]
+
+    def update(timeout):
+        output = results[:]
+        del results[:]
+        return output
+
+    handle = TaskHandle(tasks, update, name)
+
+    # time was spent before the handle was created, so none is recorded
+    handle.start = None
+    return handle
+
+
+def queued(tasks, queue, name='', finalize=None):
+    """ Returns handle to tasks whose results are put on a Queue.Queue as
+      (itask, error) pairs by backend threads or callbacks. Once all results
+      are in, 'finalize' is called, if given.
+    """
+    count = [0]
+
+    def update(timeout):
+        results = []
+        try:
+            if timeout is None:
+                # short timeouts keep the wait interruptible
+                while not results:
+                    try:
+                        results += [queue.get(True, 1.)]
+                    except Queue.Empty:
+                        pass
+            else:
+                results += [queue.get(timeout > 0, timeout)]
+            while True:
+                results += [queue.get_nowait()]
+        except Queue.Empty:
+            pass
+
+        if results:
+            count[0] += len(results)
+            if finalize and count[0] >= len(tasks):
+                finalize()
+        return results
+
+    return TaskHandle(tasks, update, name)
@@ -0,0 +1,260 @@
+
+import os
+import sys
+import atexit
+import hashlib
+import pickle
+import threading
+import time
+import traceback
+import Queue
+from multiprocessing.connection import Client, Listener
+from os.path import join
+
+from seisflows.tools import unix
+from seisflows.tools.code import loadjson
+from seisflows.tools.config import ConfigObj, ParameterObj
+from seisflows.system.lib import tasks as tasklib
+
+OBJ = ConfigObj('SeisflowsObjects')
+PAR = ParameterObj('SeisflowsParameters')
+PATH = ParameterObj('SeisflowsPaths')
+
+# seconds to wait for workers to connect
+TIMEOUT = 600.
+
+
+class WorkerPool(object):
+    """ Dispatches tasks to long-lived worker processes
+
+      Rather than starting a new interpreter and unpickling all objects for
+      every task, workers are started once and then receive
+      (classname, funcname, kwargs) messages over a socket. Objects are
+      resent to a worker only when they have changed since its last task.
+
+      Workers are started by a backend-specific 'launch' function, which is
+      given the address workers must connect to, as 'host:port', and
+      environment variables workers must inherit. It returns a list of
+      subprocess.Popen objects.
+    """
+
+    def __init__(self, nworker, launch):
+        self.nworker = nworker
+        self.digests = {}
+
+        authkey = os.urandom(16).encode('hex')
+        self.listener = Listener(('', 0), authkey=authkey)
+        address = '%s:%d' % (unix.hostname(), self.listener.address[1])
+
+        self.processes = launch(address, {'SEISFLOWS_AUTHKEY': authkey})
+        self.connections = self.accept()
+        self.locks = {}
+        for conn in self.connections:
+            self.locks[id(conn)] = threading.Lock()
+        atexit.register(self.close)
+
+
+    def run(self, classname, funcname, tasks, kwargs):
+        """ Runs tasks on workers and returns dictionary of failed tasks
+        """
+        handle = self.submit(classname, funcname, tasks, kwargs)
+        for _ in handle.as_completed():
+            pass
+        return handle.errors
+
+
+    def submit(self, classname, funcname, tasks, kwargs):
+        """ Starts running tasks on workers and returns a TaskHandle
+        """
+        digest, objects = _pack_objects()
+
+        queue = Queue.Queue()
+        for itask in tasks:
+            queue.put(itask)
+        results = Queue.Queue()
+
+        def serve(conn):
+            while True:
+                try:
+                    itask = queue.get_nowait()
+                except Queue.Empty:
+                    return
+
+                message = {
+                    'task': itask,
+                    'classname': classname,
+                    'funcname': funcname,
+                    'kwargs': kwargs,
+                    'digest': digest}
+
+                # connections may be shared by overlapping submissions
+                with self.locks[id(conn)]:
+                    if self.digests.get(id(conn)) != digest:
+                        message['objects'] = objects
+                    try:
+                        conn.send(message)
+                        error = conn.recv()
+                    except (EOFError, IOError):
+                        results.put((itask, 'Lost connection to worker.'))
+                        self.drop(conn)
+                        break
+                    self.digests[id(conn)] = digest
+
+                results.put((itask, error))
+
+            # tasks left over if all workers were lost
+            if not self.connections:
+                while not queue.empty():
+                    results.put((queue.get(), 'No worker available.'))
+
+        if not self.connections:
+            raise Exception("All workers have exited.")
+
+        for conn in list(self.connections):
+            thread = threading.Thread(target=serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+        return tasklib.queued(tasks, results, classname+'.'+funcname)
+
+
+    def drop(self, conn):
+        """ Stops using connection to worker
+        """
+        if conn in self.connections:
+            self.connections.remove(conn)
+
+
+    def accept(self):
+        """ Waits for all workers to connect
+        """
+        connections = []
+
+        def target():
+            while len(connections) < self.nworker:
+                connections.append(self.listener.accept())
+
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+
+        start = time.time()
+        while thread.is_alive():
+            thread.join(0.1)
+            if time.time() - start > TIMEOUT:
+                raise Exception("Timed out waiting for workers.")
+            for process in self.processes:
+                if process.poll() not in [None, 0]:
+                    raise Exception("Worker exited before connecting.")
+        return connections
+
+
+    def close(self):
+        """ Stops workers
+        """
+        for conn in self.connections:
+            try:
+                conn.send(None)
+                conn.close()
+            except (EOFError, IOError):
+                pass
+        self.connections = []
+        self.listener.close()
+
+        for process in self.processes:
+            process.wait()
+
+
+def getpool(nworker, launch):
+    """ Returns pool of workers, starting workers on first call
+
+      Because sockets cannot be pickled, the pool is kept here rather than
+      as an attribute of the system object.
+    """
+    global _pool
+    if not _pool:
+        _pool = WorkerPool(nworker, launch)
+    return _pool
+
+_pool = None
+
+
+def main(path, address):
+    """ Worker loop, called from wrapper_worker
+
+      Parameters and paths are read once at startup. Objects are received
+      from the head process, and checked only the first time they arrive.
+    """
+    PAR.update(loadjson(join(path, 'SeisflowsParameters.json')))
+    PATH.update(loadjson(join(path, 'SeisflowsPaths.json')))
+
+    host, port = address.rsplit(':', 1)
+    conn = Client((host, int(port)), authkey=os.environ['SEISFLOWS_AUTHKEY'])
+
+    cwd = unix.pwd()
+    ischecked = False
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        # task id is passed to system.getnode through environment
+        os.environ['SEISFLOWS_TASK_ID'] = str(message['task'])
+        unix.cd(cwd)
+
+        try:
+            if 'objects' in message:
+                _unpack_objects(message['objects'])
+                if not ischecked:
+                    _check_objects()
+                    ischecked = True
+
+            func = getattr(sys.modules[message['classname']],
+                           message['funcname'])
+            func(**message['kwargs'])
+        except:
+            conn.send(traceback.format_exc())
+        else:
+            conn.send(None)
+
+    conn.close()
+
+
+### utility functions
+
+def _pack_objects():
+    """ Pickles registered objects and returns digest and pickled objects
+    """
+    objects = {}
+    for key in OBJ:
+        objects[key] = pickle.dumps(sys.modules[key])
+
+    md5 = hashlib.md5()
+    for key in sorted(objects):
+        md5.update(key)
+        md5.update(objects[key])
+    return md5.hexdigest(), objects
+
+
+def _unpack_objects(objects):
+    """ Unpickles and registers objects
+
+      Modules that did 'import system' etc. hold references to previously
+      registered objects, so existing objects are updated in place.
+    """
+    for key in sorted(objects):
+        obj = pickle.loads(objects[key])
+        if key in sys.modules and sys.modules[key].__class__ is obj.__class__:
+            sys.modules[key].__dict__.clear()
+            sys.modules[key].__dict__.update(obj.__dict__)
+        else:
+            OBJ.register(key, obj)
+
+
+def _check_objects():
+    for key in OBJ:
+        sys.modules[key].check()
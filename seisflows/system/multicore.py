@@ -0,0 +1,192 @@
+
+import os
+import sys
+import subprocess
+import threading
+import traceback
+import Queue
+from multiprocessing import Pipe, Process, cpu_count
+
+from seisflows.tools import unix
+from seisflows.tools.config import findpath, loadclass, ParameterObj
+from seisflows.system.lib import tasks as tasklib
+from seisflows.system.lib import workers
+
+PAR = ParameterObj('SeisflowsParameters')
+PATH = ParameterObj('SeisflowsPaths')
+
+
+class multicore(loadclass('system', 'serial')):
+    """ An interface through which to submit workflows, run tasks in serial or
+      parallel, and perform other system functions.
+
+      Runs tasks concurrently on a single multicore machine. Each task is
+      carried out by a process of its own, and only so many run at once that
+      no more than NPROCMAX cores are in use at any one time, with each task
+      using NPROC cores.
+
+      If WORKERS is set, tasks are instead sent to long-lived worker
+      processes, which communicate with the head process over a local socket.
+
+      By hiding environment details behind a python interface layer, these
+      classes provide a consistent command set across different computing
+      environments.
+
+      For more informations, see
+      http://seisflows.readthedocs.org/en/latest/manual/manual.html#system-interfaces
+    """
+
+    def check(self):
+        """ Checks parameters and paths
+        """
+        super(multicore, self).check()
+
+        # maximum number of cores to use at any one time
+        if 'NPROCMAX' not in PAR:
+            setattr(PAR, 'NPROCMAX', cpu_count())
+
+        if PAR.NPROC > PAR.NPROCMAX:
+            raise ValueError("NPROC exceeds NPROCMAX.")
+
+        # use persistent worker processes
+        if 'WORKERS' not in PAR:
+            setattr(PAR, 'WORKERS', False)
+
+
+    def run(self, classname, funcname, hosts='all', **kwargs):
+        """ Runs tasks in parallel on specified hosts
+        """
+        tasks = self.submit_tasks(classname, funcname, hosts, **kwargs)
+        if hosts == 'all':
+            tasks.add_callback(lambda itask, error: self.progress(itask))
+        tasks.wait()
+
+        if hosts == 'all' and PAR.VERBOSE and PAR.NTASK > 1:
+            print ''
+
+
+    def submit_tasks(self, classname, funcname, hosts='all', **kwargs):
+        """ Starts tasks on specified hosts and returns without waiting for
+          them to finish
+        """
+        unix.mkdir(PATH.SYSTEM)
+
+        if hosts == 'all':
+            tasks = range(PAR.NTASK)
+        elif hosts == 'head':
+            tasks = [0]
+        else:
+            raise ValueError("Unknown hosts specification.")
+
+        if PAR.WORKERS:
+            pool = workers.getpool(self.nparallel(PAR.NTASK),
+                                   self.launch_workers)
+            return pool.submit(classname, funcname, tasks, kwargs)
+        else:
+            return self.submit_pool(classname, funcname, tasks, kwargs)
+
+
+    def submit_pool(self, classname, funcname, tasks, kwargs):
+        """ Starts each task in a fresh process and returns a TaskHandle
+
+          Each process is watched by its own thread, so that tasks whose
+          process dies without reporting back, for example when killed by
+          the operating system, are reported as failed.
+        """
+        results = Queue.Queue()
+        slots = threading.BoundedSemaphore(self.nparallel(len(tasks)))
+
+        def watch(itask, process, conn):
+            try:
+                result = conn.recv()
+            except EOFError:
+                result = None
+            process.join()
+            conn.close()
+            slots.release()
+
+            if result is None:
+                result = (itask, "Task exited with code %s." %
+                          process.exitcode)
+            results.put(result)
+
+        def dispatch():
+            for itask in tasks:
+                slots.acquire()
+                conn, child = Pipe(duplex=False)
+                process = Process(target=_child,
+                    args=(child, classname, funcname, itask, kwargs))
+                process.start()
+                child.close()
+                thread = threading.Thread(target=watch,
+                                          args=(itask, process, conn))
+                thread.daemon = True
+                thread.start()
+
+        thread = threading.Thread(target=dispatch)
+        thread.daemon = True
+        thread.start()
+
+        return tasklib.queued(tasks, results, classname+'.'+funcname)
+
+
+    def launch_workers(self, address, env):
+        """ Starts local worker processes
+        """
+        env = dict(os.environ, **env)
+        args = [sys.executable,
+                findpath('system') +'/'+ 'lib/wrapper_worker',
+                PATH.OUTPUT,
+                address]
+
+        processes = []
+        for _ in range(self.nparallel(PAR.NTASK)):
+            processes += [subprocess.Popen(args, env=env)]
+        return processes
+
+
+    def nparallel(self, ntask):
+        """ Number of tasks to run at the same time
+        """
+        return max(1, min(ntask, PAR.NPROCMAX/PAR.NPROC))
+
+    def getnode(self):
+        """ Gets number of running task
+        """
+        try:
+            return int(os.environ['SEISFLOWS_TASK_ID'])
+        except KeyError:
+            raise Exception("TASK_ID environment variable not defined.")
+
+    def setnode(self, itask):
+        """ Sets number of running task
+        """
+        os.environ['SEISFLOWS_TASK_ID'] = str(itask)
+
+    def mpiargs(self):
+        return 'mpiexec -np %d ' % PAR.NPROC
+
+
+### utility functions
+
+def _call(classname, funcname, itask, kwargs):
+    """ Calls function on behalf of task process. Rather than being raised,
+      exceptions are returned as strings so that failures of individual
+      tasks can be collected and reported together.
+    """
+    try:
+        import system
+        system.setnode(itask)
+        func = getattr(__import__(classname), funcname)
+        func(**kwargs)
+    except:
+        return itask, traceback.format_exc()
+    else:
+        return itask, None
+
+
+def _child(conn, classname, funcname, itask, kwargs):
+    """ Runs task in child process and sends result back through pipe
+    """
+    conn.send(_call(classname, funcname, itask, kwargs))
+    conn.close()
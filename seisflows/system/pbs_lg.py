@@ -1 +1,232 @@
-raise NotImplementedError
+
+import os
+import math
+import subprocess
+
+from seisflows.tools import unix
+from seisflows.tools.config import findpath, loadclass, ParameterObj
+
+PAR = ParameterObj('SeisflowsParameters')
+PATH = ParameterObj('SeisflowsPaths')
+
+
+class pbs_lg(loadclass('system', 'slurm_lg')):
+    """ An interface through which to submit workflows, run tasks in serial or
+      parallel, and perform other system functions.
+
+      Tasks are submitted as PBS Pro job arrays and tracked with one bulk
+      qstat query per poll. As with SLURM_LG, failed tasks are resubmitted
+      up to RETRYMAX times. At most NTASKMAX tasks run at the same time, if
+      given.
+
+      By hiding environment details behind a python interface layer, these
+      classes provide a consistent command set across different computing
+      environments.
+
+      For more informations, see
+      http://seisflows.readthedocs.org/en/latest/manual/manual.html#system-interfaces
+    """
+
+    def check(self):
+        """ Checks parameters and paths
+        """
+        super(pbs_lg, self).check()
+
+        # maximum number of tasks running at the same time
+        if 'NTASKMAX' not in PAR:
+            setattr(PAR, 'NTASKMAX', 0)
+
+        if PAR.NODES_PER_JOB or PAR.DAG:
+            raise ValueError("NODES_PER_JOB and DAG require SLURM.")
+
+
+    def submit(self, workflow):
+        """ Submits workflow
+        """
+        unix.mkdir(PATH.OUTPUT)
+        unix.cd(PATH.OUTPUT)
+
+        self.save_objects()
+        self.save_parameters()
+        self.save_paths()
+
+        args = ('qsub '
+                + '-N %s ' % PAR.TITLE
+                + '-o %s ' % (PATH.SUBMIT+'/'+'output.log')
+                + '-j oe '
+                + '-l select=1:ncpus=%d ' % PAR.NPROC_PER_NODE
+                + '-l walltime=%s ' % _walltime(PAR.WALLTIME)
+                + '-- '
+                + findpath('system') +'/'+ 'pbs/wrapper_qsub '
+                + PATH.OUTPUT)
+
+        subprocess.call(args, shell=1)
+
+
+    def launch(self, classname, funcname, hosts='all', tasks=None,
+               options=''):
+        """ Submits job arrays and returns dictionary mapping task numbers
+          to PBS job ids
+
+          Because 'qsub -J' only accepts ranges of two or more indices,
+          each run of consecutive task numbers is submitted as a separate
+          array, and isolated tasks as ordinary jobs.
+        """
+        unix.mkdir(PATH.SYSTEM)
+        unix.mkdir(PATH.SUBMIT+'/'+'output.pbs')
+
+        if tasks is None:
+            if hosts == 'all':
+                tasks = range(PAR.NTASK)
+            else:
+                tasks = [0]
+
+        if hosts == 'all':
+            wrapper = 'pbs/wrapper_pbsdsh '
+        elif hosts == 'head':
+            wrapper = 'pbs/wrapper_pbsdsh_head '
+        else:
+            raise Exception
+
+        nodes = int(math.ceil(PAR.NPROC/float(PAR.NPROC_PER_NODE)))
+
+        jobs = {}
+        for imin, imax in _ranges(tasks):
+            args = ('qsub '
+                    + '-N %s ' % PAR.TITLE
+                    + '-o %s ' % (PATH.SUBMIT+'/'+'output.pbs')
+                    + '-j oe '
+                    + '-l select=%d:ncpus=%d:mpiprocs=%d ' %
+                        (nodes, PAR.NPROC_PER_NODE, PAR.NPROC_PER_NODE)
+                    + '-l walltime=%s ' % _walltime(PAR.STEPTIME)
+                    + options)
+
+            if imin < imax:
+                args += '-J %d-%d' % (imin, imax)
+                if PAR.NTASKMAX:
+                    args += '%%%d' % PAR.NTASKMAX
+                args += ' '
+            else:
+                args += '-v SEISFLOWS_TASK_ID=%d ' % imin
+
+            args += ('-- '
+                    + findpath('system') +'/'+ wrapper
+                    + PATH.OUTPUT + ' '
+                    + classname + ' '
+                    + funcname)
+
+            job = self.qsub(args)
+
+            # subjobs are named e.g. '1234[5]'
+            if imin < imax:
+                for ii in range(imin, imax+1):
+                    jobs[ii] = job.replace('[]', '[%d]' % ii)
+            else:
+                jobs[imin] = job
+        return jobs
+
+
+    def qsub(self, args):
+        """ Submits job and returns PBS job id, without server name
+        """
+        output = subprocess.Popen(args, shell=1,
+            stdout=subprocess.PIPE).communicate()[0]
+        return output.split()[-1].strip().split('.')[0]
+
+
+    def getstates(self, jobs):
+        """ Retrieves states of all given jobs using a single query for job
+          arrays and one for ordinary jobs
+        """
+        arrays = sorted(set([job.split('[')[0]+'[]' for job in jobs
+                             if '[' in job]))
+        others = sorted(set([job for job in jobs if '[' not in job]))
+
+        states = {}
+        if arrays:
+            states.update(self.qstat('-x -f -J -t ' + ' '.join(arrays)))
+        if others:
+            states.update(self.qstat('-x -f ' + ' '.join(others)))
+        return states
+
+
+    def qstat(self, args):
+        output = subprocess.Popen('qstat ' + args, shell=True,
+            stdout=subprocess.PIPE).communicate()[0]
+        return _parse_qstat(output)
+
+
+    def scancel(self, job):
+        subprocess.call('qdel ' + job, shell=True)
+
+    def getnode(self):
+        """ Gets number of running task
+        """
+        try:
+            return int(os.getenv('SEISFLOWS_TASK_ID'))
+        except:
+            try:
+                return int(os.getenv('PBS_ARRAY_INDEX'))
+            except:
+                raise Exception("TASK_ID environment variable not defined.")
+
+    def mpiargs(self):
+        return 'mpirun -np %d ' % PAR.NPROC
+
+
+### utility functions
+
+def _ranges(tasks):
+    """ Splits task numbers into (imin, imax) runs of consecutive numbers
+    """
+    ranges = []
+    for itask in sorted(tasks):
+        if ranges and itask == ranges[-1][1] + 1:
+            ranges[-1][1] = itask
+        else:
+            ranges += [[itask, itask]]
+    return [tuple(item) for item in ranges]
+
+
+def _walltime(minutes):
+    minutes = int(math.ceil(minutes))
+    return '%02d:%02d:00' % (minutes/60, minutes%60)
+
+
+def _parse_qstat(output):
+    """ Parses output of 'qstat -x -f' into a dictionary mapping job ids to
+      states, using the same names as SLURM
+    """
+    states = {}
+    job = None
+    fields = {}
+
+    def finish():
+        if job is None or '[]' in job:
+            return
+        state = fields.get('job_state')
+        status = fields.get('Exit_status')
+        if state in ['F', 'X']:
+            if status is None:
+                # subjobs deleted before starting have no exit status
+                states[job] = 'CANCELLED'
+            elif status == '0':
+                states[job] = 'COMPLETED'
+            else:
+                states[job] = 'FAILED'
+        elif state in ['R', 'E', 'B']:
+            states[job] = 'RUNNING'
+        elif state:
+            states[job] = 'PENDING'
+
+    for line in output.splitlines():
+        if line.startswith('Job Id:'):
+            finish()
+            job = line.split(':', 1)[1].strip().split('.')[0]
+            fields = {}
+        elif '=' in line and line.startswith('    '):
+            key, value = line.split('=', 1)
+            fields[key.strip()] = value.strip()
+    finish()
+
+    return states
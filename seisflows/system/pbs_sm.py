@@ -2,12 +2,18 @@ import os
 import subprocess
 from os.path import abspath, join
 
-from seisflows.tools import unix
+from seisflows.tools import metrics, unix
 from seisflows.tools.code import saveobj
-from seisflows.tools.config import getmodule, findpath, ParameterObj
+from seisflows.tools.config import findpath, ConfigObj, ParameterObj
+from seisflows.system.lib import tasks as tasklib
 
-PAR = ParameterObj('parameters')
-PATH = ParameterObj('paths')
+OBJ = ConfigObj('SeisflowsObjects')
+PAR = ParameterObj('SeisflowsParameters')
+PATH = ParameterObj('SeisflowsPaths')
+
+save_objects = OBJ.save
+save_parameters = PAR.save
+save_paths = PATH.save
 
 
 class pbs_sm(object):
@@ -22,7 +28,7 @@ class pbs_sm(object):
       http://seisflows.readthedocs.org/en/latest/manual/manual.html#system-interfaces
     """
 
-    def __init__(self):
+    def check(self):
         """ Checks parameters and paths
         """
 
@@ -94,7 +100,6 @@ class pbs_sm(object):
                 + '-j %s '%'oe'
                 + findpath('system') + '/' + 'pbs/wrapper_qsub '
                 + PATH.OUTPUT)
-        print args  # DEBUG
 
         subprocess.call(args, shell=1)
 
@@ -102,39 +107,51 @@ class pbs_sm(object):
     def run(self, classname, funcname, hosts='all', **kwargs):
         """  Runs tasks in serial or parallel on specified hosts
         """
-        name = task.__name__
-
-        if PAR.VERBOSE >= 2:
-            print 'running', name
-
-        # save current state
-        save_objects(join(PATH.OUTPUT, 'SeisflowsObjects'))
-
-        # save keyword arguments
-        kwargspath = join(PATH.OUTPUT, 'SeisflowsObjects',
-                          classname + '_kwargs')
-        kwargsfile = join(kwargspath, funcname + '.p')
-        unix.mkdir(kwargspath)
-        saveobj(kwargsfile, kwargs)
+        with metrics.span('run', classname+'.'+funcname):
+            if PAR.VERBOSE >= 2:
+                print 'running', funcname
+
+            # save current state
+            save_objects(join(PATH.OUTPUT, 'SeisflowsObjects'))
+
+            # save keyword arguments
+            kwargspath = join(PATH.OUTPUT, 'SeisflowsObjects',
+                              classname + '_kwargs')
+            kwargsfile = join(kwargspath, funcname + '.p')
+            unix.mkdir(kwargspath)
+            saveobj(kwargsfile, kwargs)
+
+            if hosts == 'all':
+                # run on all available nodes
+                args = ('pbsdsh '
+                        + findpath('system') + '/' + 'pbs/wrapper_pbsdsh '
+                        + PATH.OUTPUT + ' '
+                        + classname + ' '
+                        + funcname)
+            elif hosts == 'head':
+                # run on head node
+                args = ('pbsdsh '
+                        + findpath('system') + '/' + 'pbs/wrapper_pbsdsh_head '
+                        + PATH.OUTPUT + ' '
+                        + classname + ' '
+                        + funcname)
+            else:
+                raise Exception
+
+            if subprocess.call(args, shell=1):
+                raise Exception("pbsdsh failed: %s.%s" % (classname, funcname))
+
+
+    def submit_tasks(self, classname, funcname, hosts='all', **kwargs):
+        """ Runs tasks and returns handle to finished tasks
+        """
+        self.run(classname, funcname, hosts, **kwargs)
 
         if hosts == 'all':
-            # run on all available nodes
-            args = ('pbsdsh '
-                    + findpath('system') + '/' + 'pbs/wrapper_pbsdsh '
-                    + PATH.OUTPUT + ' '
-                    + classname + ' '
-                    + funcname)
-        elif hosts == 'head':
-            # run on head node
-            args = ('pbsdsh '
-                    + findpath('system') + '/' + 'slurm/wrapper_pbsdsh '
-                    + PATH.OUTPUT + ' '
-                    + classname + ' '
-                    + funcname)
+            tasks = range(PAR.NTASK)
         else:
-            raise Exception
-
-        subprocess.call(args, shell=1)
+            tasks = [0]
+        return tasklib.completed(tasks, name=classname+'.'+funcname)
 
 
     def getnode(self):
@@ -2,8 +2,9 @@ from os.path import abspath, join
 
 import numpy as np
 
-from seisflows.tools import unix
+from seisflows.tools import metrics, unix
 from seisflows.tools.config import ConfigObj, ParameterObj
+from seisflows.system.lib import tasks as tasklib
 
 OBJ = ConfigObj('SeisflowsObjects')
 PAR = ParameterObj('SeisflowsParameters')
@@ -79,23 +80,39 @@ class serial(object):
     def run(self, classname, funcname, hosts='all', **kwargs):
         """ Runs tasks in serial or parallel on specified hosts
         """
-        unix.mkdir(PATH.SYSTEM)
-
-        if hosts == 'all':
-            for itask in range(PAR.NTASK):
-                self.setnode(itask)
-                self.progress(itask)
+        with metrics.span('run', classname+'.'+funcname):
+            unix.mkdir(PATH.SYSTEM)
+
+            if hosts == 'all':
+                for itask in range(PAR.NTASK):
+                    self.setnode(itask)
+                    self.progress(itask)
+                    func = getattr(__import__(classname), funcname)
+                    func(**kwargs)
+                print ''
+
+            elif hosts == 'head':
+                self.setnode(0)
                 func = getattr(__import__(classname), funcname)
                 func(**kwargs)
-            print ''
 
-        elif hosts == 'head':
-            self.setnode(0)
-            func = getattr(__import__(classname), funcname)
-            func(**kwargs)
+            else:
+                task(**kwargs)
+
+
+    def submit_tasks(self, classname, funcname, hosts='all', **kwargs):
+        """ Runs tasks and returns handle to finished tasks
 
+          Tasks are carried out before returning, so that exceptions are
+          raised as soon as they occur.
+        """
+        self.run(classname, funcname, hosts, **kwargs)
+
+        if hosts == 'all':
+            tasks = range(PAR.NTASK)
         else:
-            task(**kwargs)
+            tasks = [0]
+        return tasklib.completed(tasks, name=classname+'.'+funcname)
 
 
     def getnode(self):
@@ -1,19 +1,30 @@
 
 import os
+import hashlib
 import math
 import sys
 import subprocess
+import tempfile
 import time
-from os.path import abspath, join
+from os.path import abspath, dirname, join
 
 from seisflows.tools import unix
-from seisflows.tools.code import saveobj
+from seisflows.tools.code import exists, loadjson, savejson, saveobj
 from seisflows.tools.config import findpath, ConfigObj, ParameterObj
+from seisflows.system.lib import tasks as tasklib
 
 OBJ = ConfigObj('SeisflowsObjects')
 PAR = ParameterObj('SeisflowsParameters')
 PATH = ParameterObj('SeisflowsPaths')
 
+# initial interval in seconds between job status queries
+POLLMIN = 5.
+
+# job states other than these mean the job has ended, and states other than
+# these and COMPLETED mean it has failed
+ACTIVE = ['PENDING', 'RUNNING', 'REQUEUED', 'CONFIGURING', 'COMPLETING',
+          'SUSPENDED']
+
 
 class slurm_lg(object):
     """ An interface through which to submit workflows, run tasks in serial or 
@@ -53,9 +64,29 @@ class slurm_lg(object):
         if 'STEPTIME' not in PAR:
             setattr(PAR, 'STEPTIME', 30.)
 
+        # maximum interval in minutes between job status queries
         if 'SLEEPTIME' not in PAR:
             PAR.SLEEPTIME = 1.
 
+        # if nonzero, bundle tasks into jobs of this many nodes each
+        if 'NODES_PER_JOB' not in PAR:
+            setattr(PAR, 'NODES_PER_JOB', 0)
+
+        # number of tasks per bundle, by default as many as fit at once
+        if 'NTASK_PER_JOB' not in PAR:
+            setattr(PAR, 'NTASK_PER_JOB', 0)
+
+        if PAR.NODES_PER_JOB and self.nslot() < 1:
+            raise ValueError("NODES_PER_JOB too small for NPROC.")
+
+        # maximum number of times a failed task is resubmitted
+        if 'RETRYMAX' not in PAR:
+            setattr(PAR, 'RETRYMAX', 0)
+
+        # submit each iteration as a graph of dependent jobs
+        if 'DAG' not in PAR:
+            setattr(PAR, 'DAG', False)
+
         if 'VERBOSE' not in PAR:
             setattr(PAR, 'VERBOSE', 1)
 
@@ -87,6 +118,16 @@ class slurm_lg(object):
         self.save_parameters()
         self.save_paths()
 
+        if PAR.DAG:
+            # rather than being coordinated by a long-running master job,
+            # stages are chained together through the scheduler
+            if exists(self.graphfile()) and not self.graph_done():
+                self.resume_graph()
+            else:
+                self.submit_graph([
+                    ('main', 'workflow', 'main_graph', 'head', {}, [])])
+            return
+
         # prepare sbatch arguments
         args = ('sbatch '
                 + '--job-name=%s ' % PAR.TITLE
@@ -103,24 +144,111 @@ class slurm_lg(object):
     def run(self, classname, funcname, hosts='all', **kwargs):
         """  Runs tasks in serial or parallel on specified hosts.
         """
+        self.submit_tasks(classname, funcname, hosts, **kwargs).wait()
+
+
+    def submit_tasks(self, classname, funcname, hosts='all', **kwargs):
+        """ Submits tasks on specified hosts and returns without waiting for
+          them to finish
+
+          Failed tasks are resubmitted up to RETRYMAX times. Tasks that have
+          completed are recorded, so that if the same stage is run again
+          after an interruption, only unfinished tasks are submitted.
+        """
         self.save_objects()
 
         self.save_kwargs(classname, funcname, kwargs)
-        jobs = self.launch(classname, funcname, hosts)
-        while 1:
-            time.sleep(60.*PAR.SLEEPTIME)
-            self.timestamp()
-            isdone, jobs = self.task_status(classname, funcname, jobs)
-            if isdone:
-                return
 
+        if hosts == 'all':
+            tasks = range(PAR.NTASK)
+        elif hosts == 'head':
+            tasks = [0]
+        else:
+            raise Exception
 
-    def launch(self, classname, funcname, hosts='all'):
+        # skip tasks completed by a previous attempt at the same stage
+        checkpoint = self.checkpoint(classname, funcname)
+        completed = self.load_checkpoint(checkpoint) & set(tasks)
+        finished = set(completed)
+        succeeded = set(completed)
+        retries = dict.fromkeys(tasks, 0)
+
+        jobs = {}
+        pending = [itask for itask in tasks if itask not in finished]
+        if pending:
+            jobs.update(self.launch(classname, funcname, hosts, pending))
+        else:
+            unix.rm(checkpoint)
+
+        # poll frequently at first, then back off
+        intervals = _backoff(POLLMIN, 60.*PAR.SLEEPTIME)
+        initial = [(itask, None) for itask in sorted(completed)]
+
+        def update(timeout):
+            if initial:
+                results = initial[:]
+                del initial[:]
+                return results
+
+            start = time.time()
+            while True:
+                if timeout is None:
+                    time.sleep(next(intervals))
+                elif timeout > 0:
+                    remaining = timeout - (time.time() - start)
+                    time.sleep(max(0., min(next(intervals), remaining)))
+                self.timestamp()
+
+                results = []
+                resubmit = []
+                for itask, error in self.task_status(jobs, finished):
+                    if error and retries[itask] < PAR.RETRYMAX:
+                        retries[itask] += 1
+                        resubmit += [itask]
+                        finished.discard(itask)
+                    else:
+                        results += [(itask, error)]
+                    if not error:
+                        succeeded.add(itask)
+                        self.save_checkpoint(checkpoint, itask)
+
+                if resubmit:
+                    print ' resubmitting tasks', ', '.join(
+                        ['%02d' % (itask + 1) for itask in resubmit])
+                    jobs.update(self.launch(classname, funcname, hosts,
+                                            resubmit))
+
+                if len(succeeded) == len(tasks):
+                    unix.rm(checkpoint)
+
+                if results:
+                    return results
+                if timeout is not None and time.time() - start >= timeout:
+                    return []
+
+        return tasklib.TaskHandle(tasks, update, classname+'.'+funcname)
+
+
+    def launch(self, classname, funcname, hosts='all', tasks=None,
+               options=''):
+        """ Submits job array and returns dictionary mapping task numbers to
+          SLURM job ids. Any additional sbatch options can be given through
+          'options'.
+        """
         unix.mkdir(PATH.SYSTEM)
 
+        if tasks is None:
+            if hosts == 'all':
+                tasks = range(PAR.NTASK)
+            else:
+                tasks = [0]
+
+        if hosts == 'all' and PAR.NODES_PER_JOB:
+            return self.launch_bundles(classname, funcname, tasks, options)
+
         # prepare sbatch arguments
         if hosts == 'all':
-            args = ('--array=%d-%d ' % (0,PAR.NTASK-1)                             
+            args = ('--array=%s ' % _arraylist(tasks)
                    +'--output %s ' % (PATH.SUBMIT+'/'+'output.slurm/'+'%A_%a'))
 
         elif hosts == 'head':
@@ -135,59 +263,259 @@ class slurm_lg(object):
                 + '--nodes=%d ' % math.ceil(PAR.NPROC/float(PAR.NPROC_PER_NODE))
                 + '--ntasks-per-node=%d ' % PAR.NPROC_PER_NODE
                 + '--time=%d ' % PAR.STEPTIME
+                + options
                 + args
                 + findpath('system') +'/'+ 'slurm/wrapper_srun '
                 + PATH.OUTPUT + ' '
                 + classname + ' '
                 + funcname + ' ')
 
-        # submit jobs
-        with open(PATH.SYSTEM+'/'+'job_id', 'w') as f:
-            subprocess.call(args, shell=1, stdout=f)
+        job = self.sbatch(args)
 
         # return job ids
-        with open(PATH.SYSTEM+'/'+'job_id', 'r') as f:
-            line = f.readline()
-            job = line.split()[-1].strip()
-        if hosts == 'all' and PAR.NTASK > 1:
-            nn = range(PAR.NTASK)
-            return [job+'_'+str(ii) for ii in nn]
-        else:
-            return [job]
+        jobs = {}
+        for ii in tasks:
+            jobs[ii] = job+'_'+str(ii)
+        return jobs
 
 
-    def task_status(self, classname, funcname, jobs):
-        # query slurm database
-        for job in jobs:
-            state = self.getstate(job)
+    def launch_bundles(self, classname, funcname, tasks, options=''):
+        """ Submits job array in which each element runs a bundle of tasks
+          on NODES_PER_JOB nodes, and returns dictionary mapping task numbers
+          to SLURM job ids
 
-            states = []
-            if state in ['COMPLETED']:
-                states += [1]
+          Within a bundle, up to nslot() tasks run at the same time, each as
+          a separate job step; any remaining tasks wait for a free slot.
+        """
+        nslot = self.nslot()
+        nbundle = PAR.NTASK_PER_JOB or nslot
+        bundles = [tasks[ii:ii+nbundle] for ii in range(0, len(tasks), nbundle)]
+
+        # bundle contents are read by wrapper_bundle, one line per element
+        unix.mkdir(PATH.SYSTEM+'/'+'bundles')
+        fd, bundlefile = tempfile.mkstemp(dir=PATH.SYSTEM+'/'+'bundles',
+                                          prefix=classname+'.'+funcname+'.')
+        with os.fdopen(fd, 'w') as f:
+            for bundle in bundles:
+                f.write(' '.join(map(str, bundle))+'\n')
+
+        args = ('sbatch '
+                + '--job-name=%s ' % PAR.TITLE
+                + '--nodes=%d ' % PAR.NODES_PER_JOB
+                + '--ntasks-per-node=%d ' % PAR.NPROC_PER_NODE
+                + '--time=%d ' % (PAR.STEPTIME*math.ceil(nbundle/float(nslot)))
+                + options
+                + '--array=%d-%d ' % (0, len(bundles)-1)
+                + '--output %s ' % (PATH.SUBMIT+'/'+'output.slurm/'+'%A_%a')
+                + findpath('system') +'/'+ 'slurm/wrapper_bundle '
+                + PATH.OUTPUT + ' '
+                + classname + ' '
+                + funcname + ' '
+                + bundlefile + ' '
+                + '%d ' % nslot)
+
+        job = self.sbatch(args)
+
+        # all tasks in a bundle share one array element
+        jobs = {}
+        for ii, bundle in enumerate(bundles):
+            for itask in bundle:
+                jobs[itask] = job+'_'+str(ii)
+        return jobs
+
+
+    def bundle_status(self, job):
+        """ Reads exit codes of tasks in bundle, as written by wrapper_bundle
+        """
+        status = {}
+        filename = PATH.SYSTEM+'/'+'bundles/'+job
+        if exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    itask, code = line.split()
+                    status[int(itask)] = int(code)
+        return status
+
+
+    def sbatch(self, args):
+        """ Submits job and returns SLURM job id
+        """
+        output = subprocess.Popen(args, shell=1,
+            stdout=subprocess.PIPE).communicate()[0]
+        return output.split()[-1].strip()
+
+
+    def submit_graph(self, stages):
+        """ Submits stages as SLURM jobs linked by afterok dependencies and
+          returns without waiting for them to finish
+
+          Each stage is given as a tuple
+          (name, classname, funcname, hosts, kwargs, after), where 'after'
+          lists names of stages that must complete successfully first.
+          Because keyword arguments are saved per function, no two stages
+          may call the same function. Job ids are recorded, so that an
+          interrupted graph can be resumed with resume_graph.
+        """
+        self.save_objects()
+
+        graph = []
+        for name, classname, funcname, hosts, kwargs, after in stages:
+            graph += [{
+                'name': name,
+                'classname': classname,
+                'funcname': funcname,
+                'hosts': hosts,
+                'kwargs': kwargs,
+                'after': after,
+                'job': None}]
+
+        self.launch_graph(graph)
+
+
+    def resume_graph(self):
+        """ Resubmits stages of most recent graph that neither completed nor
+          are still waiting on stages that remain queued
+        """
+        self.launch_graph(loadjson(self.graphfile()))
+
+
+    def launch_graph(self, graph):
+        states = self.graph_states(graph)
+        submitted = set()
+
+        for stage in graph:
+            state = states.get(stage['name'])
+            if state == 'COMPLETED':
+                continue
+
+            # queued stages can stay in place if none of their dependencies
+            # have been resubmitted
+            if state == 'PENDING' and not submitted & set(stage['after']):
+                continue
+
+            if stage['job']:
+                self.scancel(stage['job'])
+
+            after = []
+            for dep in graph:
+                if dep['name'] in stage['after'] and \
+                   states.get(dep['name']) != 'COMPLETED':
+                    after += [dep['job']]
+
+            options = ''
+            if after:
+                options = ('--dependency=afterok:%s ' % ':'.join(after)
+                          +'--kill-on-invalid-dep=yes ')
+
+            self.save_kwargs(stage['classname'], stage['funcname'],
+                             stage['kwargs'])
+
+            jobs = self.launch(stage['classname'], stage['funcname'],
+                               stage['hosts'], options=options)
+
+            stage['job'] = jobs.values()[0].split('_')[0]
+            states[stage['name']] = 'PENDING'
+            submitted.add(stage['name'])
+
+            savejson(self.graphfile(), graph)
+
+
+    def graph_states(self, graph):
+        """ Returns dictionary mapping names of stages to 'COMPLETED',
+          'FAILED' or 'PENDING', omitting stages unknown to SLURM
+        """
+        jobs = [stage['job'] for stage in graph if stage['job']]
+        if not jobs:
+            return {}
+        states = self.getstates(jobs)
+
+        results = {}
+        for stage in graph:
+            elements = [state for job, state in states.items()
+                        if job.split('_')[0] == stage['job']]
+            if not elements:
+                continue
+            if set(elements) == set(['COMPLETED']):
+                results[stage['name']] = 'COMPLETED'
+            elif set(elements) - set(ACTIVE + ['COMPLETED']):
+                results[stage['name']] = 'FAILED'
             else:
-                states += [0]
-            if state in ['FAILED', 'NODE_FAIL', 'TIMEOUT']:
-                raise Exception
+                results[stage['name']] = 'PENDING'
+        return results
+
 
-        isdone = all(states)
+    def graph_done(self):
+        graph = loadjson(self.graphfile())
+        states = self.graph_states(graph)
+        return all([states.get(stage['name']) == 'COMPLETED'
+                    for stage in graph])
 
-        return isdone, jobs
+
+    def graphfile(self):
+        # kept outside PATH.GLOBAL, which is cleaned at the start of
+        # an inversion
+        return join(PATH.OUTPUT, 'SeisflowsGraph.json')
+
+
+    def task_status(self, jobs, finished):
+        """ Checks status of all array elements using a single query and
+          returns (itask, error) pairs for newly finished elements
+        """
+        states = self.getstates(jobs.values())
+
+        bundled = {}
+        if PAR.NODES_PER_JOB:
+            for job in set(jobs.values()):
+                if states.get(job) not in [None] + ACTIVE:
+                    bundled[job] = self.bundle_status(job)
+
+        results = []
+        for itask in sorted(jobs):
+            if itask in finished:
+                continue
+            # recently submitted jobs may not yet appear in the database
+            state = states.get(jobs[itask], 'PENDING')
+            if state in ['COMPLETED']:
+                results += [(itask, None)]
+            elif state not in ACTIVE:
+                if bundled.get(jobs[itask], {}).get(itask) == 0:
+                    # other tasks in the same bundle failed
+                    results += [(itask, None)]
+                else:
+                    results += [(itask, "Job %s ended with state %s." %
+                                 (jobs[itask], state))]
+        finished.update([itask for itask, _ in results])
+
+        return results
 
 
     def mpiargs(self):
+        if PAR.NODES_PER_JOB:
+            # exclusive steps keep bundled tasks from sharing cores
+            return ('srun --exclusive '
+                    + '--nodes=%d ' % math.ceil(PAR.NPROC/float(PAR.NPROC_PER_NODE))
+                    + '--ntasks=%d ' % PAR.NPROC)
         return 'srun '
 
-    def getstate(self, jobid):
-        """ Retrives job state from SLURM database
+    def nslot(self):
+        """ Number of bundled tasks that fit in one job at the same time
         """
-        with open(PATH.SYSTEM+'/'+'job_status', 'w') as f:
-            subprocess.call('sacct -n -o state -j '+jobid, shell=True, stdout=f)
+        nnode = int(math.ceil(PAR.NPROC/float(PAR.NPROC_PER_NODE)))
+        if nnode > 1:
+            return PAR.NODES_PER_JOB/nnode
+        return PAR.NODES_PER_JOB*(PAR.NPROC_PER_NODE/PAR.NPROC)
 
-        with open(PATH.SYSTEM+'/'+'job_status', 'r') as f:
-            line = f.readline()
-            state = line.strip()
+    def scancel(self, job):
+        subprocess.call('scancel ' + job, shell=True)
 
-        return state
+    def getstates(self, jobs):
+        """ Retrieves states of all given jobs from SLURM database
+        """
+        jobids = sorted(set([job.split('_')[0] for job in jobs]))
+        args = ('sacct -n -X -P -o jobid,state -j ' + ','.join(jobids))
+        output = subprocess.Popen(args, shell=True,
+            stdout=subprocess.PIPE).communicate()[0]
+        return _parse_sacct(output)
 
     def getnode(self):
         """ Gets number of running task
@@ -217,9 +545,91 @@ class slurm_lg(object):
     def save_objects(self):
         OBJ.save(join(PATH.OUTPUT, 'SeisflowsObjects'))
 
+    def checkpoint(self, classname, funcname):
+        """ Returns name of file listing completed tasks, which depends on
+          the function called, its arguments, and the state of all objects
+        """
+        path = join(PATH.OUTPUT, 'SeisflowsObjects')
+        files = [join(path, key+'.p') for key in OBJ]
+        files += [join(path, classname+'_kwargs', funcname+'.p')]
+
+        md5 = hashlib.md5(classname+'.'+funcname)
+        for file in files:
+            with open(file, 'rb') as f:
+                md5.update(f.read())
+        return join(PATH.SYSTEM, 'completed', md5.hexdigest())
+
+    def load_checkpoint(self, checkpoint):
+        if not exists(checkpoint):
+            return set()
+        with open(checkpoint, 'r') as f:
+            return set([int(line) for line in f if line.strip()])
+
+    def save_checkpoint(self, checkpoint, itask):
+        unix.mkdir(dirname(checkpoint))
+        with open(checkpoint, 'a') as f:
+            f.write('%d\n' % itask)
+
     def save_parameters(self):
         PAR.save('SeisflowsParameters.json')
 
     def save_paths(self):
         PATH.save('SeisflowsPaths.json')
 
+
+def _backoff(tmin, tmax, factor=2.):
+    """ Generates sleep intervals that grow geometrically from tmin to tmax
+    """
+    t = min(tmin, tmax)
+    while True:
+        yield t
+        t = min(t*factor, tmax)
+
+
+def _arraylist(tasks):
+    """ Formats task numbers for the sbatch --array option, collapsing
+      consecutive numbers into ranges
+    """
+    items = []
+    tasks = sorted(tasks)
+    imin = imax = tasks[0]
+    for itask in tasks[1:] + [None]:
+        if itask == imax + 1:
+            imax = itask
+            continue
+        if imin == imax:
+            items += ['%d' % imin]
+        else:
+            items += ['%d-%d' % (imin, imax)]
+        imin = imax = itask
+    return ','.join(items)
+
+
+def _parse_sacct(output):
+    """ Parses output of 'sacct -n -X -P -o jobid,state' into a dictionary
+      mapping job ids to states. Pending array elements, which SLURM reports
+      together in the form 'jobid_[0-9,12%4]', are expanded.
+    """
+    states = {}
+    for line in output.strip().splitlines():
+        if '|' not in line:
+            continue
+        jobid, state = line.split('|')[:2]
+        # e.g. 'CANCELLED by 1000'
+        state = (state.split() or [''])[0]
+
+        if '_[' in jobid:
+            job, indices = jobid.split('_[')
+            indices = indices.rstrip(']').split('%')[0]
+            for item in indices.split(','):
+                if '-' in item:
+                    imin, imax = item.split('-')
+                    nn = range(int(imin), int(imax)+1)
+                else:
+                    nn = [int(item)]
+                for ii in nn:
+                    states[job+'_'+str(ii)] = state
+        else:
+            states[jobid] = state
+
+    return states
@@ -1,10 +1,13 @@
 import os
 import subprocess
+import time
 from os.path import abspath, join
 
 from seisflows.tools import unix
 from seisflows.tools.code import saveobj
 from seisflows.tools.config import findpath, ConfigObj, ParameterObj
+from seisflows.system.lib import tasks as tasklib
+from seisflows.system.lib import workers
 
 OBJ = ConfigObj('SeisflowsObjects')
 PAR = ParameterObj('SeisflowsParameters')
@@ -45,6 +48,10 @@ class slurm_sm(object):
         if 'VERBOSE' not in PAR:
             setattr(PAR, 'VERBOSE', 1)
 
+        # use persistent worker processes
+        if 'WORKERS' not in PAR:
+            setattr(PAR, 'WORKERS', False)
+
         if 'TITLE' not in PAR:
             setattr(PAR, 'TITLE', unix.basename(abspath('.')))
 
@@ -92,9 +99,28 @@ class slurm_sm(object):
     def run(self, classname, funcname, hosts='all', **kwargs):
         """  Runs tasks in serial or parallel on specified hosts
         """
+        self.submit_tasks(classname, funcname, hosts, **kwargs).wait()
+
+
+    def submit_tasks(self, classname, funcname, hosts='all', **kwargs):
+        """ Starts tasks on specified hosts and returns without waiting for
+          them to finish
+        """
         if PAR.VERBOSE >= 2:
             print 'running', funcname
 
+        if hosts == 'all':
+            tasks = range(PAR.NTASK)
+        elif hosts == 'head':
+            tasks = [0]
+        else:
+            raise Exception
+
+        if PAR.WORKERS:
+            # run on persistent worker processes, one per task slot
+            pool = workers.getpool(PAR.NTASK, self.launch_workers)
+            return pool.submit(classname, funcname, tasks, kwargs)
+
         # save current state
         save_objects(join(PATH.OUTPUT, 'SeisflowsObjects'))
 
@@ -121,15 +147,44 @@ class slurm_sm(object):
                     + PATH.OUTPUT + ' '
                     + classname + ' '
                     + funcname)
-        else:
-            raise Exception
 
-        subprocess.call(args, shell=1)
+        process = subprocess.Popen(args, shell=1)
+
+        # all tasks finish together when srun exits
+        def update(timeout):
+            start = time.time()
+            while process.poll() is None:
+                if timeout is not None and time.time() - start >= timeout:
+                    return []
+                time.sleep(0.1)
+            if process.returncode:
+                error = 'srun exited with code %d.' % process.returncode
+            else:
+                error = None
+            return [(itask, error) for itask in tasks]
+
+        return tasklib.TaskHandle(tasks, update, classname+'.'+funcname)
+
+
+    def launch_workers(self, address, env):
+        """ Starts worker processes within current allocation
+        """
+        args = ('srun '
+                + '--wait=0 '
+                + join(findpath('system'), 'lib/wrapper_worker ')
+                + PATH.OUTPUT + ' '
+                + address)
+
+        return [subprocess.Popen(args, shell=1, env=dict(os.environ, **env))]
 
 
     def getnode(self):
         """ Gets number of running task
         """
+        # set by persistent worker processes
+        if os.getenv('SEISFLOWS_TASK_ID'):
+            return int(os.getenv('SEISFLOWS_TASK_ID'))
+
         gid = os.getenv('SLURM_GTIDS').split(',')
         lid = int(os.getenv('SLURM_LOCALID'))
         return int(gid[lid])
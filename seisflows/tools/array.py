@@ -136,9 +136,13 @@ def uniquerows(a, sort_array=False, return_index=False):
         return ua
 
 
-def loadnpy(filename):
-    """Loads numpy binary file."""
-    return np.load(filename)
+def loadnpy(filename, mmap_mode=None):
+    """Loads numpy binary file.
+
+    With mmap_mode, the file is memory mapped rather than read, so that
+    slices can be accessed without reading the whole array.
+    """
+    return np.load(filename, mmap_mode=mmap_mode)
 
 
 def savenpy(filename, v):
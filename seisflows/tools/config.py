@@ -224,9 +224,10 @@ def _exists(parts):
     try:
         path = None
         for part in parts[:-1]:
+            # rather than loading packages, which would register them in
+            # sys.modules under their short names, just follow their paths
             args = imp.find_module(part, path)
-            obj = imp.load_module(part, *args)
-            path = obj.__path__
+            path = [args[1]]
         args = imp.find_module(parts[-1], path)
         return True
     except ImportError:
@@ -1,11 +1,15 @@
 
 import os as _os
 import struct as _struct
+from multiprocessing.pool import ThreadPool as _ThreadPool
 
 import numpy as _np
 
 from seisflows.tools.code import Struct
 
+# number of values converted at a time by savebin
+BLOCKSIZE = 2**20
+
 
 class BinaryReader(object):
     """Generic binary file reader"""
@@ -184,31 +188,63 @@ class OutputWriter(object):
 
 
 def loadbin(filename):
-    """Reads Fortran style binary data and return a numpy array."""
+    """Reads Fortran style binary data and return a numpy array.
+
+    The array is a read-only memory map of the record contents, which
+    excludes the record markers, so that nothing is read until used.
+    """
     with open(filename, 'rb') as file:
         # read size of record
         file.seek(0)
         n = _np.fromfile(file, dtype='int32', count=1)[0]
 
-        # read contents of record
-        file.seek(4)
-        v = _np.fromfile(file, dtype='float32')
+    if n == 0:
+        return _np.zeros(0, dtype='float32')
 
-    return v[:-1]
+    # map contents of record
+    return _np.memmap(filename, dtype='float32', mode='r', offset=4,
+                      shape=(n//4,))
 
 
 def savebin(v, filename):
     """Writes Fortran style binary data.
 
     Data will be written as single precision floating point numbers.
+    Single precision arrays are written directly, others are converted one
+    block at a time. The file is written under a temporary name and then
+    renamed, so that arrays mapped from an earlier version of the file
+    remain valid.
     """
+    v = _np.asarray(v)
     n = _np.array([4*len(v)], dtype='int32')
-    v = _np.array(v, dtype='float32')
+    v = v.reshape(-1)
 
-    with open(filename, 'wb') as file:
+    tmpfile = '%s.%d' % (filename, _os.getpid())
+    with open(tmpfile, 'wb') as file:
         n.tofile(file)
-        v.tofile(file)
+        if v.dtype == _np.float32:
+            v.tofile(file)
+        else:
+            for start in range(0, v.size, BLOCKSIZE):
+                v[start:start+BLOCKSIZE].astype('float32').tofile(file)
         n.tofile(file)
+    _os.rename(tmpfile, filename)
+
+
+def iomap(func, items, nthreads=1):
+    """Applies input/output function to each item, optionally using a pool
+    of threads, and returns list of results.
+
+    Useful for reading or writing one file per processor rank; numpy
+    releases the interpreter lock while copying and converting data.
+    """
+    if nthreads > 1 and len(items) > 1:
+        pool = _ThreadPool(min(nthreads, len(items)))
+        try:
+            return pool.map(func, items)
+        finally:
+            pool.close()
+    return map(func, items)
 
 
 def mychar(fmt):
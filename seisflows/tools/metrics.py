@@ -0,0 +1,189 @@
+
+import json
+import os
+import resource
+import socket
+import sys
+import time
+from contextlib import contextmanager
+from functools import wraps
+from os.path import join
+
+from seisflows.tools.config import ParameterObj
+
+PAR = ParameterObj('SeisflowsParameters')
+PATH = ParameterObj('SeisflowsPaths')
+
+# name of metrics file within output directory
+FILENAME = 'metrics.jsonl'
+
+
+@contextmanager
+def span(stage, name=''):
+    """ Records time and resources used by enclosed block of code
+
+      One line is appended to the metrics file for each span, giving stage,
+      name, task number, iteration and line search step, wall and CPU time,
+      peak resident set size, and bytes read and written. CPU time, memory
+      and I/O include child processes, such as solver executables, once
+      they have exited.
+
+      Recording is skipped unless an output directory is defined, and can
+      be turned off by setting METRICS to False.
+    """
+    if not enabled():
+        yield
+        return
+
+    before = _usage()
+    start = time.time()
+    error = False
+    try:
+        yield
+    except:
+        error = True
+        raise
+    finally:
+        after = _usage()
+        record = {
+            'stage': stage,
+            'name': name,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'start': start,
+            'wall': time.time() - start,
+            'cpu': after['cpu'] - before['cpu'],
+            'maxrss': after['maxrss'],
+            'read': after['read'] - before['read'],
+            'write': after['write'] - before['write'],
+            'error': error}
+        record.update(_context())
+        _write(record)
+
+
+def record(stage, name, start):
+    """ Records span that started at given time and ends now, without
+      measuring resource usage. Used for spans that cover waiting on other
+      processes, such as calls to system.run.
+    """
+    if not enabled():
+        return
+
+    values = {
+        'stage': stage,
+        'name': name,
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'start': start,
+        'wall': time.time() - start,
+        'cpu': None,
+        'maxrss': None,
+        'read': None,
+        'write': None,
+        'error': False}
+    values.update(_context())
+    _write(values)
+
+
+def timed(stage):
+    """ Decorator that records each call to the decorated function as a span
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enabled():
+    if 'OUTPUT' not in PATH:
+        return False
+    if 'METRICS' in PAR and not PAR.METRICS:
+        return False
+    return True
+
+
+def load(filename):
+    """ Reads spans from metrics file
+    """
+    records = []
+    with open(filename) as f:
+        for line in f:
+            # skip partial lines left by interrupted writes
+            try:
+                records += [json.loads(line)]
+            except ValueError:
+                pass
+    return records
+
+
+### utility functions
+
+def _usage():
+    """ Returns resources used so far by current process and its children
+    """
+    myself = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    usage = {}
+    usage['cpu'] = (myself.ru_utime + myself.ru_stime
+                  + children.ru_utime + children.ru_stime)
+
+    # kilobytes on Linux
+    usage['maxrss'] = max(myself.ru_maxrss, children.ru_maxrss)
+
+    # bytes passed through read and write calls by this process, plus
+    # blocks of 512 bytes read and written by children
+    usage['read'] = 512*children.ru_inblock
+    usage['write'] = 512*children.ru_oublock
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                key, value = line.split(':')
+                if key == 'rchar':
+                    usage['read'] += int(value)
+                elif key == 'wchar':
+                    usage['write'] += int(value)
+    except IOError:
+        usage['read'] += 512*myself.ru_inblock
+        usage['write'] += 512*myself.ru_oublock
+
+    return usage
+
+
+def _context():
+    """ Returns task number, iteration and line search step, where known
+    """
+    context = {'task': None, 'iter': None, 'step': None}
+
+    system = sys.modules.get('system')
+    try:
+        context['task'] = int(system.getnode())
+    except Exception:
+        pass
+
+    optimize = sys.modules.get('optimize')
+    for key in ['iter', 'step']:
+        value = getattr(optimize, key, None)
+        if isinstance(value, int):
+            context[key] = value
+
+    return context
+
+
+def _write(record):
+    # a single write to a file opened in append mode keeps lines from
+    # concurrent processes intact
+    line = json.dumps(record, sort_keys=True) + '\n'
+    try:
+        fd = os.open(join(PATH.OUTPUT, FILENAME),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0644)
+    except OSError:
+        # never let instrumentation interrupt a workflow
+        return
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
@@ -61,10 +61,7 @@ def ln(src, dst):
 
 def ls(path):
     dirs = _os.listdir(path)
-    for dir in dirs:
-        if dir[0] == '.':
-            dirs.remove(dir)
-    return dirs
+    return [dir for dir in dirs if dir[0] != '.']
 
 
 def mkdir(dirs):
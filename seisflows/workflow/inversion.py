@@ -128,6 +128,77 @@ class inversion(object):
                 return
 
 
+    def main_graph(self):
+        """ Carries out seismic inversion as a chain of dependent jobs
+
+          Used in place of 'main' by systems that submit each iteration
+          as a graph of jobs linked through the scheduler, so that no job
+          has to wait between stages.
+        """
+        self.setup()
+        self.iter = PAR.BEGIN
+        self.submit_iteration()
+
+
+    def submit_iteration(self):
+        """ Submits stages of current iteration, the last of which submits
+          the next iteration
+        """
+        optimize.iter = self.iter
+        print "Starting iteration", self.iter
+
+        stages = []
+        after = []
+        if not self.solver_status():
+            self.prepare_model(path=PATH.GRAD, suffix='new')
+            stages += [('eval_func', 'solver', 'eval_func', 'all',
+                        {'path': PATH.GRAD}, [])]
+            after = ['eval_func']
+
+        stages += [('eval_grad', 'solver', 'eval_grad', 'all',
+                    {'path': PATH.GRAD,
+                     'export_traces': divides(self.iter, PAR.SAVETRACES)},
+                    after)]
+
+        stages += [('process_gradient', 'workflow', 'process_gradient', 'head',
+                    {}, ['eval_grad'])]
+
+        stages += [('update_model', 'workflow', 'update_model', 'head',
+                    {}, ['process_gradient'])]
+
+        system.submit_graph(stages)
+
+
+    def process_gradient(self):
+        """ Sums residuals and processes kernels once solver stages of
+          current iteration have finished
+        """
+        if not self.solver_status():
+            self.sum_residuals(path=PATH.GRAD, suffix='new')
+
+        postprocess.process_kernels(
+            path=PATH.GRAD)
+
+
+    def update_model(self):
+        """ Computes model update and submits next iteration
+        """
+        print "Computing search direction"
+        optimize.compute_direction()
+
+        print "Computing step length"
+        self.line_search()
+
+        self.finalize()
+        print ''
+
+        if self.isdone or self.iter >= PAR.END:
+            return
+
+        self.iter += 1
+        self.submit_iteration()
+
+
     def setup(self):
         """ Lays groundwork for inversion
         """
@@ -163,11 +234,11 @@ class inversion(object):
 
             self.prepare_model(path=PATH.GRAD, suffix='new')
 
-            system.run('solver', 'eval_func',
-                       hosts='all',
-                       path=PATH.GRAD)
+            tasks = system.submit_tasks('solver', 'eval_func',
+                                        hosts='all',
+                                        path=PATH.GRAD)
 
-            self.sum_residuals(path=PATH.GRAD, suffix='new')
+            self.sum_residuals(path=PATH.GRAD, suffix='new', tasks=tasks)
 
 
     def compute_direction(self):
@@ -221,11 +292,11 @@ class inversion(object):
         self.prepare_model(path=PATH.FUNC, suffix='try')
 
         # forward simulation
-        system.run('solver', 'eval_func',
-                   hosts='all',
-                   path=PATH.FUNC)
+        tasks = system.submit_tasks('solver', 'eval_func',
+                                    hosts='all',
+                                    path=PATH.FUNC)
 
-        self.sum_residuals(path=PATH.FUNC, suffix='try')
+        self.sum_residuals(path=PATH.FUNC, suffix='try', tasks=tasks)
 
 
     def evaluate_gradient(self):
@@ -281,24 +352,44 @@ class inversion(object):
 
     def prepare_model(self, path='', suffix=''):
         """ Writes model in format used by solver
+
+          Also clears residuals left over from the previous evaluation, so
+          that only those written by the upcoming one are summed.
         """
         unix.mkdir(path)
+        unix.rm(path +'/'+ 'residuals')
         src = PATH.OPTIMIZE +'/'+ 'm_' + suffix
         dst = path +'/'+ 'model'
-        parts = solver.split(loadnpy(src))
+        # split yields views of the mapped vector, so each part is read
+        # only when written
+        parts = solver.split(loadnpy(src, mmap_mode='r'))
         solver.save(dst, parts)
 
 
-    def sum_residuals(self, path='', suffix=''):
+    def sum_residuals(self, path='', suffix='', tasks=None):
         """ Sums residuals to obtain misfit function value
+
+          If given a handle to running tasks, reads residuals from each
+          source as soon as its task finishes.
         """
         src = path +'/'+ 'residuals'
         dst = PATH.OPTIMIZE +'/'+ 'f_' + suffix
-        residuals = []
-        for file in unix.ls(src):
-            fromfile = np.loadtxt(src +'/'+ file)
-            residuals.append(fromfile**2.)
-        np.savetxt(dst, [np.sum(residuals)])
+
+        def helper(name):
+            fromfile = np.loadtxt(src +'/'+ name)
+            return np.sum(fromfile**2.)
+
+        total = 0.
+        if tasks:
+            names = solver.source_names
+            for itask in tasks.as_completed():
+                if itask not in tasks.errors:
+                    total += helper(names[itask])
+            tasks.wait()
+        else:
+            for name in unix.ls(src):
+                total += helper(name)
+        np.savetxt(dst, [total])
 
 
     def solver_status(self):
@@ -322,7 +413,7 @@ class inversion(object):
     def save_model(self):
         src = PATH.OPTIMIZE +'/'+ 'm_new'
         dst = join(PATH.OUTPUT, 'model_%04d' % self.iter)
-        solver.save(dst, solver.split(loadnpy(src)))
+        solver.save(dst, solver.split(loadnpy(src, mmap_mode='r')))
 
 
     def save_kernels(self):
@@ -56,6 +56,7 @@ setup(
         'scripts/sfclean',
         'scripts/sfexamples',
         'scripts/sfexamples-research',
+        'scripts/sfprofile',
         'scripts/sfrun'
     ]
 
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+""" Measures overhead added by system classes on top of task run time
+
+  Tasks are submitted through the local scheduler emulator in
+  tests/emulator, so that cluster system classes can be timed on a
+  workstation. For each call to system.run, reports
+
+    wall     total time spent in system.run
+    submit   time spent in sbatch
+    queue    mean time from submission to start of job or job step
+    startup  mean time from start of job or job step to start of task,
+             mostly spent by wrapper scripts loading objects
+    poll     time from end of last task until system.run returns
+    over     wall time minus task duration
+
+  as well as the time needed to pickle and unpickle all objects.
+
+  Example:
+    ./run.py --system slurm_lg --ntask 16 --nrun 3 --delay 1
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, join
+
+MYPATH = dirname(abspath(__file__))
+ROOT = abspath(join(MYPATH, '..', '..', '..'))
+EMULATOR = abspath(join(MYPATH, '..', '..', 'emulator'))
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, MYPATH)
+
+from seisflows.tools import unix
+from seisflows.tools.code import exists, loadobj
+from seisflows.tools.config import loadclass, ConfigObj, ParameterObj, Null
+
+OBJ = ConfigObj('SeisflowsObjects')
+PAR = ParameterObj('SeisflowsParameters')
+PATH = ParameterObj('SeisflowsPaths')
+
+
+def getargs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--system', default='slurm_lg')
+    parser.add_argument('--ntask', type=int, default=8)
+    parser.add_argument('--nrun', type=int, default=3)
+    parser.add_argument('--duration', type=float, default=0.,
+                        help='seconds each task sleeps')
+    parser.add_argument('--delay', type=float, default=0.,
+                        help='seconds each job waits in queue')
+    parser.add_argument('--failrate', type=float, default=0.,
+                        help='probability of injected node failure')
+    parser.add_argument('--retrymax', type=int, default=0,
+                        help='resubmissions of failed tasks')
+    parser.add_argument('--workdir', default=None)
+    return parser.parse_args()
+
+
+def setup(args, workdir):
+    """ Sets up environment, parameters and objects
+    """
+    # wrapper scripts are started through 'python' on PATH
+    unix.mkdir(join(workdir, 'bin'))
+    os.symlink(sys.executable, join(workdir, 'bin', 'python'))
+
+    os.environ['PATH'] = os.pathsep.join([join(EMULATOR, 'bin'),
+        join(workdir, 'bin'), os.environ['PATH']])
+    os.environ['PYTHONPATH'] = os.pathsep.join([ROOT, MYPATH,
+        os.getenv('PYTHONPATH', '')])
+    os.environ['FAKESCHED_DIR'] = join(workdir, 'fakesched')
+    os.environ['FAKESCHED_DELAY'] = str(args.delay)
+    os.environ['FAKESCHED_FAILRATE'] = str(args.failrate)
+    unix.mkdir(os.environ['FAKESCHED_DIR'])
+
+    # as seen from within an allocation
+    os.environ['SLURM_NTASKS'] = str(args.ntask)
+    os.environ['PBS_NP'] = str(args.ntask)
+
+    PAR.update({
+        'SYSTEM': args.system,
+        'TITLE': 'benchmark',
+        'NTASK': args.ntask,
+        'NPROC': 1,
+        'NPROC_PER_NODE': 1,
+        'RETRYMAX': args.retrymax,
+        'VERBOSE': 0})
+
+    PATH.update({
+        'GLOBAL': join(workdir, 'scratch'),
+        'SUBMIT': workdir,
+        'OUTPUT': join(workdir, 'output')})
+
+    unix.mkdir(join(workdir, 'output.slurm'))
+    unix.cd(workdir)
+
+    from tasks import benchmark
+
+    OBJ.register('system', loadclass('system', args.system)())
+    OBJ.register('solver', benchmark())
+    for key in ['preprocess', 'postprocess', 'optimize', 'workflow']:
+        OBJ.register(key, Null())
+
+    for key in OBJ:
+        sys.modules[key].check()
+
+    # wrapper scripts read parameters and paths from output directory
+    unix.mkdir(PATH.OUTPUT)
+    PAR.save(join(PATH.OUTPUT, 'SeisflowsParameters.json'))
+    PATH.save(join(PATH.OUTPUT, 'SeisflowsPaths.json'))
+
+
+def pickle_time(workdir):
+    """ Returns time needed to pickle and unpickle all objects
+    """
+    path = join(workdir, 'pickled')
+    start = time.time()
+    OBJ.save(path)
+    for key in OBJ:
+        loadobj(join(path, key+'.p'))
+    return time.time() - start
+
+
+def events(workdir):
+    filename = join(workdir, 'fakesched', 'events.log')
+    if not exists(filename):
+        return
+    with open(filename) as f:
+        for line in f:
+            t, event, key = line.split()
+            yield float(t), event, key
+
+
+def measure(workdir, start, end):
+    """ Breaks down time spent in one call to system.run
+    """
+    selected = [e for e in events(workdir) if start <= e[0] <= end]
+
+    def times(name):
+        return [t for t, event, _ in selected if event == name]
+
+    submit = sum([t1 - t0 for t0, t1 in
+                  zip(times('submit_start'), times('submit_end'))])
+
+    # jobs and job steps, keyed by task number
+    launches = []
+    for t, event, key in selected:
+        if event == 'element_start':
+            launches += [(t, int(key.split('_')[-1]))]
+        elif event == 'copy_start':
+            launches += [(t, int(key))]
+
+    queue = []
+    submitted = times('submit_end')
+    for t, _ in launches:
+        before = [ts for ts in submitted if ts <= t]
+        queue += [t - (before[-1] if before else start)]
+
+    startup = []
+    for t, event, key in selected:
+        if event != 'task_start':
+            continue
+        before = [tl for tl, itask in launches if itask == int(key) and tl <= t]
+        if before:
+            startup += [t - before[-1]]
+
+    finished = times('task_end')
+    poll = end - max(finished) if finished else float('nan')
+
+    return {'wall': end - start,
+            'submit': submit,
+            'queue': _mean(queue),
+            'startup': _mean(startup),
+            'poll': poll}
+
+
+def _mean(values):
+    if not values:
+        return float('nan')
+    return sum(values)/len(values)
+
+
+if __name__ == '__main__':
+    args = getargs()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='sfbench')
+    workdir = abspath(workdir)
+    unix.mkdir(workdir)
+    setup(args, workdir)
+
+    import system
+
+    print 'system:', args.system, ' ntask:', args.ntask, \
+          ' duration:', args.duration, ' delay:', args.delay
+    print 'pickle/unpickle objects: %.3f s' % pickle_time(workdir)
+    print ''
+    print '%4s %8s %8s %8s %8s %8s %8s' % \
+        ('run', 'wall', 'submit', 'queue', 'startup', 'poll', 'over')
+
+    results = []
+    for irun in range(args.nrun):
+        start = time.time()
+        try:
+            system.run('solver', 'task', hosts='all', duration=args.duration)
+        except Exception as e:
+            print 'run %d failed: %s' % (irun+1, e)
+        end = time.time()
+
+        result = measure(workdir, start, end)
+        result['over'] = result['wall'] - args.duration
+        results += [result]
+
+        print '%4d %8.3f %8.3f %8.3f %8.3f %8.3f %8.3f' % \
+            tuple([irun+1] + [result[key] for key in
+                  ['wall', 'submit', 'queue', 'startup', 'poll', 'over']])
+
+    print '%4s %8.3f %8.3f %8.3f %8.3f %8.3f %8.3f' % \
+        tuple(['mean'] + [_mean([result[key] for result in results]) for key in
+              ['wall', 'submit', 'queue', 'startup', 'poll', 'over']])
+
+    if not args.workdir:
+        shutil.rmtree(workdir)
@@ -0,0 +1,24 @@
+
+import os
+import time
+from os.path import join
+
+
+class benchmark(object):
+    """ Stands in for solver when measuring system overhead. Tasks do
+      nothing but sleep, and record when they start and finish.
+    """
+    def check(self):
+        pass
+
+    def task(self, duration=0.):
+        import system
+        itask = system.getnode()
+        log('task_start', itask)
+        time.sleep(duration)
+        log('task_end', itask)
+
+
+def log(event, key):
+    with open(join(os.environ['FAKESCHED_DIR'], 'events.log'), 'a') as f:
+        f.write('%.6f %s %s\n' % (time.time(), event, key))
@@ -0,0 +1,628 @@
+#!/usr/bin/env python
+""" Local stand-in for SLURM and PBS commands
+
+  Emulates sbatch, sacct, squeue, scancel, srun, qsub, qstat, qdel and
+  pbsdsh by running tasks
+  as local processes, so that system classes can be exercised and timed
+  without a cluster. Each command is a symbolic link to this file in the
+  'bin' directory; put that directory first on PATH to use it.
+
+  Settings are read from environment variables:
+
+    FAKESCHED_DIR       directory holding job state (default /tmp/fakesched)
+    FAKESCHED_DELAY     seconds each job waits in queue (default 0)
+    FAKESCHED_FAILRATE  probability that an array element fails without
+                        running, as if its node had failed (default 0)
+    FAKESCHED_SLOTS     array elements run at the same time per job
+                        (default unlimited)
+    FAKESCHED_NP        number of vnodes seen by pbsdsh if PBS_NP is not set
+
+  Timestamped events are appended to FAKESCHED_DIR/events.log, one per line
+  in the form 'time event key', for use by benchmarks.
+"""
+
+from __future__ import print_function
+
+import fcntl
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from os.path import basename, exists, join
+
+
+# sbatch options that take a value
+SBATCH_OPTIONS = ['array', 'output', 'error', 'job-name', 'nodes', 'ntasks',
+    'ntasks-per-node', 'cpus-per-task', 'time', 'dependency', 'export',
+    'mem', 'partition', 'account', 'kill-on-invalid-dep', 'chdir']
+
+SBATCH_SHORT = {'-a': 'array', '-o': 'output', '-e': 'error',
+    '-J': 'job-name', '-N': 'nodes', '-n': 'ntasks', '-c': 'cpus-per-task',
+    '-t': 'time', '-d': 'dependency', '-p': 'partition', '-A': 'account'}
+
+QSUB_SHORT = {'-N': 'name', '-o': 'output', '-e': 'error', '-j': 'join',
+    '-l': 'resources', '-J': 'array', '-v': 'variables', '-W': 'attributes',
+    '-q': 'queue', '-A': 'account'}
+
+FAILED = ['FAILED', 'NODE_FAIL', 'TIMEOUT', 'CANCELLED']
+
+
+def main(argv):
+    command = basename(argv[0])
+    if command in ['fakesched', 'fakesched.py']:
+        command, argv = argv[1], argv[1:]
+
+    try:
+        func = COMMANDS[command]
+    except KeyError:
+        sys.exit('fakesched: unknown command %s' % command)
+    sys.exit(func(argv[1:]) or 0)
+
+
+### commands
+
+def sbatch(args):
+    log('submit_start', '-')
+
+    options, script = _parse_options(args, SBATCH_OPTIONS, SBATCH_SHORT)
+    if not script:
+        sys.exit('sbatch: no batch script given')
+
+    jobid = _nextid()
+    if 'array' in options:
+        elements = [str(ii) for ii in _parse_array(options['array'])]
+    else:
+        elements = ['']
+
+    job = {
+        'id': jobid,
+        'name': options.get('job-name', basename(script[0])),
+        'script': script,
+        'elements': elements,
+        'output': options.get('output', 'slurm-%j.out'),
+        'dependency': _parse_dependency(options.get('dependency', '')),
+        'kill': options.get('kill-on-invalid-dep', 'no') == 'yes',
+        'ntasks': _ntasks(options),
+        'nodes': int(options.get('nodes', 1)),
+        'cwd': options.get('chdir', os.getcwd())}
+
+    _submit(job)
+
+    log('submit_end', jobid)
+    if 'parsable' in options:
+        print(jobid)
+    else:
+        print('Submitted batch job %s' % jobid)
+
+
+def qsub(args):
+    log('submit_start', '-')
+
+    options, script = _parse_options(args, [], QSUB_SHORT, multiple=['-l'])
+    if not script:
+        sys.exit('qsub: no executable given')
+
+    jobid = _nextid()
+    if 'array' in options:
+        spec = options['array']
+        elements = [str(ii) for ii in _parse_array(spec)]
+        if len(elements) < 2:
+            sys.exit('qsub: array job must have at least two subjobs')
+    else:
+        elements = ['']
+
+    env = {}
+    for item in options.get('variables', '').split(','):
+        if '=' in item:
+            key, value = item.split('=', 1)
+            env[key] = value
+
+    depend = options.get('attributes', '')
+    if depend.startswith('depend='):
+        depend = depend[len('depend='):]
+    else:
+        depend = ''
+
+    job = {
+        'id': jobid,
+        'kind': 'pbs',
+        'name': options.get('name', basename(script[0])),
+        'script': script,
+        'elements': elements,
+        'output': options.get('output', ''),
+        'dependency': _parse_dependency(depend),
+        'kill': True,
+        'env': env,
+        'cwd': os.getcwd()}
+    if 'array' in options and '%' in options['array']:
+        job['slots'] = int(options['array'].split('%')[1])
+
+    _submit(job)
+
+    log('submit_end', jobid)
+    if elements == ['']:
+        print('%s.fakesched' % jobid)
+    else:
+        print('%s[].fakesched' % jobid)
+
+
+def qstat(args):
+    _, names = _parse_options(args, [], {})
+    ids = []
+    for name in names:
+        name = name.split('.')[0]
+        if name.endswith('[]'):
+            ids += [name[:-2]]
+        else:
+            ids += [name.replace('[', '_').rstrip(']')]
+
+    for jobid, element in _select(','.join(ids)):
+        job = _loadjob(jobid)
+        state = _getstate(jobid, element)
+        if element:
+            print('Job Id: %s[%s].fakesched' % (jobid, element))
+        else:
+            print('Job Id: %s.fakesched' % jobid)
+        print('    Job_Name = %s' % job['name'])
+
+        if state in ['PENDING']:
+            print('    job_state = Q')
+        elif state in ['RUNNING']:
+            print('    job_state = R')
+        else:
+            print('    job_state = %s' % ('X' if element else 'F'))
+            code = _getfile(jobid, element, 'exitcode')
+            if state == 'NODE_FAIL':
+                print('    Exit_status = -3')
+            elif code:
+                print('    Exit_status = %s' % code.split(':')[0])
+        print('')
+
+
+def qdel(args):
+    _, names = _parse_options(args, [], {})
+    ids = [name.split('.')[0].replace('[]', '').replace('[', '_').rstrip(']')
+           for name in names]
+    scancel(ids)
+
+
+def sacct(args):
+    options, _ = _parse_options(args, ['jobs', 'format'],
+                                {'-j': 'jobs', '-o': 'format'})
+    fields = options.get('format', 'jobid,jobname,state').lower().split(',')
+    parsable = 'parsable2' in options or '-P' in args
+
+    lines = []
+    if 'noheader' not in options and '-n' not in args:
+        lines += [[field.upper() for field in fields]]
+
+    for jobid, element in _select(options.get('jobs')):
+        job = _loadjob(jobid)
+        values = {
+            'jobid': _key(jobid, element),
+            'jobname': job['name'],
+            'state': _getstate(jobid, element),
+            'exitcode': _getfile(jobid, element, 'exitcode') or '0:0'}
+        lines += [[values.get(field, '') for field in fields]]
+
+    for line in lines:
+        if parsable:
+            print('|'.join(line))
+        else:
+            print(' '.join(['%-12s' % value for value in line]))
+
+
+def squeue(args):
+    options, _ = _parse_options(args, ['jobs', 'user', 'format', 'name'],
+                                {'-j': 'jobs', '-u': 'user', '-o': 'format',
+                                 '-n': 'name'})
+    if 'noheader' not in options and '-h' not in args:
+        print('%18s %12s %2s' % ('JOBID', 'NAME', 'ST'))
+
+    codes = {'PENDING': 'PD', 'RUNNING': 'R'}
+    for jobid, element in _select(options.get('jobs')):
+        state = _getstate(jobid, element)
+        if state in codes:
+            print('%18s %12s %2s' % (_key(jobid, element),
+                                     _loadjob(jobid)['name'][:12],
+                                     codes[state]))
+
+
+def scancel(args):
+    _, jobs = _parse_options(args, [], {})
+    for jobid, element in _select(','.join(jobs)):
+        state = _getstate(jobid, element)
+        if state == 'PENDING':
+            _setstate(jobid, element, 'CANCELLED')
+        elif state == 'RUNNING':
+            _setstate(jobid, element, 'CANCELLED')
+            pid = _getfile(jobid, element, 'pid')
+            if pid:
+                try:
+                    os.killpg(int(pid), signal.SIGTERM)
+                except OSError:
+                    pass
+
+
+def srun(args):
+    options, command = _parse_options(args,
+        ['ntasks', 'nodes', 'cpus-per-task', 'wait', 'export', 'output',
+         'job-name', 'distribution'],
+        {'-n': 'ntasks', '-N': 'nodes', '-c': 'cpus-per-task', '-W': 'wait'})
+    if not command:
+        sys.exit('srun: no command given')
+
+    ntasks = int(options.get('ntasks') or os.getenv('SLURM_NTASKS') or 1)
+    gtids = ','.join([str(ii) for ii in range(ntasks)])
+
+    def env(ii):
+        return dict(os.environ,
+                    SLURM_PROCID=str(ii),
+                    SLURM_LOCALID=str(ii),
+                    SLURM_GTIDS=gtids,
+                    SLURM_NTASKS=str(ntasks))
+
+    return _runcopies(command, ntasks, env)
+
+
+def pbsdsh(args):
+    options, command = _parse_options(args, ['vnode'], {'-n': 'vnode'})
+    if not command:
+        sys.exit('pbsdsh: no command given')
+
+    nvnode = int(os.getenv('PBS_NP') or os.getenv('FAKESCHED_NP') or 1)
+    if 'vnode' in options:
+        vnodes = [int(options['vnode'])]
+    else:
+        vnodes = range(nvnode)
+
+    def env(ii):
+        return dict(os.environ,
+                    PBS_VNODENUM=str(vnodes[ii]),
+                    PBS_TASKNUM=str(vnodes[ii]),
+                    PBS_NP=str(nvnode))
+
+    return _runcopies(command, len(vnodes), env)
+
+
+def runjob(args):
+    """ Carries out a submitted job; started in the background by sbatch
+    """
+    jobid = args[0]
+    job = _loadjob(jobid)
+
+    time.sleep(float(os.getenv('FAKESCHED_DELAY', 0.)))
+
+    # wait for dependencies
+    while not _ready(job):
+        if job['kill'] and _invalid(job):
+            for element in job['elements']:
+                if _getstate(jobid, element) == 'PENDING':
+                    _setstate(jobid, element, 'CANCELLED')
+            return
+        time.sleep(0.2)
+
+    failrate = float(os.getenv('FAKESCHED_FAILRATE', 0.))
+    nslot = int(job.get('slots') or os.getenv('FAKESCHED_SLOTS')
+                or len(job['elements']))
+
+    pending = list(job['elements'])
+    running = {}
+    while pending or running:
+        while pending and len(running) < nslot:
+            element = pending.pop(0)
+            if _getstate(jobid, element) != 'PENDING':
+                continue
+            if random.random() < failrate:
+                log('element_fail', _key(jobid, element))
+                _setstate(jobid, element, 'NODE_FAIL')
+                continue
+            running[element] = _start(job, element)
+
+        for element, process in list(running.items()):
+            if process.poll() is None:
+                continue
+            log('element_end', _key(jobid, element))
+            _setfile(jobid, element, 'exitcode', '%d:0' % process.returncode)
+            if _getstate(jobid, element) == 'RUNNING':
+                if process.returncode:
+                    _setstate(jobid, element, 'FAILED')
+                else:
+                    _setstate(jobid, element, 'COMPLETED')
+            del running[element]
+
+        time.sleep(0.05)
+
+
+COMMANDS = {
+    'sbatch': sbatch,
+    'sacct': sacct,
+    'squeue': squeue,
+    'scancel': scancel,
+    'srun': srun,
+    'qsub': qsub,
+    'qstat': qstat,
+    'qdel': qdel,
+    'pbsdsh': pbsdsh,
+    '_runjob': runjob}
+
+
+### utility functions
+
+def log(event, key):
+    """ Appends timestamped event to events log
+    """
+    _mkdir(_statedir())
+    with open(join(_statedir(), 'events.log'), 'a') as f:
+        f.write('%.6f %s %s\n' % (time.time(), event, key))
+
+
+def _submit(job):
+    jobid = job['id']
+    path = _jobdir(jobid)
+    os.makedirs(path)
+    for element in job['elements']:
+        _setstate(jobid, element, 'PENDING')
+    with open(join(path, 'job.json'), 'w') as f:
+        json.dump(job, f)
+
+    # job runs in a detached process, as it would on a cluster
+    with open(os.devnull, 'w') as devnull:
+        subprocess.Popen([sys.executable, os.path.realpath(__file__),
+                          '_runjob', jobid],
+                         stdout=devnull, stderr=devnull,
+                         close_fds=True, preexec_fn=os.setsid)
+
+
+def _start(job, element):
+    jobid = job['id']
+    if job.get('kind') == 'pbs':
+        return _start_pbs(job, element)
+
+    env = dict(os.environ,
+               SLURM_JOB_ID=jobid,
+               SLURM_JOBID=jobid,
+               SLURM_JOB_NAME=job['name'],
+               SLURM_NTASKS=str(job['ntasks']),
+               SLURM_JOB_NUM_NODES=str(job['nodes']),
+               SLURM_SUBMIT_DIR=job['cwd'])
+    if element:
+        env.update(SLURM_ARRAY_JOB_ID=jobid, SLURM_ARRAY_TASK_ID=element)
+
+    output = (job['output'].replace('%A', jobid)
+                           .replace('%a', element)
+                           .replace('%j', jobid))
+    if not output.startswith('/'):
+        output = join(job['cwd'], output)
+
+    _setstate(jobid, element, 'RUNNING')
+    log('element_start', _key(jobid, element))
+    with open(output, 'a') as f:
+        process = subprocess.Popen(job['script'], cwd=job['cwd'], env=env,
+                                   stdout=f, stderr=subprocess.STDOUT,
+                                   preexec_fn=os.setsid)
+    _setfile(jobid, element, 'pid', str(process.pid))
+    return process
+
+
+def _start_pbs(job, element):
+    jobid = job['id']
+    env = dict(os.environ, PBS_JOBID=jobid, PBS_JOBNAME=job['name'],
+               PBS_O_WORKDIR=job['cwd'], **job['env'])
+    if element:
+        env.update(PBS_ARRAY_ID=jobid+'[]', PBS_ARRAY_INDEX=element)
+
+    # output goes into given directory, or file, or working directory
+    output = job['output'] or job['cwd']
+    if os.path.isdir(output):
+        output = join(output, '%s.OU' % _key(jobid, element))
+
+    _setstate(jobid, element, 'RUNNING')
+    log('element_start', _key(jobid, element))
+    with open(output, 'a') as f:
+        process = subprocess.Popen(job['script'], cwd=job['cwd'], env=env,
+                                   stdout=f, stderr=subprocess.STDOUT,
+                                   preexec_fn=os.setsid)
+    _setfile(jobid, element, 'pid', str(process.pid))
+    return process
+
+
+def _runcopies(command, ncopy, env):
+    """ Runs copies of command at the same time and returns first nonzero
+      exit code
+    """
+    processes = []
+    for ii in range(ncopy):
+        log('copy_start', ii)
+        processes += [subprocess.Popen(command, env=env(ii))]
+
+    status = 0
+    for ii, process in enumerate(processes):
+        process.wait()
+        log('copy_end', ii)
+        status = status or process.returncode
+    return status
+
+
+def _ready(job):
+    for depid in job['dependency']:
+        depjob = _loadjob(depid)
+        for element in depjob['elements']:
+            if _getstate(depid, element) != 'COMPLETED':
+                return False
+    return True
+
+
+def _invalid(job):
+    for depid in job['dependency']:
+        depjob = _loadjob(depid)
+        for element in depjob['elements']:
+            if _getstate(depid, element) in FAILED:
+                return True
+    return False
+
+
+def _select(jobs):
+    """ Yields (jobid, element) pairs matching comma-separated list of job
+      ids, or all jobs if none given
+    """
+    if jobs:
+        names = jobs.split(',')
+    else:
+        names = sorted(_alljobs(), key=int)
+
+    for name in names:
+        jobid, _, element = name.partition('_')
+        if not exists(join(_jobdir(jobid), 'job.json')):
+            continue
+        for other in _loadjob(jobid)['elements']:
+            if not element or element == other:
+                yield jobid, other
+
+
+def _parse_options(args, valued, short, multiple=[]):
+    """ Splits arguments into dictionary of options and remaining command
+    """
+    options = {}
+    ii = 0
+    while ii < len(args):
+        arg = args[ii]
+        if arg == '--':
+            ii += 1
+            break
+        if not arg.startswith('-'):
+            break
+        if arg in multiple:
+            ii += 2
+            continue
+        if arg.startswith('--'):
+            name, sep, value = arg[2:].partition('=')
+            if not sep and name in valued:
+                ii += 1
+                value = args[ii]
+            options[name] = value
+        elif arg in short:
+            ii += 1
+            options[short[arg]] = args[ii]
+        elif arg[:2] in short and len(arg) > 2:
+            options[short[arg[:2]]] = arg[2:]
+        else:
+            options[arg] = ''
+        ii += 1
+    return options, args[ii:]
+
+
+def _parse_array(spec):
+    """ Parses sbatch --array specification, e.g. '0-3,7%2'
+    """
+    spec = spec.split('%')[0]
+    indices = []
+    for item in spec.split(','):
+        if '-' in item:
+            imin, imax = item.split('-')
+            step = 1
+            if ':' in imax:
+                imax, step = imax.split(':')
+            indices += range(int(imin), int(imax)+1, int(step))
+        else:
+            indices += [int(item)]
+    return indices
+
+
+def _parse_dependency(spec):
+    """ Returns job ids from dependency specification, e.g.
+      'afterok:101:102'. Only 'afterok' is supported.
+    """
+    jobs = []
+    for item in spec.split(','):
+        if not item:
+            continue
+        kind, _, ids = item.partition(':')
+        if kind != 'afterok':
+            sys.exit('sbatch: unsupported dependency %s' % kind)
+        jobs += [jobid.split('.')[0].split('[')[0].split('_')[0]
+                 for jobid in ids.split(':')]
+    return jobs
+
+
+def _ntasks(options):
+    if 'ntasks' in options:
+        return int(options['ntasks'])
+    return int(options.get('nodes', 1))*int(options.get('ntasks-per-node', 1))
+
+
+def _nextid():
+    _mkdir(_statedir())
+    with open(join(_statedir(), 'nextid'), 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        jobid = int(f.read() or 1000)
+        f.seek(0)
+        f.truncate()
+        f.write(str(jobid + 1))
+    return str(jobid)
+
+
+def _key(jobid, element):
+    if element:
+        return jobid + '_' + element
+    return jobid
+
+
+def _statedir():
+    return os.getenv('FAKESCHED_DIR', '/tmp/fakesched')
+
+
+def _jobdir(jobid):
+    return join(_statedir(), 'jobs', jobid)
+
+
+def _alljobs():
+    path = join(_statedir(), 'jobs')
+    if not exists(path):
+        return []
+    return os.listdir(path)
+
+
+def _loadjob(jobid):
+    with open(join(_jobdir(jobid), 'job.json')) as f:
+        return json.load(f)
+
+
+def _getstate(jobid, element):
+    return _getfile(jobid, element, 'state')
+
+
+def _setstate(jobid, element, state):
+    _setfile(jobid, element, 'state', state)
+
+
+def _getfile(jobid, element, name):
+    filename = join(_jobdir(jobid), '%s.%s' % (element or 'job', name))
+    if not exists(filename):
+        return None
+    with open(filename) as f:
+        return f.read().strip()
+
+
+def _setfile(jobid, element, name, value):
+    # written atomically, since several processes may read job state
+    filename = join(_jobdir(jobid), '%s.%s' % (element or 'job', name))
+    with open(filename + '.tmp', 'w') as f:
+        f.write(value)
+    os.rename(filename + '.tmp', filename)
+
+
+def _mkdir(path):
+    if not exists(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            pass
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,71 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from seisflows.seistools import container, readers
+from seisflows.seistools.segy import writesu
+from seisflows.seistools.shared import SeisStruct
+
+
+class TestContainer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'source')
+        self.chunksize = container.CHUNKSIZE
+        container.CHUNKSIZE = 4
+
+        self.nt, self.nr = 30, 10
+        self.d = np.random.randn(self.nt, self.nr).astype('float32')
+        self.h = SeisStruct(self.nr, self.nt, 0.001, 0.,
+                            sx=np.ones(self.nr), sy=np.zeros(self.nr),
+                            sz=np.zeros(self.nr), rx=10.*np.arange(self.nr),
+                            ry=np.zeros(self.nr), rz=np.zeros(self.nr),
+                            nrec=self.nr, nsrc=1)
+
+    def tearDown(self):
+        container.CHUNKSIZE = self.chunksize
+        shutil.rmtree(self.tmpdir)
+
+    def test_roundtrip(self):
+        for compress in [False, True]:
+            container.write(self.path, 'x', self.d, self.h, compress=compress)
+            container.write(self.path, 'z', 2*self.d, self.h)
+            self.assertEqual(container.channels(self.path), ['x', 'z'])
+
+            d, h = container.read(self.path, 'x')
+            np.testing.assert_array_equal(d, self.d)
+            np.testing.assert_array_equal(h.rx, self.h.rx)
+            self.assertEqual(h.nr, self.nr)
+            self.assertEqual(h.dt, 0.001)
+
+            d, h = container.read(self.path, 'z')
+            np.testing.assert_array_equal(d, 2*self.d)
+
+    def test_subset(self):
+        container.write(self.path, 'x', self.d, self.h, compress=True)
+
+        d, h = container.read(self.path, 'x', traces=[9, 2, 3])
+        np.testing.assert_array_equal(d, self.d[:, [9, 2, 3]])
+        np.testing.assert_array_equal(h.rx, [90., 20., 30.])
+        self.assertEqual(h.nr, 3)
+
+        d, h = readers.container(channel='x', prefix=self.path,
+                                 traces=slice(5, 7))
+        np.testing.assert_array_equal(d, self.d[:, 5:7])
+
+    def test_pack(self):
+        src = os.path.join(self.tmpdir, 'traces')
+        os.mkdir(src)
+        writesu(os.path.join(src, '0_dx_SU'), self.d, self.h)
+
+        container.pack(src, self.path, readers.su_specfem3d, ['x'])
+        d, h = container.read(self.path, 'x')
+        np.testing.assert_array_equal(d, self.d)
+        self.assertEqual(h.nn, [self.nr])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+
+from seisflows.seistools import adjoint, misfit
+
+
+def ricker(t, t0, f0=5.):
+    a = (np.pi*f0*(t - t0))**2
+    return (1. - 2.*a)*np.exp(-a)
+
+
+class TestMisfit(unittest.TestCase):
+    def setUp(self):
+        self.nt = 500
+        self.dt = 0.004
+        t = np.arange(self.nt)*self.dt
+
+        # observations delayed by whole numbers of samples
+        self.shifts = np.array([-20, -5, 0, 3, 12, 40])
+        t0 = 1. + self.shifts*self.dt
+        self.wsyn = ricker(t[:, np.newaxis], 1.) * np.ones(len(self.shifts))
+        self.wobs = 0.8*ricker(t[:, np.newaxis], t0)
+
+    def test_wtime(self):
+        e = misfit.wtime(self.wsyn, self.wobs, self.nt, self.dt)
+        np.testing.assert_allclose(e, self.shifts*self.dt, atol=1e-12)
+
+    def test_wtime_subsample(self):
+        t = np.arange(self.nt)*self.dt
+        shifts = np.array([-2.3, 0.4, 7.5])*self.dt
+        wsyn = ricker(t[:, np.newaxis], 1.) * np.ones(len(shifts))
+        wobs = ricker(t[:, np.newaxis], 1. + shifts)
+
+        e = misfit.wtime(wsyn, wobs, self.nt, self.dt)
+        np.testing.assert_allclose(e, np.round(shifts/self.dt)*self.dt)
+
+        e = misfit.wtime(wsyn, wobs, self.nt, self.dt, subsample=True)
+        np.testing.assert_allclose(e, shifts, atol=0.05*self.dt)
+
+    def test_maxlag(self):
+        maxlag = 10*self.dt
+        e = misfit.wtime(self.wsyn, self.wobs, self.nt, self.dt, maxlag)
+        self.assertTrue(np.all(abs(e) <= maxlag + 1e-12))
+        inside = abs(self.shifts) <= 10
+        np.testing.assert_allclose(e[inside], self.shifts[inside]*self.dt,
+                                   atol=1e-12)
+
+    def test_wampl(self):
+        # amplitude misfit of aligned traces
+        e = misfit.wampl(self.wsyn, self.wobs, self.nt, self.dt)
+        for i, lag in enumerate(self.shifts):
+            if lag >= 0:
+                r = self.wsyn[:self.nt-lag, i] - self.wobs[lag:, i]
+            else:
+                r = self.wsyn[-lag:, i] - self.wobs[:self.nt+lag, i]
+            np.testing.assert_allclose(e[i], np.sqrt(np.sum(r*r)*self.dt))
+
+    def test_silent(self):
+        wsyn = np.zeros(self.nt)
+        e = misfit.wtime(wsyn, self.wobs[:, 0], self.nt, self.dt)
+        self.assertEqual(e, 0.)
+
+    def test_batched(self):
+        # block of traces gives same result as one trace at a time
+        for name in ['wdiff', 'wtime', 'wampl', 'ediff', 'cdiff']:
+            e = getattr(misfit, name)(self.wsyn, self.wobs, self.nt, self.dt)
+            w = getattr(adjoint, name)(self.wsyn, self.wobs, self.nt, self.dt)
+            self.assertEqual(e.shape, (len(self.shifts),))
+            self.assertEqual(w.shape, self.wsyn.shape)
+
+            for i in range(len(self.shifts)):
+                args = self.wsyn[:, i], self.wobs[:, i], self.nt, self.dt
+                np.testing.assert_allclose(
+                    getattr(misfit, name)(*args), e[i], rtol=1e-12)
+                np.testing.assert_allclose(
+                    getattr(adjoint, name)(*args), w[:, i], rtol=1e-12,
+                    atol=1e-12)
+
+    def test_wdiff(self):
+        e = misfit.wdiff(self.wsyn, self.wobs, self.nt, self.dt)
+        r = self.wsyn - self.wobs
+        np.testing.assert_allclose(e, np.sqrt(np.sum(r*r, axis=0)*self.dt))
+
+
+if __name__ == '__main__':
+    unittest.main()
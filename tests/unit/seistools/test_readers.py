@@ -0,0 +1,120 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from seisflows.seistools import readers
+from seisflows.seistools.segy import writesu
+from seisflows.seistools.shared import SeisStruct
+
+
+class TestSuSpecfem3d(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.nt = 20
+        self.data = []
+        self.rx = []
+
+        # one file per processor rank, with varying numbers of traces
+        for iproc, nr in enumerate([3, 1, 4, 2, 5, 1, 2, 3, 4, 1, 2]):
+            d = np.random.randn(self.nt, nr).astype('float32')
+            rx = 10.*np.arange(len(self.rx), len(self.rx)+nr)
+            h = SeisStruct(nr, self.nt, 0.001, 0., sx=[1.]*nr, sy=[], sz=[],
+                           rx=rx, ry=[], rz=[])
+            writesu(os.path.join(self.tmpdir, '%d_dx_SU' % iproc), d, h)
+            self.data += [d]
+            self.rx += list(rx)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_combine(self):
+        for nthreads in [1, 4]:
+            d, h = readers.su_specfem3d(channel='x', prefix=self.tmpdir,
+                                        nthreads=nthreads)
+            np.testing.assert_array_equal(d, np.column_stack(self.data))
+            np.testing.assert_array_equal(h.rx, self.rx)
+            self.assertEqual(h.nr, len(self.rx))
+            self.assertEqual(h.nn, [d_.shape[1] for d_ in self.data])
+
+
+class TestAscii(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.t = -1. + 0.01*np.arange(100)
+        self.data = np.random.randn(100, 5)
+        for i in range(5):
+            np.savetxt(os.path.join(self.tmpdir, 'AA.S%04d.BXZ.semd' % i),
+                       np.column_stack((self.t, self.data[:, i])), '%14.7e')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check(self, s, h):
+        np.testing.assert_allclose(s, self.data, rtol=1.e-6)
+        self.assertEqual(h.nr, 5)
+        self.assertEqual(h.nt, 100)
+        self.assertAlmostEqual(h.t0, -1.)
+        self.assertAlmostEqual(h.dt, 0.01)
+        self.assertEqual(h.files[0], 'AA.S0000.BXZ.semd')
+
+    def test_cache(self):
+        s, h = readers.ascii_specfem3d(channel='z', prefix=self.tmpdir,
+                                       cache=True)
+        self.check(s, h)
+
+        # second call maps cached block
+        s_, h_ = readers.ascii_specfem3d(channel='z', prefix=self.tmpdir,
+                                         cache=True)
+        self.assertTrue(isinstance(s_, np.memmap))
+        np.testing.assert_array_equal(s_, s)
+        self.assertEqual(h_, h)
+
+        # modified files invalidate cache
+        self.data[:, 2] = 0.
+        np.savetxt(os.path.join(self.tmpdir, 'AA.S0002.BXZ.semd'),
+                   np.column_stack((self.t, self.data[:, 2])), '%.6e')
+        s, h = readers.ascii_specfem3d(channel='z', prefix=self.tmpdir,
+                                       cache=True)
+        self.assertFalse(isinstance(s, np.memmap))
+        self.check(s, h)
+
+    def test_replaced(self):
+        readers.ascii_specfem3d(channel='z', prefix=self.tmpdir, cache=True)
+
+        # file of the same size moved into place, within the same second
+        filename = os.path.join(self.tmpdir, 'AA.S0003.BXZ.semd')
+        stat = os.stat(filename)
+        self.data[:, 3] *= -1.
+        np.savetxt(filename+'.tmp',
+                   np.column_stack((self.t, self.data[:, 3])), '%14.7e')
+        os.utime(filename+'.tmp', (stat.st_atime, stat.st_mtime))
+        os.rename(filename+'.tmp', filename)
+
+        s, h = readers.ascii_specfem3d(channel='z', prefix=self.tmpdir,
+                                       cache=True)
+        self.assertFalse(isinstance(s, np.memmap))
+        self.check(s, h)
+
+    def test_bad_token(self):
+        filename = os.path.join(self.tmpdir, 'AA.S0001.BXZ.semd')
+        with open(filename, 'w') as f:
+            f.write('0.0 1.0\n0.1 2.0\nabc 3.0\n0.3 4.0\n')
+        with self.assertRaises(ValueError):
+            readers.ascii_specfem3d(channel='z', prefix=self.tmpdir,
+                                    cache=True)
+        self.assertEqual([name for name in os.listdir(self.tmpdir)
+                          if name.startswith('.')], [])
+
+    def test_nocache(self):
+        # caching is off unless requested
+        self.check(*readers.ascii_specfem3d(channel='z', prefix=self.tmpdir,
+                                            nproc=2))
+        self.assertEqual([name for name in os.listdir(self.tmpdir)
+                          if name.startswith('.')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
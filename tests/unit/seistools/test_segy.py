@@ -0,0 +1,277 @@
+import unittest
+
+import os
+import struct
+from tempfile import NamedTemporaryFile
+import numpy as np
+
+from seisflows.seistools.segy import formats, reader, writer
+from seisflows.seistools.shared import SeisStruct
+
+
+def trace(endian, k, nt, data):
+    """ Packs one trace with a few nonzero header fields
+    """
+    header = bytearray(240)
+    for fmt, offset, value in [
+            ('i', 0, k+1),
+            ('i', 72, 100),
+            ('i', 80, 10*k),
+            ('i', 64, k%2),
+            ('h', 108, -20),
+            ('h', 114, nt),
+            ('h', 116, 1000)]:
+        struct.pack_into(endian+fmt, header, offset, value)
+    return bytes(header) + data.astype(endian+'f4').tostring()
+
+
+class TestReader(unittest.TestCase):
+    def setUp(self):
+        self.nt = 50
+        self.nr = 4
+        self.data = np.random.randn(self.nt, self.nr).astype('float32')
+        self.tmp_file = NamedTemporaryFile(mode='wb', delete=False)
+
+    def tearDown(self):
+        os.remove(self.tmp_file.name)
+
+    def check(self, d, h):
+        self.assertEqual(d.dtype, np.float64)
+        np.testing.assert_array_equal(d, self.data)
+        self.assertEqual(h.nr, self.nr)
+        self.assertEqual(h.nt, self.nt)
+        self.assertEqual(h.dt, 1000)
+        self.assertEqual(h.ts, -20)
+        np.testing.assert_array_equal(h.rx, 10.*np.arange(self.nr))
+        np.testing.assert_array_equal(h.sx, 100.*np.ones(self.nr))
+        np.testing.assert_array_equal(h.rz, np.arange(self.nr)%2)
+
+    def test_readsu(self):
+        for k in range(self.nr):
+            self.tmp_file.write(trace('<', k, self.nt, self.data[:, k]))
+        self.tmp_file.close()
+
+        self.check(*reader.readsu(self.tmp_file.name))
+
+    def test_readsegy(self):
+        header = bytearray(3600)
+        struct.pack_into('>h', header, 3502, 1)
+        self.tmp_file.write(bytes(header))
+        for k in range(self.nr):
+            self.tmp_file.write(trace('>', k, self.nt, self.data[:, k]))
+        self.tmp_file.close()
+
+        self.check(*reader.readsegy(self.tmp_file.name))
+
+    def test_tracedtype(self):
+        dtype = reader.tracedtype(self.nt, '<')
+        self.assertEqual(dtype.itemsize, 240 + 4*self.nt)
+        self.assertEqual(dtype.fields['NumberSamples'][1], 114)
+        self.assertEqual(dtype.fields['data'][1], 240)
+
+
+class TestVariableLength(unittest.TestCase):
+    def setUp(self):
+        self.lengths = [30, 50, 10, 40]
+        self.data = [np.random.randn(nt).astype('float32')
+                     for nt in self.lengths]
+        self.tmp_file = NamedTemporaryFile(mode='wb', delete=False)
+        for k, nt in enumerate(self.lengths):
+            self.tmp_file.write(trace('<', k, nt, self.data[k]))
+        self.tmp_file.close()
+        reader.FIXEDLENGTH = False
+
+    def tearDown(self):
+        reader.FIXEDLENGTH = True
+        os.remove(self.tmp_file.name)
+
+    def test_scan_offsets(self):
+        expected = np.cumsum([0] + [240 + 4*nt for nt in self.lengths[:-1]])
+
+        # small chunks exercise refills and skipping over samples
+        for chunksize in [1, 300, 2**20]:
+            offsets, lengths = reader.scan_offsets(
+                self.tmp_file.name, 0, '<', chunksize=chunksize)
+            np.testing.assert_array_equal(offsets, expected)
+            np.testing.assert_array_equal(lengths, self.lengths)
+
+    def test_truncated(self):
+        with open(self.tmp_file.name, 'ab') as f:
+            f.write(bytes(bytearray(100)))
+        with self.assertRaises(ValueError):
+            reader.scan_offsets(self.tmp_file.name, 0, '<')
+
+    def test_readsu(self):
+        obj = reader.SuReader(self.tmp_file.name, endian='<')
+        obj.ReadSeismicData()
+
+        self.assertEqual(obj.data.shape, (max(self.lengths), 4))
+        for k, nt in enumerate(self.lengths):
+            np.testing.assert_array_equal(obj.data[:nt, k], self.data[k])
+            self.assertTrue((obj.data[nt:, k] == 0).all())
+            self.assertEqual(obj.mask[:, k].sum(), nt)
+        np.testing.assert_array_equal(obj.getarray('GroupX'),
+                                      10*np.arange(4))
+
+    def test_roundtrip(self):
+        d, h = reader.readsu(self.tmp_file.name)
+        self.assertEqual(h.nt, d.shape[0])
+        np.testing.assert_array_equal(h.tracelen, self.lengths)
+
+        # padded traces are written at full length; the writer takes
+        # times in seconds
+        h.dt, h.ts = 1.e-3, 0.
+        out = NamedTemporaryFile(mode='wb', delete=False)
+        out.close()
+        try:
+            writer.writesu(out.name, d, h)
+            reader.FIXEDLENGTH = True
+            d_, h_ = reader.readsu(out.name)
+        finally:
+            os.remove(out.name)
+        np.testing.assert_array_equal(d_, d)
+        self.assertEqual(h_.nt, d_.shape[0])
+        self.assertFalse('tracelen' in h_)
+
+
+class TestTraceIndex(unittest.TestCase):
+    def setUp(self):
+        self.nt = 50
+        self.nr = 6
+        self.data = np.random.randn(self.nt, self.nr).astype('float32')
+        self.tmp_file = NamedTemporaryFile(mode='wb', delete=False)
+        for k in range(self.nr):
+            self.tmp_file.write(trace('<', k, self.nt, self.data[:, k]))
+        self.tmp_file.close()
+
+    def tearDown(self):
+        for filename in [self.tmp_file.name, self.tmp_file.name+'.index.npz']:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_read_all(self):
+        index = reader.TraceIndex(self.tmp_file.name)
+        d, h = index.read_traces()
+        d_, h_ = reader.readsu(self.tmp_file.name)
+        np.testing.assert_array_equal(d, d_)
+        for key in ['nr', 'nt', 'dt', 'ts', 'sx', 'rx', 'rz']:
+            np.testing.assert_array_equal(h[key], h_[key])
+
+    def test_selectors(self):
+        index = reader.TraceIndex(self.tmp_file.name)
+
+        d, h = index.read_traces(slice(1, 3))
+        np.testing.assert_array_equal(d, self.data[:, 1:3])
+        self.assertEqual(h.nr, 2)
+
+        d, h = index.read_traces([4, 0])
+        np.testing.assert_array_equal(d, self.data[:, [4, 0]])
+
+        # receivers at x = 0, 10, ..., source at x = 100
+        d, h = index.read_traces(index.select(receivers=[(20., 0.), (50., 0.)]))
+        np.testing.assert_array_equal(h.rx, [20., 50.])
+
+        d, h = index.read_traces(index.select(offsets=(55., 85.)))
+        np.testing.assert_array_equal(h.rx, [20., 30., 40.])
+
+    def test_cache(self):
+        index = reader.TraceIndex(self.tmp_file.name)
+        self.assertTrue(os.path.exists(index.cachefile()))
+        self.assertTrue(index.load() is not None)
+
+        # index is rebuilt when file changes
+        with open(self.tmp_file.name, 'ab') as f:
+            f.write(trace('<', self.nr, self.nt, self.data[:, 0]))
+        index = reader.TraceIndex(self.tmp_file.name)
+        self.assertEqual(len(index.index), self.nr+1)
+        self.assertEqual(index.read_traces()[1].nr, self.nr+1)
+
+
+class TestFormats(unittest.TestCase):
+    def test_ibm(self):
+        # -118.625 = -0x76.A = -0x.76A * 16**2
+        self.assertEqual(formats.ieee2ibm(-118.625), 0xC276A000)
+        self.assertEqual(formats.ibm2ieee([0xC276A000]), [-118.625])
+
+        self.assertEqual(formats.ieee2ibm(0.), 0)
+        self.assertEqual(formats.ieee2ibm(1.e300), 0x7FFFFFFF)
+        self.assertEqual(formats.ieee2ibm(-1.e-300), 0)
+
+    def test_ibm_roundtrip(self):
+        # normalized IBM floats survive conversion to IEEE and back
+        ibm = np.random.randint(0, 2**32, 10000).astype('u4')
+        ibm = ibm[(ibm & 0x00F00000 != 0) & (ibm & 0x7F000000 != 0)]
+        np.testing.assert_array_equal(
+            formats.ieee2ibm(formats.ibm2ieee(ibm)), ibm)
+
+        # IEEE singles lose at most the three low bits of the fraction
+        x = np.random.randn(10000).astype('float32').astype(float)
+        np.testing.assert_allclose(formats.ibm2ieee(formats.ieee2ibm(x)), x,
+                                   rtol=2.**-21)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            formats.sampletype(4, '>')
+
+
+class TestWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_file = NamedTemporaryFile(mode='wb', delete=False)
+        self.tmp_file.close()
+
+    def tearDown(self):
+        os.remove(self.tmp_file.name)
+
+    def test_writesu(self):
+        nt, nr = 50, 4
+        data = np.random.randn(nt, nr)
+        h = SeisStruct(nr, nt, 0.001, 0.,
+                       sx=[100.]*nr, sy=[], sz=[],
+                       rx=10.*np.arange(nr), ry=[], rz=[])
+        writer.writesu(self.tmp_file.name, data, h)
+
+        # compare against traces packed field by field
+        expected = ''
+        for k in range(nr):
+            trace = bytearray(240)
+            for fmt, offset, value in [
+                    ('i', 0, 1),
+                    ('h', 68, 1),
+                    ('h', 70, 1),
+                    ('i', 72, 100),
+                    ('i', 80, 10*k),
+                    ('h', 114, nt),
+                    ('h', 116, 1000)]:
+                struct.pack_into('<'+fmt, trace, offset, value)
+            expected += bytes(trace) + data[:, k].astype('<f4').tostring()
+
+        with open(self.tmp_file.name, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
+        d, h = reader.readsu(self.tmp_file.name)
+        np.testing.assert_array_equal(d, data.astype('float32'))
+        np.testing.assert_array_equal(h.rx, 10.*np.arange(nr))
+
+    def test_writesegy(self):
+        nt, nr = 50, 4
+        data = np.round(100.*np.random.randn(nt, nr))
+        h = SeisStruct(nr, nt, 0.001, 0.,
+                       sx=[100.]*nr, sy=[], sz=[],
+                       rx=10.*np.arange(nr), ry=[], rz=[])
+
+        for code in [1, 2, 3, 5]:
+            writer.writesegy(self.tmp_file.name, data, h, code=code)
+            d, h_ = reader.readsegy(self.tmp_file.name)
+            np.testing.assert_array_equal(d, data)
+            np.testing.assert_array_equal(h_.rx, 10.*np.arange(nr))
+            self.assertEqual(h_.dt, 1000)
+
+    def test_overflow(self):
+        h = SeisStruct(1, 10, 0.001, 0.,
+                       sx=[2.**40], sy=[], sz=[], rx=[], ry=[], rz=[])
+        with self.assertRaises(ValueError):
+            writer.writesu(self.tmp_file.name, np.zeros((10, 1)), h)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import scipy.fftpack
+import scipy.signal
+
+from seisflows.seistools import signal
+from seisflows.seistools.shared import SeisStruct
+
+
+class TestFilters(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.nt = 2000
+        self.nr = 5
+        self.dt = 0.005
+        self.h = SeisStruct(self.nr, self.nt, self.dt, 0.)
+        self.s = np.random.randn(self.nt, self.nr)
+
+    def test_sbandpass(self):
+        # same as filtering one trace at a time in transfer function form
+        b, a = scipy.signal.butter(2, [2*1.*self.dt, 2*10.*self.dt], 'band')
+        ref = np.column_stack([scipy.signal.filtfilt(b, a, self.s[:, ir])
+                               for ir in range(self.nr)])
+
+        s = signal.sbandpass(self.s.copy(), self.h, 1., 10.)
+        np.testing.assert_allclose(s, ref, atol=1e-10)
+
+    def test_lowpass_highpass(self):
+        t = np.arange(self.nt)*self.dt
+        w = np.sin(2*np.pi*1.*t) + np.sin(2*np.pi*40.*t)
+        s = np.column_stack([w]*self.nr)
+
+        lo = signal.slowpass(s.copy(), self.h, 10.)
+        hi = signal.shighpass(s.copy(), self.h, 10.)
+        interior = slice(200, -200)
+        expected = np.column_stack([np.sin(2*np.pi*1.*t)]*self.nr)
+        np.testing.assert_allclose(lo[interior], expected[interior], atol=0.01)
+        np.testing.assert_allclose(hi[interior] + lo[interior], s[interior],
+                                   atol=0.05)
+
+    def test_design_cache(self):
+        sos = signal.butter('bandpass', (1., 10.), 1/self.dt)
+        self.assertTrue(signal.butter('bandpass', [1., 10.], 1/self.dt) is sos)
+
+    def test_fft(self):
+        s = signal.bandpass(self.s, 2., 10., 1/self.dt)
+        f = signal.bandpass(self.s, 2., 10., 1/self.dt, method='fft')
+        interior = slice(500, -500)
+        np.testing.assert_allclose(f[interior], s[interior], atol=1e-6)
+
+        with self.assertRaises(ValueError):
+            signal.bandpass(self.s, 2., 10., 1/self.dt, method='foo')
+
+    def test_fft_odd(self):
+        # lengths for which the padded FFT length is odd
+        for nt in [1001, 1012]:
+            self.assertTrue(scipy.fftpack.next_fast_len(2*nt) % 2)
+            s = signal.bandpass(self.s[:nt], 2., 10., 1/self.dt)
+            f = signal.bandpass(self.s[:nt], 2., 10., 1/self.dt, method='fft')
+            interior = slice(300, -300)
+            np.testing.assert_allclose(f[interior], s[interior], atol=1e-4)
+
+
+class TestMute(unittest.TestCase):
+    def setUp(self):
+        self.nt = 1500
+        self.dt = 0.01
+        self.rx = np.array([0., 1000., 2500., 4000., 9000., 60000.])
+        self.h = SeisStruct(len(self.rx), self.nt, self.dt, 0., sx=[0.],
+                            rx=self.rx)
+
+    def test_smute(self):
+        vel, toff = 2000., 3.
+        s = signal.smute(np.ones((self.nt, len(self.rx))), self.h, vel, toff)
+
+        win = np.sin(np.linspace(0, 1, 800))[:400]
+        for ir, rx in enumerate(self.rx):
+            itmin = int(np.ceil((rx/vel + toff)/self.dt)) - 200
+            if itmin > self.nt:
+                np.testing.assert_array_equal(s[:, ir], 0.)
+                continue
+            np.testing.assert_array_equal(s[:itmin, ir], 0.)
+            np.testing.assert_array_equal(s[itmin:itmin+400, ir],
+                                          win[:self.nt-itmin])
+            np.testing.assert_array_equal(s[itmin+400:, ir], 1.)
+
+    def test_cache(self):
+        mask = signal.mutemask(self.h, 2000., 3.)
+        self.assertTrue(signal.mutemask(self.h, 2000., 3.) is mask)
+        self.assertFalse(mask.flags.writeable)
+        self.assertFalse(signal.mutemask(self.h, 2500., 3.) is mask)
+
+    def test_saved(self):
+        # masks saved by one process are mapped by the next
+        tmpdir = tempfile.mkdtemp()
+        try:
+            mask = signal.mutemask(self.h, 1500., 2., path=tmpdir)
+            self.assertEqual(len(os.listdir(tmpdir)), 1)
+
+            signal._MUTES.clear()
+            saved = signal.mutemask(self.h, 1500., 2., path=tmpdir)
+            self.assertTrue(isinstance(saved, np.memmap))
+            self.assertFalse(saved.flags.writeable)
+            np.testing.assert_array_equal(saved, mask)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_cachesize(self):
+        cachesize = signal.CACHESIZE
+        signal.CACHESIZE = 3*8*self.nt
+        try:
+            for imin in range(5):
+                signal.tukeywin(self.nt, imin, 1000)
+            self.assertEqual(len(signal._WINDOWS), 3)
+            self.assertEqual([key[1] for key in signal._WINDOWS], [2, 3, 4])
+        finally:
+            signal.CACHESIZE = cachesize
+
+    def test_swindow(self):
+        s = np.random.randn(self.nt, len(self.rx))
+        self.h.t0 = 0.
+        w = signal.swindow(s.copy(), self.h, 100, 1000)
+        win = signal.tukeywin(self.nt, 100, 1000)
+        np.testing.assert_array_equal(w, s*win[:, np.newaxis])
+        np.testing.assert_array_equal(win[:100], 0.)
+        np.testing.assert_array_equal(win[200:900], 1.)
+        self.assertTrue(signal.tukeywin(self.nt, 100, 1000) is win)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from os.path import join
+
+from seisflows.tools.config import ParameterObj
+from seisflows.system.multicore import multicore
+
+PAR = ParameterObj('SeisflowsParameters')
+PATH = ParameterObj('SeisflowsPaths')
+
+
+class dummy(object):
+    """ Stand-in for a registered object, which logs the process and task
+      number of each task it runs
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def run(self, fail=None, exit=None):
+        itask = int(os.environ['SEISFLOWS_TASK_ID'])
+        with open(join(self.path, 'log'), 'a') as f:
+            f.write('%d %d\n' % (os.getpid(), itask))
+        if itask == fail:
+            raise Exception('task %d failed' % itask)
+        if itask == exit:
+            os._exit(9)
+
+
+class TestMulticore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        self.par = PAR.__dict__
+        self.path = PATH.__dict__
+        PAR.update({'NTASK': 4, 'NPROC': 1, 'NPROCMAX': 2,
+                    'WORKERS': False, 'VERBOSE': False})
+        PATH.update({'SYSTEM': join(self.tmpdir, 'system')})
+
+        # tasks look up objects by name, as registered objects
+        self.modules = dict([(key, sys.modules.get(key))
+                             for key in ['system', 'dummy']])
+        self.system = multicore()
+        sys.modules['system'] = self.system
+        sys.modules['dummy'] = dummy(self.tmpdir)
+
+    def tearDown(self):
+        for key, val in self.modules.items():
+            if val is None:
+                sys.modules.pop(key, None)
+            else:
+                sys.modules[key] = val
+        PAR.update(self.par)
+        PATH.update(self.path)
+        shutil.rmtree(self.tmpdir)
+
+    def log(self):
+        with open(join(self.tmpdir, 'log')) as f:
+            return [map(int, line.split()) for line in f]
+
+    def test_run(self):
+        self.system.run('dummy', 'run', hosts='all')
+        log = self.log()
+
+        # each task runs once, in a fresh process
+        self.assertEqual(sorted([itask for _, itask in log]), range(4))
+        self.assertEqual(len(set([pid for pid, _ in log])), 4)
+        self.assertFalse(os.getpid() in [pid for pid, _ in log])
+
+    def test_head(self):
+        self.system.run('dummy', 'run', hosts='head')
+        self.assertEqual([itask for _, itask in self.log()], [0])
+
+    def test_failure(self):
+        with self.assertRaises(Exception) as context:
+            self.system.run('dummy', 'run', hosts='all', fail=2)
+        self.assertTrue('1 of 4 tasks failed' in str(context.exception))
+
+        # other tasks run to completion
+        self.assertEqual(sorted([itask for _, itask in self.log()]),
+                         range(4))
+
+    def test_exit(self):
+        # processes that die without reporting back count as failed
+        tasks = self.system.submit_tasks('dummy', 'run', hosts='all', exit=1)
+        with self.assertRaises(Exception):
+            tasks.wait()
+        self.assertEqual(sorted(tasks.errors), [1])
+        self.assertTrue('code 9' in tasks.errors[1])
+        self.assertEqual(sorted([itask for _, itask in self.log()]),
+                         range(4))
+
+
+if __name__ == '__main__':
+    unittest.main()
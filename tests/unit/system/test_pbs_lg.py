@@ -0,0 +1,66 @@
+import unittest
+
+from seisflows.system.pbs_lg import _parse_qstat, _ranges, _walltime
+
+
+QSTAT_OUTPUT = '''Job Id: 1234[0].server
+    Job_Name = test
+    job_state = X
+    Exit_status = 0
+
+Job Id: 1234[1].server
+    Job_Name = test
+    job_state = X
+    Exit_status = 271
+
+Job Id: 1234[2].server
+    Job_Name = test
+    job_state = R
+
+Job Id: 1234[3].server
+    Job_Name = test
+    job_state = Q
+
+Job Id: 1234[4].server
+    Job_Name = test
+    job_state = X
+
+Job Id: 1235.server
+    Job_Name = test
+    job_state = F
+    Exit_status = 0
+'''
+
+
+class TestParseQstat(unittest.TestCase):
+    def test_states(self):
+        states = _parse_qstat(QSTAT_OUTPUT)
+        self.assertEqual(states, {
+            '1234[0]': 'COMPLETED',
+            '1234[1]': 'FAILED',
+            '1234[2]': 'RUNNING',
+            '1234[3]': 'PENDING',
+            '1234[4]': 'CANCELLED',
+            '1235': 'COMPLETED'})
+
+    def test_parent(self):
+        output = 'Job Id: 1234[].server\n    job_state = B\n'
+        self.assertEqual(_parse_qstat(output), {})
+
+    def test_empty(self):
+        self.assertEqual(_parse_qstat(''), {})
+
+
+class TestRanges(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual(_ranges([0]), [(0, 0)])
+        self.assertEqual(_ranges(range(4)), [(0, 3)])
+        self.assertEqual(_ranges([7, 0, 1, 5, 8]), [(0, 1), (5, 5), (7, 8)])
+
+    def test_walltime(self):
+        self.assertEqual(_walltime(30.), '00:30:00')
+        self.assertEqual(_walltime(90.5), '01:31:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+from os.path import join
+
+from seisflows.tools.config import ParameterObj
+from seisflows.system.slurm_lg import slurm_lg, _arraylist, _backoff, \
+    _parse_sacct
+
+PAR = ParameterObj('SeisflowsParameters')
+PATH = ParameterObj('SeisflowsPaths')
+
+
+# stand-ins for SLURM commands, which keep track of jobs in a json file
+FAKE_SBATCH = '''
+import json, os, sys
+db = os.environ['FAKE_SLURM_DB']
+jobs = json.load(open(db)) if os.path.exists(db) else []
+jobs.append({'id': str(1000 + len(jobs)), 'args': ' '.join(sys.argv[1:]),
+             'state': 'PENDING'})
+json.dump(jobs, open(db, 'w'))
+print 'Submitted batch job', jobs[-1]['id']
+'''
+
+FAKE_SACCT = '''
+import json, os, sys
+jobids = sys.argv[sys.argv.index('-j') + 1].split(',')
+for job in json.load(open(os.environ['FAKE_SLURM_DB'])):
+    if job['id'] in jobids:
+        print '%s_0|%s' % (job['id'], job['state'])
+'''
+
+FAKE_SCANCEL = '''
+import json, os, sys
+db = os.environ['FAKE_SLURM_DB']
+jobs = json.load(open(db))
+for job in jobs:
+    if job['id'] == sys.argv[1] and job['state'] == 'PENDING':
+        job['state'] = 'CANCELLED'
+json.dump(jobs, open(db, 'w'))
+'''
+
+
+class TestParseSacct(unittest.TestCase):
+    def test_array_elements(self):
+        output = ('1000_0|COMPLETED\n'
+                  '1000_1|RUNNING\n'
+                  '1000_2|CANCELLED by 500\n')
+        states = _parse_sacct(output)
+        self.assertEqual(states['1000_0'], 'COMPLETED')
+        self.assertEqual(states['1000_1'], 'RUNNING')
+        self.assertEqual(states['1000_2'], 'CANCELLED')
+
+    def test_pending_ranges(self):
+        output = ('1000_0|COMPLETED\n'
+                  '1000_[1-3,7%2]|PENDING\n')
+        states = _parse_sacct(output)
+        self.assertEqual(sorted(states.keys()),
+            ['1000_0', '1000_1', '1000_2', '1000_3', '1000_7'])
+        self.assertEqual(states['1000_7'], 'PENDING')
+
+    def test_empty(self):
+        self.assertEqual(_parse_sacct(''), {})
+
+
+class TestTaskStatus(unittest.TestCase):
+    def setUp(self):
+        self.par = PAR.__dict__
+        PAR.update({'NODES_PER_JOB': 0})
+        self.system = slurm_lg()
+
+    def tearDown(self):
+        PAR.update(self.par)
+
+    def test_states(self):
+        output = ('1000_0|COMPLETED\n'
+                  '1000_1|OUT_OF_MEMORY\n'
+                  '1000_2|REQUEUED\n'
+                  '1000_3|PREEMPTED\n'
+                  '1000_4|COMPLETING\n')
+        self.system.getstates = lambda jobs: _parse_sacct(output)
+        self.assertEqual(_parse_sacct(output)['1000_1'], 'OUT_OF_MEMORY')
+
+        jobs = dict([(itask, '1000_%d' % itask) for itask in range(6)])
+        finished = set()
+        results = dict(self.system.task_status(jobs, finished))
+
+        # tasks in any state other than the active ones have ended, and
+        # failed unless completed
+        self.assertEqual(sorted(results), [0, 1, 3])
+        self.assertEqual(results[0], None)
+        self.assertTrue('OUT_OF_MEMORY' in results[1])
+        self.assertTrue('PREEMPTED' in results[3])
+        self.assertEqual(finished, set([0, 1, 3]))
+
+        # finished tasks are reported once
+        self.assertEqual(self.system.task_status(jobs, finished), [])
+
+
+class TestBackoff(unittest.TestCase):
+    def test_backoff(self):
+        gen = _backoff(5., 60.)
+        self.assertEqual([next(gen) for _ in range(6)],
+            [5., 10., 20., 40., 60., 60.])
+
+
+class TestArrayList(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual(_arraylist([0]), '0')
+        self.assertEqual(_arraylist(range(5)), '0-4')
+        self.assertEqual(_arraylist([8, 0, 1, 2, 5, 7]), '0-2,5,7-8')
+
+
+class TestGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name, script in [('sbatch', FAKE_SBATCH), ('sacct', FAKE_SACCT),
+                             ('scancel', FAKE_SCANCEL)]:
+            filename = join(self.tmpdir, name)
+            with open(filename, 'w') as f:
+                f.write('#!' + sys.executable + '\n' + script)
+            os.chmod(filename, stat.S_IRWXU)
+
+        self.environ = os.environ.copy()
+        os.environ['PATH'] = self.tmpdir + os.pathsep + os.environ['PATH']
+        os.environ['FAKE_SLURM_DB'] = join(self.tmpdir, 'jobs.json')
+
+        self.par = PAR.__dict__
+        self.path = PATH.__dict__
+        PAR.update({'TITLE': 'test', 'NTASK': 4, 'NPROC': 1,
+                    'NPROC_PER_NODE': 16, 'STEPTIME': 30., 'NODES_PER_JOB': 0})
+        PATH.update({'SYSTEM': join(self.tmpdir, 'system'),
+                     'OUTPUT': join(self.tmpdir, 'output'),
+                     'SUBMIT': self.tmpdir})
+
+        self.system = slurm_lg()
+        self.system.save_objects = lambda: None
+        self.stages = [
+            ('a', 'solver', 'eval_func', 'all', {'path': 'a'}, []),
+            ('b', 'solver', 'eval_grad', 'all', {'path': 'b'}, ['a']),
+            ('c', 'workflow', 'process_gradient', 'head', {}, ['b']),
+            ('d', 'workflow', 'update_model', 'head', {}, ['c'])]
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        PAR.update(self.par)
+        PATH.update(self.path)
+        shutil.rmtree(self.tmpdir)
+
+    def jobs(self):
+        return json.load(open(os.environ['FAKE_SLURM_DB']))
+
+    def set_states(self, states):
+        jobs = self.jobs()
+        for job, state in zip(jobs, states):
+            job['state'] = state
+        json.dump(jobs, open(os.environ['FAKE_SLURM_DB'], 'w'))
+
+    def test_dependencies(self):
+        self.system.submit_graph(self.stages)
+        jobs = self.jobs()
+        self.assertEqual(len(jobs), 4)
+        self.assertNotIn('--dependency', jobs[0]['args'])
+        for ii in range(1, 4):
+            self.assertIn('--dependency=afterok:%s ' % jobs[ii-1]['id'],
+                          jobs[ii]['args'])
+
+    def test_resume(self):
+        self.system.submit_graph(self.stages)
+        self.set_states(['COMPLETED', 'FAILED', 'PENDING', 'PENDING'])
+        self.assertFalse(self.system.graph_done())
+
+        self.system.resume_graph()
+        jobs = self.jobs()
+        self.assertEqual(len(jobs), 7)
+        # dependents of failed stage are cancelled and resubmitted
+        self.assertEqual([job['state'] for job in jobs[:4]],
+            ['COMPLETED', 'FAILED', 'CANCELLED', 'CANCELLED'])
+        self.assertNotIn('--dependency', jobs[4]['args'])
+        self.assertIn('eval_grad', jobs[4]['args'])
+        self.assertIn('--dependency=afterok:%s ' % jobs[4]['id'],
+                      jobs[5]['args'])
+        self.assertIn('--dependency=afterok:%s ' % jobs[5]['id'],
+                      jobs[6]['args'])
+
+        # queued stages are left alone
+        self.system.resume_graph()
+        self.assertEqual(len(self.jobs()), 7)
+
+        self.set_states(['COMPLETED']*7)
+        self.assertTrue(self.system.graph_done())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import Queue
+
+from seisflows.system.lib.tasks import completed, queued
+
+
+class TestTaskHandle(unittest.TestCase):
+    def test_completed(self):
+        tasks = completed(range(3))
+        self.assertTrue(tasks.done())
+        self.assertEqual(list(tasks.as_completed()), [0, 1, 2])
+        tasks.wait()
+
+    def test_callbacks(self):
+        queue = Queue.Queue()
+        tasks = queued(range(3), queue)
+        calls = []
+        tasks.add_callback(lambda itask, error: calls.append(itask))
+
+        queue.put((2, None))
+        self.assertFalse(tasks.done())
+        self.assertEqual(calls, [2])
+
+        queue.put((0, None))
+        queue.put((1, None))
+        self.assertEqual(list(tasks.as_completed()), [2, 0, 1])
+        self.assertEqual(calls, [2, 0, 1])
+        self.assertTrue(tasks.done())
+
+        # late callbacks see tasks that already finished
+        late = []
+        tasks.add_callback(lambda itask, error: late.append(itask))
+        self.assertEqual(late, [2, 0, 1])
+
+    def test_errors(self):
+        queue = Queue.Queue()
+        finalized = []
+        tasks = queued(range(2), queue, finalize=lambda: finalized.append(1))
+        queue.put((0, 'Traceback'))
+        queue.put((1, None))
+        self.assertRaises(Exception, tasks.wait)
+        self.assertEqual(tasks.errors, {0: 'Traceback'})
+        self.assertEqual(finalized, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import imp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from os.path import dirname, join
+
+from seisflows.tools.config import ConfigObj
+from seisflows.system.lib import workers
+
+OBJ = ConfigObj('SeisflowsObjects')
+
+
+# stand-in for a registered object, which logs when it is unpickled by a
+# worker and when it runs a task
+DUMMY = '''
+import os
+
+class dummy(object):
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.log('unpickled')
+
+    def check(self):
+        pass
+
+    def run(self, fail=None):
+        itask = int(os.environ['SEISFLOWS_TASK_ID'])
+        if itask == fail:
+            raise Exception('task %d failed' % itask)
+        self.log('ran %d' % itask)
+
+    def log(self, event):
+        with open(os.path.join(self.path, 'log'), 'a') as f:
+            f.write('%d %d %s\\n' % (os.getpid(), self.version, event))
+'''
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        with open(join(self.tmpdir, 'dummy_object.py'), 'w') as f:
+            f.write(DUMMY)
+        for name in ['SeisflowsParameters.json', 'SeisflowsPaths.json']:
+            with open(join(self.tmpdir, name), 'w') as f:
+                f.write('{}')
+
+        # only the dummy object is registered while testing
+        self.keys = set(OBJ.keys)
+        self.modules = dict((key, sys.modules[key]) for key in self.keys)
+        OBJ.keys.clear()
+
+        self.dummy = imp.load_source(
+            'dummy_object', join(self.tmpdir, 'dummy_object.py')).dummy
+        OBJ.register('dummy', self.dummy(self.tmpdir, 1))
+
+        self.pool = workers.WorkerPool(2, self.launch)
+
+    def tearDown(self):
+        self.pool.close()
+        sys.modules.pop('dummy_object')
+        OBJ.unregister('dummy')
+        OBJ.keys.update(self.keys)
+        sys.modules.update(self.modules)
+        shutil.rmtree(self.tmpdir)
+
+    def launch(self, address, env):
+        env = dict(os.environ, **env)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [self.tmpdir] + sys.path[1:])
+        args = [sys.executable,
+                join(dirname(workers.__file__), 'wrapper_worker'),
+                self.tmpdir,
+                address]
+        return [subprocess.Popen(args, env=env) for _ in range(2)]
+
+    def events(self):
+        with open(join(self.tmpdir, 'log')) as f:
+            lines = [line.split(' ', 2) for line in f.read().splitlines()]
+        os.remove(join(self.tmpdir, 'log'))
+        return [(int(pid), int(version), event.strip())
+                for pid, version, event in lines]
+
+    def test_resend(self):
+        errors = self.pool.run('dummy', 'run', range(4), {})
+        self.assertEqual(errors, {})
+        events = self.events()
+        ran = [event for _, _, event in events if event.startswith('ran')]
+        self.assertEqual(sorted(ran), ['ran 0', 'ran 1', 'ran 2', 'ran 3'])
+
+        # objects reach each worker once, before its first task
+        unpickled = [pid for pid, _, event in events if event == 'unpickled']
+        self.assertEqual(sorted(unpickled), sorted(set(unpickled)))
+        self.assertEqual(set(unpickled),
+                         set([pid for pid, _, event in events
+                              if event.startswith('ran')]))
+
+        # unchanged objects are not resent
+        self.assertEqual(self.pool.run('dummy', 'run', range(4), {}), {})
+        events = self.events()
+        self.assertEqual([event for _, _, event in events
+                          if event == 'unpickled'], [])
+
+        # changed objects are
+        OBJ.register('dummy', self.dummy(self.tmpdir, 2))
+        self.assertEqual(self.pool.run('dummy', 'run', range(4), {}), {})
+        events = self.events()
+        self.assertTrue(all([version == 2 for _, version, _ in events]))
+        self.assertTrue([event for _, _, event in events
+                         if event == 'unpickled'])
+
+    def test_failure(self):
+        handle = self.pool.submit('dummy', 'run', range(4), {'fail': 2})
+        self.assertRaises(Exception, handle.wait)
+        self.assertEqual(sorted(handle.errors), [2])
+        self.assertTrue('task 2 failed' in handle.errors[2])
+
+        # workers keep serving after a failed task
+        self.assertEqual(self.pool.run('dummy', 'run', range(4), {}), {})
+        self.assertEqual(len(self.pool.connections), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,7 +15,10 @@ class TestConfigObj(unittest.TestCase):
         self.sys_modules_bck = sys.modules.copy()
 
     def tearDown(self):
-        sys.modules = self.sys_modules_bck.copy()
+        # restore in place, since imports use the original dictionary
+        for key in set(sys.modules) - set(self.sys_modules_bck):
+            del sys.modules[key]
+        sys.modules.update(self.sys_modules_bck)
 
     def test_init(self):
         name = str(uuid.uuid4())
@@ -71,7 +74,10 @@ class TestParameterObj(unittest.TestCase):
         self.sys_modules_bck = sys.modules.copy()
 
     def tearDown(self):
-        sys.modules = self.sys_modules_bck.copy()
+        # restore in place, since imports use the original dictionary
+        for key in set(sys.modules) - set(self.sys_modules_bck):
+            del sys.modules[key]
+        sys.modules.update(self.sys_modules_bck)
 
     def test_init_non_exisiting(self):
         name = 'm' + str(uuid.uuid4().get_hex()[0:6])
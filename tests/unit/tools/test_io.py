@@ -123,6 +123,41 @@ class TestSaveLoadBin(unittest.TestCase):
         # Should raise un exception if not true:
         np.testing.assert_array_almost_equal(values, ret, decimal=7)
 
+    def test_record_markers(self):
+        values = np.arange(2*tools.BLOCKSIZE + 3, dtype='float64')[::-1]
+
+        tmp_file = NamedTemporaryFile(mode='wb', delete=False)
+        tmp_file.close()
+
+        tools.savebin(values, tmp_file.name)
+        with open(tmp_file.name, 'rb') as f:
+            raw = f.read()
+        n = struct.unpack('<i', raw[:4])[0]
+        self.assertEqual(n, 4*len(values))
+        self.assertEqual(raw[-4:], raw[:4])
+        self.assertEqual(len(raw), n + 8)
+
+        ret = tools.loadbin(tmp_file.name)
+        self.assertEqual(ret.dtype, np.float32)
+        self.assertFalse(ret.flags.writeable)
+        np.testing.assert_array_equal(ret, values)
+
+        # saving over a mapped file leaves the mapped array intact
+        tools.savebin(np.zeros(3), tmp_file.name)
+        np.testing.assert_array_equal(ret, values)
+        np.testing.assert_array_equal(tools.loadbin(tmp_file.name), 0.)
+
+        del ret
+        os.remove(tmp_file.name)
+
+
+class TestIomap(unittest.TestCase):
+    def test_iomap(self):
+        items = range(10)
+        for nthreads in [1, 4]:
+            self.assertEqual(tools.iomap(lambda x: x**2, items, nthreads),
+                             [x**2 for x in items])
+
 
 if __name__ == '__main__':
     unittest.main()
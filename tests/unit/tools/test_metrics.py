@@ -0,0 +1,75 @@
+import unittest
+
+import shutil
+import tempfile
+import time
+from os.path import exists, join
+
+from seisflows.tools import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.par = metrics.PAR.__dict__.copy()
+        self.path = metrics.PATH.__dict__.copy()
+        self.tmpdir = tempfile.mkdtemp()
+        metrics.PAR.update({})
+        metrics.PATH.update({'OUTPUT': self.tmpdir})
+        self.filename = join(self.tmpdir, metrics.FILENAME)
+
+    def tearDown(self):
+        metrics.PAR.update(self.par)
+        metrics.PATH.update(self.path)
+        shutil.rmtree(self.tmpdir)
+
+    def test_span(self):
+        with metrics.span('stage', 'name'):
+            sum(range(1000))
+
+        spans = metrics.load(self.filename)
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0]['stage'], 'stage')
+        self.assertEqual(spans[0]['name'], 'name')
+        self.assertFalse(spans[0]['error'])
+        self.assertTrue(spans[0]['wall'] >= 0)
+        self.assertTrue(spans[0]['cpu'] >= 0)
+
+    def test_span_error(self):
+        with self.assertRaises(ValueError):
+            with metrics.span('stage'):
+                raise ValueError
+
+        spans = metrics.load(self.filename)
+        self.assertTrue(spans[0]['error'])
+
+    def test_timed(self):
+        @metrics.timed('func')
+        def func(x):
+            return 2*x
+
+        self.assertEqual(func(2), 4)
+        self.assertEqual(func.__name__, 'func')
+        self.assertEqual(metrics.load(self.filename)[0]['stage'], 'func')
+
+    def test_record(self):
+        metrics.record('run', 'solver.eval_func', time.time())
+        spans = metrics.load(self.filename)
+        self.assertEqual(spans[0]['name'], 'solver.eval_func')
+        self.assertEqual(spans[0]['cpu'], None)
+
+    def test_disabled(self):
+        metrics.PAR.update({'METRICS': False})
+        with metrics.span('stage'):
+            pass
+        self.assertFalse(exists(self.filename))
+
+    def test_load_partial(self):
+        with metrics.span('stage'):
+            pass
+        with open(self.filename, 'a') as f:
+            f.write('{"stage": "trunc')
+        self.assertEqual(len(metrics.load(self.filename)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()